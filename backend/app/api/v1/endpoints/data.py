@@ -9,7 +9,10 @@ from app.schemas.data import DataSummary
 from app.repositories.data_repository import DataRepository
 from app.services.csv_service import CSVService
 from app.services.raster_service import RasterService
+from app.services.tile_cache import tile_cache
+from app.services.visualization_service import VisualizationService
 from app.api.deps import get_current_user, get_data_repository
+from app.core.executor import io_executor
 from app.schemas.auth import User
 from app.core.exceptions import DataNotFoundError, DataProcessingError
 
@@ -26,7 +29,7 @@ async def list_filenames(
     data_repo: DataRepository = Depends(get_data_repository),
 ):
     """List all filenames for the current user"""
-    return data_repo.get_user_files(current_user.username)
+    return await io_executor.run(data_repo.get_user_files, current_user.username)
 
 
 @router.delete("/clear/{filename}", response_model=Dict[str, str])
@@ -36,10 +39,29 @@ async def clear_all_data(
     data_repo: DataRepository = Depends(get_data_repository),
 ):
     """Clear all stored data"""
-    data_repo.clear_data_by_filename(filename=filename, username=current_user.username)
+    await io_executor.run(
+        data_repo.clear_data_by_filename,
+        filename=filename,
+        username=current_user.username,
+    )
+    await io_executor.run(
+        tile_cache.invalidate_file, username=current_user.username, filename=filename
+    )
+    VisualizationService.invalidate_results(
+        username=current_user.username, filename=filename
+    )
     return {"message": f"Data {filename} cleared successfully"}
 
 
+@router.get("/cache/stats", response_model=Dict[str, int])
+async def get_csv_cache_stats(
+    current_user: User = Depends(get_current_user),
+    data_repo: DataRepository = Depends(get_data_repository),
+):
+    """Get hit/miss counters and memory usage of the CSV column cache"""
+    return data_repo.csv_cache_stats()
+
+
 # Extra
 # TODO: Implement on frontend later
 @router.get("/summary/{filename}", response_model=DataSummary)
@@ -49,6 +71,15 @@ async def get_data_summary(
     filename=str,
 ):
     """Get comprehensive summary of all loaded data"""
+    return await io_executor.run(
+        build_data_summary, data_repo, current_user.username, filename
+    )
+
+
+def build_data_summary(
+    data_repo: DataRepository, username: str, filename: str
+) -> DataSummary:
+    """Assemble the data summary (blocking, run on the io pool)"""
     summary = DataSummary()
 
     # CSV data summary (metadata only)
@@ -57,9 +88,7 @@ async def get_data_summary(
         summary.csv = CSVService.get_data_summary(csv_data)
 
     # Raster data summary (metadata only)
-    raster_data = data_repo.get_raster_data(
-        username=current_user.username, filename=filename
-    )
+    raster_data = data_repo.get_raster_data(username=username, filename=filename)
     if raster_data is not None:
         # Only include metadata, not full data arrays
         raster_summary = {
@@ -1,25 +1,31 @@
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
 from app.schemas.data import CSVUploadResponse, RasterUploadResponse
 from app.services.csv_service import CSVService
+from app.services.csv_index_service import CSVIndexService
+from app.services.csv_rollup_service import CSVRollupService
 from app.services.raster_service import RasterService
 from app.repositories.data_repository import DataRepository
 from app.api.deps import get_current_user, get_data_repository
+from app.core.executor import cpu_executor, io_executor
 from app.schemas.auth import User
-import pandas as pd
-import io
-import os
-from pathlib import Path
+import logging
+from concurrent.futures import Future
+from functools import partial
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # Uploads directory must exist
-UPLOADS_DIR = Path.cwd() / "app/uploads"
-UPLOADS_DIR.mkdir(exist_ok=True)
+DataRepository.UPLOADS_DIR.mkdir(exist_ok=True)
 
 
-def get_file_path(username: str, filename: str) -> Path:
-    """Generate file path with username_filename convention"""
-    return UPLOADS_DIR / f"{username}_{filename}"
+def _log_tiling_failure(filename: str, future: Future) -> None:
+    """Report tile sources that could not be built, tiles then come from the upload"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            f"Could not build tile sources for {filename}: {future.exception()}"
+        )
 
 
 @router.post("/data")
@@ -32,8 +38,10 @@ async def upload_csv(
     if not (file.filename.endswith(".csv") or file.filename.endswith(".nc")):
         raise HTTPException(status_code=400, detail="File must be a CSV or NetCDF")
 
-    # Check if file already exists
-    file_path = get_file_path(current_user.username, file.filename)
+    # Check if file already exists, at the path the upload is stored to
+    file_path = data_repo._get_file_path(
+        username=current_user.username, filename=file.filename
+    )
     if file_path.exists():
         raise HTTPException(
             status_code=409,
@@ -43,19 +51,48 @@ async def upload_csv(
     # Process csv
     if file.filename.endswith(".csv"):
         try:
-            # Read the CSV file
-            content = await file.read()
-            df = pd.read_csv(io.StringIO(content.decode("utf-8")))
-
-            # Clean the data using service
-            cleaned_df, cleaning_report = CSVService.clean_csv_data(df)
+            # Stream the file to the uploads directory
+            stored = await io_executor.run(
+                data_repo.store_upload,
+                file.file,
+                username=current_user.username,
+                filename=file.filename,
+            )
 
-            # Generate summary
-            summary = CSVService.get_data_summary(cleaned_df)
+            # Clean, summarize and store the cleaned table in a worker process
+            result = await cpu_executor.run(
+                CSVService.process_csv_file,
+                file_path,
+                partial(
+                    data_repo.cleaned_csv_writer,
+                    username=current_user.username,
+                    filename=file.filename,
+                ),
+            )
 
-            # Save file to uploads directory
-            with open(file_path, "wb") as f:
-                f.write(content)
+            # Index the filter dimensions of the cleaned table, keeping their
+            # distinct values and counts as the filter options
+            filter_options = await cpu_executor.run(
+                CSVIndexService.build_index_file,
+                data_repo._get_cleaned_path(
+                    username=current_user.username, filename=file.filename
+                ),
+                data_repo._get_index_path(
+                    username=current_user.username, filename=file.filename
+                ),
+                data_repo.DIMENSION_COLUMNS,
+            )
+            # Materialize the year rollups the timeseries charts are served from
+            await cpu_executor.run(
+                CSVRollupService.build_rollup_file,
+                data_repo._get_cleaned_path(
+                    username=current_user.username, filename=file.filename
+                ),
+                data_repo._get_rollup_path(
+                    username=current_user.username, filename=file.filename
+                ),
+                data_repo.DIMENSION_COLUMNS,
+            )
 
             # Store metadata and processed data in repository
             metadata = {
@@ -63,19 +100,32 @@ async def upload_csv(
                 "username": current_user.username,
                 "file_path": str(file_path),
                 "file_type": "csv",
+                **stored,
             }
-            data_repo.store_csv_data(cleaned_df, cleaning_report, metadata)
+            await io_executor.run(
+                data_repo.store_csv_data,
+                None,
+                result["cleaning_report"],
+                metadata,
+                filter_options,
+            )
 
             return CSVUploadResponse(
                 message="CSV uploaded and processed successfully",
                 filename=file.filename,
-                cleaning_report=cleaning_report,
-                preview=cleaned_df.head().to_dict("records"),
-                summary=summary,
+                cleaning_report=result["cleaning_report"],
+                preview=result["preview"],
+                summary=result["summary"],
             )
         except HTTPException:
+            data_repo.clear_data_by_filename(
+                filename=file.filename, username=current_user.username
+            )
             raise
         except Exception as e:
+            data_repo.clear_data_by_filename(
+                filename=file.filename, username=current_user.username
+            )
             raise HTTPException(
                 status_code=400, detail=f"Error processing CSV: {str(e)}"
             )
@@ -83,18 +133,18 @@ async def upload_csv(
     # Upload nc
     if file.filename.endswith(".nc"):
         try:
-            # Read the nc file
-            content = await file.read()
-
-            # Save file to uploads directory
-            file_path = data_repo._get_file_path(
-                username=current_user.username, filename=file.filename
+            # Stream the file to the uploads directory
+            stored = await io_executor.run(
+                data_repo.store_upload,
+                file.file,
+                username=current_user.username,
+                filename=file.filename,
             )
-            with open(file_path, "wb") as f:
-                f.write(content)
 
-            # Process Raster data
-            raster_info = RasterService.process_raster_data(file_path)
+            # Process Raster data in a worker process
+            raster_info = await cpu_executor.run(
+                RasterService.process_raster_data, file_path
+            )
 
             # Store processed info with metadata
             metadata = {
@@ -102,9 +152,25 @@ async def upload_csv(
                 "username": current_user.username,
                 "file_path": str(file_path),
                 "file_type": "netcdf",
+                **stored,
             }
             raster_info["metadata"] = metadata
-            data_repo.store_raster_data(raster_info)
+            await io_executor.run(data_repo.store_raster_data, raster_info)
+
+            # Queue the tile-aligned copy and its overviews without waiting for
+            # them; the original file is kept for download. Queueing happens
+            # before responding, so a saturated pool is answered with a 503
+            tiling = cpu_executor.submit(
+                RasterService.prepare_tile_sources,
+                file_path,
+                data_repo._get_tiled_path(
+                    username=current_user.username, filename=file.filename
+                ),
+                data_repo._get_pyramid_path(
+                    username=current_user.username, filename=file.filename
+                ),
+            )
+            tiling.add_done_callback(partial(_log_tiling_failure, file.filename))
 
             return RasterUploadResponse(
                 message="Raster data uploaded and processed successfully",
@@ -113,8 +179,15 @@ async def upload_csv(
             )
 
         except HTTPException:
+            # Cleared entirely, so the upload can be retried under its name
+            data_repo.clear_data_by_filename(
+                filename=file.filename, username=current_user.username
+            )
             raise
         except Exception as e:
+            data_repo.clear_data_by_filename(
+                filename=file.filename, username=current_user.username
+            )
             raise HTTPException(
                 status_code=400, detail=f"Error processing raster: {str(e)}"
             )
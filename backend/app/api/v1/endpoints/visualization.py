@@ -1,13 +1,26 @@
 from typing import Dict, List, Optional, Any
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import Response, StreamingResponse
 import logging
-from app.schemas.data import TimeseriesResponse
-from app.services.visualization_service import VisualizationService
+from app.schemas.data import TileBatchRequest, TimeseriesResponse
+from app.services.visualization_service import (
+    VisualizationService,
+    timeseries_cache,
+)
 from app.repositories.data_repository import DataRepository
 from app.api.deps import get_current_user, get_data_repository
 from app.schemas.auth import User
-from app.core.exceptions import DataNotFoundError, DataProcessingError
+from app.core.exceptions import (
+    DataNotFoundError,
+    DataProcessingError,
+    ServiceOverloadedError,
+)
+from app.config import settings
+from app.core.executor import io_executor
 from app.services.raster_service import RasterService
+from app.services.resampling_service import ResamplingService
+from app.services.tile_cache import TileCache, tile_cache
+from app.services.tile_encoding import TileEncoding
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +35,20 @@ async def get_timeseries_data(
     columns: List[str] = Query(
         None, description="Columns to visualize (multiple allowed)"
     ),
+    group_by: Optional[str] = Query(
+        None, description="Dimension to split into one series per value"
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample series longer than this many points"
+    ),
+    downsample: str = Query("lttb", description="Downsampling method: lttb or minmax"),
+    aggregations: List[str] = Query(
+        None,
+        description=(
+            "Statistics per date (multiple allowed): sum, mean, median, min, max, "
+            "count, std or a percentile such as p5 or p95; sum by default"
+        ),
+    ),
     model: Optional[str] = Query(None, description="Filter by model"),
     unit: Optional[str] = Query(None, description="Filter by unit"),
     scenario: Optional[str] = Query(None, description="Filter by scenario"),
@@ -41,8 +68,13 @@ async def get_timeseries_data(
         username=current_user.username,
     )
 
-    return viz_service.get_timeseries_data(
+    return await io_executor.run(
+        viz_service.get_timeseries_data,
         columns=columns,
+        group_by=group_by,
+        max_points=max_points,
+        downsample=downsample,
+        aggregations=aggregations,
         model=model,
         scenario=scenario,
         region=region,
@@ -56,13 +88,42 @@ async def get_timeseries_data(
 
 @router.get("/csv/available-filters/{filename}")
 async def get_available_filters(
+    model: Optional[str] = Query(None, description="Filter by model"),
+    unit: Optional[str] = Query(None, description="Filter by unit"),
+    scenario: Optional[str] = Query(None, description="Filter by scenario"),
+    region: Optional[str] = Query(None, description="Filter by region"),
+    species_group: Optional[str] = Query(None, description="Filter by species_group"),
+    forest_land: Optional[str] = Query(None, description="Filter by forest_land"),
+    item: Optional[str] = Query(None, description="Filter by item"),
+    variable: Optional[str] = Query(None, description="Filter by variable"),
     current_user: User = Depends(get_current_user),
     data_repo: DataRepository = Depends(get_data_repository),
     filename: str = None,
 ) -> Dict[str, List[str]]:
-    """Get available filter options for visualization"""
-    viz_service = VisualizationService(data_repo, filename)
-    return viz_service.get_available_filters()
+    """
+    Get available filter options for visualization, narrowed to the values
+    that occur together with any filters already chosen
+    """
+    viz_service = VisualizationService(data_repo, filename, current_user.username)
+    return await io_executor.run(
+        viz_service.get_available_filters,
+        model=model,
+        scenario=scenario,
+        region=region,
+        unit=unit,
+        species_group=species_group,
+        forest_land=forest_land,
+        item=item,
+        variable=variable,
+    )
+
+
+@router.get("/csv/timeseries-cache/stats")
+async def get_timeseries_cache_stats(
+    current_user: User = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Get hit/miss counters and memory usage of the timeseries result cache"""
+    return timeseries_cache.stats()
 
 
 @router.get("/raster/tile/{filename}/{variable}/{time_index}/{zoom}/{x}/{y}")
@@ -75,31 +136,104 @@ async def get_raster_tile(
     current_user: User = Depends(get_current_user),
     data_repo: DataRepository = Depends(get_data_repository),
     filename: str = "",
-    tile_size: Optional[int] = Query(256, description="Tile size"),
-) -> Dict[str, Any]:
+    tile_size: Optional[int] = Query(
+        256, ge=16, le=settings.TILE_MAX_SIZE, description="Tile size"
+    ),
+    format: Optional[str] = Query(
+        None,
+        description="Tile encoding: json, f32, npy, u8 or u16 "
+        "(defaults to the Accept header, then json)",
+    ),
+    resampling: str = Query(
+        ResamplingService.AUTO,
+        description="Resampling method: auto (linear), linear, nearest, mean, min or max",
+    ),
+    accept: Optional[str] = Header(None),
+) -> Response:
     """Get a specific tile of raster data for efficient visualization"""
+    encoding = TileEncoding.negotiate(format, accept)
+    ResamplingService.validate_method(resampling)
 
     try:
         file_path = data_repo._get_file_path(
             username=current_user.username, filename=filename
         )
-        tile_data = RasterService.extract_tile_from_netcdf(
-            file_path, variable, time_index, zoom, x, y, tile_size=tile_size
+        cache_key = TileCache.make_key(
+            current_user.username,
+            filename,
+            file_path.stat().st_mtime_ns,
+            variable,
+            time_index,
+            zoom,
+            x,
+            y,
+            tile_size,
+            encoding,
+            resampling,
+            data_repo.get_pyramid_mtime(
+                username=current_user.username, filename=filename
+            ),
         )
 
-        return {
-            "tile": tile_data["data"].tolist(),
-            "metadata": {
-                "variable": variable,
-                "time_index": time_index,
-                "zoom": zoom,
-                "x": x,
-                "y": y,
-                "tile_size": tile_size,
-                "stats": tile_data["stats"],
-            },
-        }
+        # Hot tiles are served without opening the NetCDF file
+        cached = tile_cache.get(cache_key)
+        if cached is not None:
+            body, media_type, headers = TileEncoding.unpack(cached)
+            return Response(
+                content=body,
+                media_type=media_type,
+                headers={**headers, "X-Tile-Cache": "hit", "Vary": "Accept"},
+            )
+
+        def render():
+            """Read, resample, encode and cache the tile (blocking, io pool)"""
+            pyramid_path = data_repo._get_pyramid_path(
+                username=current_user.username, filename=filename
+            )
+            # The tile-aligned copy holds the same values, so cache keys stay on
+            # the original upload
+            tile_data = RasterService.extract_tile_from_netcdf(
+                data_repo.get_tile_source_path(
+                    username=current_user.username, filename=filename
+                ),
+                variable,
+                time_index,
+                zoom,
+                x,
+                y,
+                tile_size=tile_size,
+                pyramid_path=pyramid_path,
+                resampling=resampling,
+            )
+
+            result = TileEncoding.encode(
+                tile_data["data"],
+                {
+                    "variable": variable,
+                    "time_index": time_index,
+                    "zoom": zoom,
+                    "x": x,
+                    "y": y,
+                    "tile_size": tile_size,
+                    "level": tile_data["level"],
+                    "resampling": resampling,
+                    "stats": tile_data["stats"],
+                },
+                encoding,
+            )
+            tile_cache.set(cache_key, TileEncoding.pack(*result))
+            return result
+
+        body, media_type, headers = await io_executor.run(render)
 
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={**headers, "X-Tile-Cache": "miss", "Vary": "Accept"},
+        )
+
+    except ServiceOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error extracting tile: {e}")
 
@@ -116,6 +250,150 @@ async def get_raster_tile(
         }
 
 
+@router.post("/raster/tiles/{filename}/{variable}")
+async def get_raster_tiles(
+    variable: str,
+    batch: TileBatchRequest,
+    current_user: User = Depends(get_current_user),
+    data_repo: DataRepository = Depends(get_data_repository),
+    filename: str = "",
+) -> StreamingResponse:
+    """
+    Get many tiles of one variable in a single request, streamed back as
+    frames (see TileEncoding.frame) ordered by time index, then by tile.
+    Tiles are extracted one time step at a time as the response is sent, so
+    only one step's tiles are held in memory.
+    """
+    encoding = TileEncoding.negotiate(batch.format, None)
+    ResamplingService.validate_method(batch.resampling)
+    file_path = data_repo._get_file_path(
+        username=current_user.username, filename=filename
+    )
+    if not file_path.exists():
+        raise DataNotFoundError(f"File {filename} not found")
+    file_mtime = file_path.stat().st_mtime_ns
+    pyramid_mtime = data_repo.get_pyramid_mtime(
+        username=current_user.username, filename=filename
+    )
+    tiles = [(tile.zoom, tile.x, tile.y) for tile in batch.tiles]
+
+    def cache_key(time_index: int, zoom: int, x: int, y: int):
+        return TileCache.make_key(
+            current_user.username,
+            filename,
+            file_mtime,
+            variable,
+            time_index,
+            zoom,
+            x,
+            y,
+            batch.tile_size,
+            encoding,
+            batch.resampling,
+            pyramid_mtime,
+        )
+
+    def collect(time_index: int):
+        """
+        Encoded tiles of one time step: cached tiles first, the rest with one
+        windowed read (blocking, run on the io pool)
+        """
+        encoded = {}
+        for tile in tiles:
+            cached = tile_cache.get(cache_key(time_index, *tile))
+            if cached is not None:
+                encoded[tile] = TileEncoding.unpack(cached)
+
+        missing = [tile for tile in tiles if tile not in encoded]
+        if missing:
+            try:
+                extracted = RasterService.extract_tiles_from_netcdf(
+                    data_repo.get_tile_source_path(
+                        username=current_user.username, filename=filename
+                    ),
+                    variable,
+                    [time_index],
+                    list(dict.fromkeys(missing)),
+                    tile_size=batch.tile_size,
+                    pyramid_path=data_repo._get_pyramid_path(
+                        username=current_user.username, filename=filename
+                    ),
+                    resampling=batch.resampling,
+                )
+            except Exception as e:
+                logger.error(f"Error extracting tile batch: {e}")
+                raise DataProcessingError(f"Error extracting tiles: {str(e)}")
+
+            for tile_data in extracted:
+                tile = (tile_data["zoom"], tile_data["x"], tile_data["y"])
+                result = TileEncoding.encode(
+                    tile_data["data"],
+                    {
+                        "variable": variable,
+                        "time_index": tile_data["time_index"],
+                        "zoom": tile_data["zoom"],
+                        "x": tile_data["x"],
+                        "y": tile_data["y"],
+                        "tile_size": batch.tile_size,
+                        "level": tile_data["level"],
+                        "resampling": batch.resampling,
+                        "stats": tile_data["stats"],
+                    },
+                    encoding,
+                )
+                encoded[tile] = result
+                tile_cache.set(cache_key(time_index, *tile), TileEncoding.pack(*result))
+        return encoded
+
+    # Check the whole request and read the first step before responding, so
+    # a bad variable or time index gets an error status rather than a
+    # truncated stream
+    await io_executor.run(
+        RasterService.check_selection,
+        data_repo.get_tile_source_path(
+            username=current_user.username, filename=filename
+        ),
+        variable,
+        batch.time_indices,
+    )
+    first = await io_executor.run(collect, batch.time_indices[0])
+
+    async def frames(encoded):
+        for position, time_index in enumerate(batch.time_indices):
+            if position:
+                encoded = await io_executor.run(collect, time_index)
+            for zoom, x, y in tiles:
+                body, media_type, headers = encoded[(zoom, x, y)]
+                yield TileEncoding.frame(
+                    {
+                        "time_index": time_index,
+                        "zoom": zoom,
+                        "x": x,
+                        "y": y,
+                        "media_type": media_type,
+                        "headers": headers,
+                    },
+                    body,
+                )
+
+    return StreamingResponse(
+        frames(first),
+        media_type="application/octet-stream",
+        headers={
+            "X-Tile-Encoding": encoding,
+            "X-Tile-Count": str(len(batch.time_indices) * len(tiles)),
+        },
+    )
+
+
+@router.get("/raster/tile-cache/stats")
+async def get_tile_cache_stats(
+    current_user: User = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Get hit/miss counters and memory usage of the raster tile cache"""
+    return tile_cache.stats()
+
+
 @router.get("/raster/metadata/{filename}")
 async def get_raster_metadata(
     data_repo: DataRepository = Depends(get_data_repository),
@@ -124,12 +402,29 @@ async def get_raster_metadata(
 ) -> Dict[str, Any]:
     """Get raster dataset metadata"""
     try:
-        file_path = data_repo._get_file_path(
-            filename=filename, username=current_user.username
+        return await io_executor.run(
+            load_raster_metadata, data_repo, current_user.username, filename
         )
-        print({"file_path": file_path})
-
-        return RasterService.get_raster_metadata(file_path)
+    except ServiceOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error getting raster metadata: {e}")
         raise DataProcessingError(f"Error processing raster metadata: {str(e)}")
+
+
+def load_raster_metadata(
+    data_repo: DataRepository, username: str, filename: str
+) -> Dict[str, Any]:
+    """
+    Raster metadata with the statistics stored at upload (blocking, run on the
+    io pool). Uploads stored before statistics existed are backfilled once.
+    """
+    file_path = data_repo._get_file_path(filename=filename, username=username)
+    stored = data_repo.get_raster_data(username=username, filename=filename)
+    statistics = stored.get("statistics") if stored else None
+
+    metadata = RasterService.get_raster_metadata(file_path, statistics)
+    if stored and statistics is None:
+        stored["statistics"] = metadata["statistics"]
+        data_repo.store_raster_data(stored)
+    return metadata
@@ -27,6 +27,33 @@ class Settings(BaseSettings):
     ALLOWED_CSV_EXTENSIONS: List[str] = [".csv"]
     ALLOWED_RASTER_EXTENSIONS: List[str] = [".nc"]
 
+    # CSV
+    CSV_CACHE_MEMORY_BYTES: int = 256 * 1024 * 1024  # 256MB of loaded columns
+    CSV_INDEX_MEMORY_BYTES: int = 256 * 1024 * 1024  # 256MB of loaded indexes
+    CSV_ROLLUP_MEMORY_BYTES: int = 64 * 1024 * 1024  # 64MB of loaded rollups
+    TIMESERIES_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024  # 32MB of responses
+    TIMESERIES_CACHE_TTL_SECONDS: int = 300
+    # Larger uploads are cleaned in row batches instead of loaded whole
+    CSV_STREAMING_MIN_BYTES: int = 64 * 1024 * 1024
+
+    # Raster
+    NETCDF_POOL_MAX_OPEN: int = 16  # open NetCDF handles shared across requests
+    TILE_CACHE_MEMORY_BYTES: int = 128 * 1024 * 1024  # 128MB of rendered tiles
+    TILE_CACHE_DISK_BYTES: int = 1024 * 1024 * 1024  # 1GB of tiles on disk
+    # Largest tile edge, and most pixels one batch request may ask for over
+    # all its tiles and time steps (64M pixels, 256MB as float32)
+    TILE_MAX_SIZE: int = 1024
+    TILE_BATCH_MAX_PIXELS: int = 64 * 1024 * 1024
+    # Ceiling on decoded raster data one upload/ingest step loads at once
+    RASTER_MAX_LOAD_BYTES: int = 256 * 1024 * 1024
+
+    # Execution
+    IO_POOL_WORKERS: int = 8  # threads for blocking file and NetCDF reads
+    IO_POOL_MAX_PENDING: int = 64  # running + queued calls before answering 503
+    CPU_POOL_WORKERS: int = 2  # processes for CSV cleaning and raster ingest
+    CPU_POOL_MAX_PENDING: int = 8
+    POOL_RETRY_AFTER_SECONDS: int = 5
+
     class Config:
         env_file = ".env"
 
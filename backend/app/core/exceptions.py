@@ -127,6 +127,18 @@ class ExternalServiceError(BaseAPIException):
         )
 
 
+class ServiceOverloadedError(BaseAPIException):
+    """Raised when a worker pool is saturated and the request should be retried"""
+
+    def __init__(self, detail: str = "Service is overloaded", retry_after: int = 5):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+            error_code="SERVICE_OVERLOADED",
+        )
+
+
 class DatabaseError(BaseAPIException):
     """Raised when database operation fails"""
 
@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (
+    BrokenExecutor,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.core.exceptions import ServiceOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """
+    Runs blocking callables on a thread or process pool from async endpoints,
+    so pandas/xarray work never blocks the event loop.
+
+    At most `max_pending` calls may be running or queued at once; further
+    calls are rejected with a 503 instead of piling up behind a saturated
+    pool. The pool itself is created on first use.
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        max_workers: int,
+        max_pending: int,
+        retry_after: int,
+    ):
+        if kind not in (self.THREAD, self.PROCESS):
+            raise ValueError(f"Unknown executor kind {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == self.THREAD:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+                else:
+                    # Forking a threaded server is unsafe, start clean workers
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+            return self._executor
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        Queue `func(*args, **kwargs)` on the pool without waiting for it. A
+        saturated pool is rejected here, before the caller responds.
+        """
+        return self._submit(func, *args, **kwargs)[1]
+
+    def _submit(self, func: Callable, *args, **kwargs) -> Tuple[Executor, Future]:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ServiceOverloadedError(
+                    f"The {self.name} pool is busy, please retry shortly",
+                    retry_after=self.retry_after,
+                )
+            self._pending += 1
+
+        try:
+            executor = self._get_executor()
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # Released when the work finishes, even if the request is cancelled
+        future.add_done_callback(self._release)
+        return executor, future
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` on the pool and await its result"""
+        executor, future = self._submit(func, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenExecutor:
+            # A worker died; start a fresh pool for the next call
+            logger.error(f"The {self.name} pool broke, restarting it")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Blocking file, NetCDF and DataFrame reads
+io_executor = BoundedExecutor(
+    name="io",
+    kind=BoundedExecutor.THREAD,
+    max_workers=settings.IO_POOL_WORKERS,
+    max_pending=settings.IO_POOL_MAX_PENDING,
+    retry_after=settings.POOL_RETRY_AFTER_SECONDS,
+)
+
+# CPU-bound CSV cleaning and raster ingest
+cpu_executor = BoundedExecutor(
+    name="cpu",
+    kind=BoundedExecutor.PROCESS,
+    max_workers=settings.CPU_POOL_WORKERS,
+    max_pending=settings.CPU_POOL_MAX_PENDING,
+    retry_after=settings.POOL_RETRY_AFTER_SECONDS,
+)
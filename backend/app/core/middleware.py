@@ -0,0 +1,72 @@
+import json
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.exceptions import FileSizeExceededError
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than `max_body_size` on paths under
+    `path_prefix` with a 413, before they are spooled to disk: up front when
+    Content-Length is declared, otherwise as soon as the streamed body passes
+    the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, path_prefix: str = "/"):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit():
+            if int(declared) > self.max_body_size:
+                await self._reject(send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # An HTTPException, so body parsing turns it into a 413
+                    raise FileSizeExceededError(
+                        f"Request body exceeds {self.max_body_size} bytes"
+                    )
+            return message
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except FileSizeExceededError:
+            if not response_started:
+                await self._reject(send)
+
+    async def _reject(self, send: Send) -> None:
+        body = json.dumps(
+            {"detail": f"Request body exceeds {self.max_body_size} bytes"}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
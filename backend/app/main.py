@@ -1,20 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from app.config import settings
 from app.api.v1.router import api_router
+from app.core.executor import cpu_executor, io_executor
+from app.core.middleware import BodySizeLimitMiddleware
+from app.repositories.dataset_pool import dataset_pool
+from app.services.tile_encoding import TILE_HEADERS
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Multipart boundaries and part headers sent along with an uploaded file
+UPLOAD_FRAMING_BYTES = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop the worker pools and close pooled NetCDF handles on shutdown
+    io_executor.shutdown()
+    cpu_executor.shutdown()
+    dataset_pool.close_all()
+
 
 def create_application() -> FastAPI:
     app = FastAPI(
         title=settings.APP_TITLE,
         description=settings.APP_DESCRIPTION,
         version=settings.APP_VERSION,
+        lifespan=lifespan,
     )
 
     # Add CORS Middleware
@@ -24,6 +42,15 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=TILE_HEADERS,
+    )
+
+    # Refuse oversized uploads before they are spooled; the allowance
+    # covers the multipart framing around the file
+    app.add_middleware(
+        BodySizeLimitMiddleware,
+        max_body_size=settings.MAX_FILE_SIZE + UPLOAD_FRAMING_BYTES,
+        path_prefix="/api/v1/upload",
     )
 
     # Include API router
@@ -1,11 +1,53 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, BinaryIO, Callable, Iterator, Tuple
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
 import json
+import os
+from contextlib import contextmanager
 from pathlib import Path
+from app.config import settings
+from app.core.cache import LRUCache
+from app.core.exceptions import FileSizeExceededError
+from app.repositories.dataset_pool import dataset_pool
 
 
 class DataRepository:
     UPLOADS_DIR = Path.cwd() / "app/uploads"
+    # Bytes copied at a time when saving uploads
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    # Rows per Parquet row group, the unit min/max statistics are kept for
+    PARQUET_ROW_GROUP_SIZE = 64 * 1024
+    # IAMC dimension columns, stored dictionary-encoded and read as categoricals
+    DIMENSION_COLUMNS = [
+        "model",
+        "scenario",
+        "region",
+        "species_group",
+        "forest_land",
+        "item",
+        "variable",
+        "unit",
+    ]
+    # Loaded CSV columns shared by all requests, bounded by their memory use
+    _frame_cache = LRUCache(
+        max_bytes=settings.CSV_CACHE_MEMORY_BYTES,
+        sizeof=lambda series: int(series.memory_usage(deep=True)),
+    )
+    # Loaded inverted indexes of CSV uploads
+    _index_cache = LRUCache(
+        max_bytes=settings.CSV_INDEX_MEMORY_BYTES,
+        sizeof=lambda index: sum(array.nbytes for array in index.values()),
+    )
+    # Loaded year rollups of CSV uploads, split into their cuboids
+    _rollup_cache = LRUCache(
+        max_bytes=settings.CSV_ROLLUP_MEMORY_BYTES,
+        sizeof=lambda rollup: sum(
+            int(cuboid.memory_usage(deep=True).sum()) for cuboid in rollup.values()
+        ),
+    )
 
     @classmethod
     def _get_file_path(cls, username: str = "", filename: str = "") -> Path:
@@ -25,14 +67,96 @@ class DataRepository:
             else cls.UPLOADS_DIR / f"{filename}.metadata.json"
         )
 
+    @classmethod
+    def _get_pyramid_path(cls, username: str = "", filename: str = "") -> Path:
+        """Generate overview pyramid sidecar path for a NetCDF file"""
+        file_path = cls._get_file_path(username=username, filename=filename)
+        return file_path.with_name(f"{file_path.name}.pyramid.nc")
+
+    @classmethod
+    def _get_cleaned_path(cls, username: str = "", filename: str = "") -> Path:
+        """Generate cleaned Parquet table path for a CSV file"""
+        file_path = cls._get_file_path(username=username, filename=filename)
+        return file_path.with_name(f"{file_path.name}.parquet")
+
+    @classmethod
+    def _get_index_path(cls, username: str = "", filename: str = "") -> Path:
+        """Generate inverted index sidecar path for a CSV file"""
+        file_path = cls._get_file_path(username=username, filename=filename)
+        return file_path.with_name(f"{file_path.name}.index.npz")
+
+    @classmethod
+    def _get_rollup_path(cls, username: str = "", filename: str = "") -> Path:
+        """Generate year rollup sidecar path for a CSV file"""
+        file_path = cls._get_file_path(username=username, filename=filename)
+        return file_path.with_name(f"{file_path.name}.rollup.parquet")
+
+    @classmethod
+    def _get_tiled_path(cls, username: str = "", filename: str = "") -> Path:
+        """Generate tile-aligned copy path for a NetCDF file"""
+        file_path = cls._get_file_path(username=username, filename=filename)
+        return file_path.with_name(f"{file_path.name}.tiled.nc")
+
+    @classmethod
+    def get_pyramid_mtime(cls, username: str = "", filename: str = "") -> Optional[int]:
+        """Modification time of the overview pyramid, None until it is built"""
+        pyramid_path = cls._get_pyramid_path(username=username, filename=filename)
+        try:
+            return pyramid_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def get_tile_source_path(cls, username: str = "", filename: str = "") -> Path:
+        """Tile-aligned copy of a NetCDF file if it has been written, else the original"""
+        tiled_path = cls._get_tiled_path(username=username, filename=filename)
+        if tiled_path.exists():
+            return tiled_path
+        return cls._get_file_path(username=username, filename=filename)
+
+    @classmethod
+    def store_upload(
+        cls, source: BinaryIO, username: str = "", filename: str = ""
+    ) -> Dict[str, Any]:
+        """
+        Copy an uploaded file to the uploads directory in fixed-size chunks,
+        hashing it on the way. The copy goes to a partial file that is only
+        renamed into place once complete; uploads above MAX_FILE_SIZE are
+        aborted as soon as the limit is passed.
+        """
+        file_path = cls._get_file_path(username=username, filename=filename)
+        part_path = file_path.with_name(file_path.name + ".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(part_path, "wb") as target:
+                while chunk := source.read(cls.UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > settings.MAX_FILE_SIZE:
+                        raise FileSizeExceededError(
+                            f"File {filename} exceeds the maximum size of "
+                            f"{settings.MAX_FILE_SIZE} bytes"
+                        )
+                    digest.update(chunk)
+                    target.write(chunk)
+            os.replace(part_path, file_path)
+        finally:
+            part_path.unlink(missing_ok=True)
+
+        return {"size_bytes": size, "sha256": digest.hexdigest()}
+
     @classmethod
     def store_csv_data(
         cls,
         df: pd.DataFrame,
         cleaning_report: Dict[str, Any],
         metadata: Dict[str, Any],
+        filter_options: Optional[Dict[str, Dict[str, int]]] = None,
     ) -> None:
-        """Store cleaning report and metadata (CSV file already saved)"""
+        """
+        Store cleaning report, metadata and the distinct filter values with
+        their row counts (CSV file already saved)
+        """
         metadata_path = cls._get_metadata_path(
             username=metadata["username"], filename=metadata["filename"]
         )
@@ -41,20 +165,246 @@ class DataRepository:
             "metadata": metadata,
             "cleaning_report": cleaning_report,
         }
+        if filter_options is not None:
+            metadata_content["filter_options"] = filter_options
 
         with open(metadata_path, "w") as f:
             json.dump(metadata_content, f, indent=2)
 
+        # The cleaned table was just (re)written, forget any columns of an
+        # earlier upload under the same name
+        cls.invalidate_csv_cache(
+            username=metadata["username"], filename=metadata["filename"]
+        )
+
     @classmethod
-    def get_csv_data(
+    @contextmanager
+    def cleaned_csv_writer(
         cls, username: str = "", filename: str = ""
+    ) -> Iterator[Callable[[pd.DataFrame], None]]:
+        """
+        Write the cleaned table as Parquet one batch at a time: typed columns,
+        compressed, with per-row-group min/max statistics. String dimension
+        columns are dictionary-encoded, so they load as categoricals. The file
+        is only published once every batch has been written.
+        """
+        cleaned_path = cls._get_cleaned_path(username=username, filename=filename)
+        tmp_path = cleaned_path.with_name(cleaned_path.name + ".tmp")
+        writer: Optional[pq.ParquetWriter] = None
+
+        def write(df: pd.DataFrame) -> None:
+            nonlocal writer
+            if writer is not None:
+                # Later batches are encoded to the schema fixed by the first
+                table = pa.Table.from_pandas(
+                    df, schema=writer.schema, preserve_index=False
+                )
+            else:
+                table = cls._encode_dimensions(
+                    pa.Table.from_pandas(df, preserve_index=False)
+                )
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table, row_group_size=cls.PARQUET_ROW_GROUP_SIZE)
+
+        try:
+            yield write
+            if writer is not None:
+                writer.close()
+                os.replace(tmp_path, cleaned_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+
+    @classmethod
+    def _encode_dimensions(cls, table: pa.Table) -> pa.Table:
+        """Dictionary-encode the string dimension columns of a table"""
+        for index, field in enumerate(table.schema):
+            if field.name in cls.DIMENSION_COLUMNS and pa.types.is_string(field.type):
+                table = table.set_column(
+                    index, field.name, table[field.name].dictionary_encode()
+                )
+        return table
+
+    @classmethod
+    def store_cleaned_csv(
+        cls, df: pd.DataFrame, username: str = "", filename: str = ""
+    ) -> None:
+        """Store a cleaned table held in memory as Parquet"""
+        with cls.cleaned_csv_writer(username=username, filename=filename) as write:
+            write(df)
+
+    @classmethod
+    def get_csv_data(
+        cls,
+        username: str = "",
+        filename: str = "",
+        columns: Optional[List[str]] = None,
+        rows: Optional[np.ndarray] = None,
     ) -> Optional[pd.DataFrame]:
-        """Read CSV data from filesystem"""
-        file_path = cls._get_file_path(username=username, filename=filename)
-        if file_path.exists():
-            return pd.read_csv(file_path)
+        """
+        Read cleaned CSV data, projected to `columns` when given (names the
+        table lacks are skipped) and restricted to the row ids in `rows`.
+        Uploads stored before the cleaned table existed fall back to the raw
+        CSV.
+
+        Columns are cached in memory one by one, keyed by the source file's
+        resolved path, mtime and size, so projections share what is loaded
+        and only missing columns are read from disk.
+        """
+        file_key = cls.csv_file_identity(username=username, filename=filename)
+        if file_key is None:
+            return None
+        source = Path(file_key[0])
+        names = cls._column_names(source)
+        if columns is not None:
+            names = [col for col in columns if col in names]
+
+        frame = {col: cls._frame_cache.get(file_key + (col,)) for col in names}
+        missing = [col for col, series in frame.items() if series is None]
+        if missing:
+            loaded = cls._read_columns(source, missing)
+            for col in missing:
+                frame[col] = loaded[col]
+                cls._frame_cache.set(file_key + (col,), loaded[col])
+
+        # The frame gets its own copy of the arrays, callers cannot alter the
+        # cached columns
+        if rows is None:
+            return pd.DataFrame(
+                {col: frame[col].copy(deep=True) for col in names}, columns=names
+            )
+        # Only the selected rows are gathered
+        return (
+            pd.DataFrame(frame, columns=names, copy=False)
+            .take(rows)
+            .reset_index(drop=True)
+        )
+
+    @classmethod
+    def _get_csv_source(cls, username: str = "", filename: str = "") -> Optional[Path]:
+        """Cleaned table of a CSV upload if it exists, else the raw CSV"""
+        for source in [
+            cls._get_cleaned_path(username=username, filename=filename),
+            cls._get_file_path(username=username, filename=filename),
+        ]:
+            if source.exists():
+                return source
         return None
 
+    @classmethod
+    def csv_file_identity(
+        cls, username: str = "", filename: str = ""
+    ) -> Optional[Tuple[str, int, int]]:
+        """
+        Resolved path, mtime and size of the table CSV data is read from, so
+        anything derived from it can be keyed to this version of the file
+        """
+        source = cls._get_csv_source(username=username, filename=filename)
+        if source is None:
+            return None
+        try:
+            stat = source.stat()
+        except FileNotFoundError:
+            return None
+        return (str(source.resolve()), stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def get_csv_dtypes(
+        cls, username: str = "", filename: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """Column names and pandas dtypes of a CSV upload, without its rows"""
+        file_key = cls.csv_file_identity(username=username, filename=filename)
+        if file_key is None:
+            return None
+        source = Path(file_key[0])
+        if source.suffix == ".parquet":
+            empty = pq.read_schema(source).empty_table().to_pandas()
+        else:
+            # Raw CSVs carry no types, infer them from the first rows
+            empty = pd.read_csv(source, nrows=1000).head(0)
+            empty = empty.astype(
+                {col: "category" for col in empty if col in cls.DIMENSION_COLUMNS}
+            )
+        return empty.dtypes.to_dict()
+
+    @staticmethod
+    def _column_names(source: Path) -> List[str]:
+        if source.suffix == ".parquet":
+            return pq.read_schema(source).names
+        return pd.read_csv(source, nrows=0).columns.tolist()
+
+    @classmethod
+    def _read_columns(cls, source: Path, columns: List[str]) -> pd.DataFrame:
+        if source.suffix == ".parquet":
+            return pd.read_parquet(source, engine="pyarrow", columns=columns)
+        dimensions = [col for col in columns if col in cls.DIMENSION_COLUMNS]
+        return pd.read_csv(
+            source, usecols=columns, dtype={col: "category" for col in dimensions}
+        )
+
+    @classmethod
+    def get_csv_index(
+        cls, username: str = "", filename: str = ""
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Inverted index of a CSV upload, or None if none has been built"""
+        index_path = cls._get_index_path(username=username, filename=filename)
+        try:
+            stat = index_path.stat()
+        except FileNotFoundError:
+            return None
+
+        key = (str(index_path.resolve()), stat.st_mtime_ns, stat.st_size)
+        index = cls._index_cache.get(key)
+        if index is None:
+            with np.load(index_path) as archive:
+                index = {name: archive[name] for name in archive.files}
+            cls._index_cache.set(key, index)
+        return index
+
+    @classmethod
+    def get_csv_rollup(
+        cls, username: str = "", filename: str = ""
+    ) -> Optional[Dict[str, pd.DataFrame]]:
+        """Year rollup cuboids of a CSV upload by name, or None if not built"""
+        rollup_path = cls._get_rollup_path(username=username, filename=filename)
+        try:
+            stat = rollup_path.stat()
+        except FileNotFoundError:
+            return None
+
+        key = (str(rollup_path.resolve()), stat.st_mtime_ns, stat.st_size)
+        rollup = cls._rollup_cache.get(key)
+        if rollup is None:
+            stacked = pd.read_parquet(rollup_path, engine="pyarrow")
+            rollup = {
+                name: cuboid.drop(columns="cuboid").reset_index(drop=True)
+                for name, cuboid in stacked.groupby("cuboid", observed=True)
+            }
+            cls._rollup_cache.set(key, rollup)
+        return rollup
+
+    @classmethod
+    def invalidate_csv_cache(cls, username: str = "", filename: str = "") -> None:
+        """Drop the cached columns, index and rollup of a CSV upload"""
+        paths = {
+            str(path.resolve())
+            for path in [
+                cls._get_file_path(username=username, filename=filename),
+                cls._get_cleaned_path(username=username, filename=filename),
+                cls._get_index_path(username=username, filename=filename),
+                cls._get_rollup_path(username=username, filename=filename),
+            ]
+        }
+        cls._frame_cache.discard_where(lambda key: key[0] in paths)
+        cls._index_cache.discard_where(lambda key: key[0] in paths)
+        cls._rollup_cache.discard_where(lambda key: key[0] in paths)
+
+    @classmethod
+    def csv_cache_stats(cls) -> Dict[str, int]:
+        """Hit/miss counters and memory usage of the column cache"""
+        return cls._frame_cache.stats()
+
     @classmethod
     def get_cleaning_report(
         cls, username: str = "", filename: str = ""
@@ -67,6 +417,18 @@ class DataRepository:
                 return metadata.get("cleaning_report")
         return None
 
+    @classmethod
+    def get_filter_options(
+        cls, username: str = "", filename: str = ""
+    ) -> Optional[Dict[str, Dict[str, int]]]:
+        """Get the filter values and row counts stored at upload"""
+        metadata_path = cls._get_metadata_path(username=username, filename=filename)
+        if metadata_path.exists():
+            with open(metadata_path, "r") as f:
+                metadata = json.load(f)
+                return metadata.get("filter_options")
+        return None
+
     @classmethod
     def store_raster_data(cls, raster_info: Dict[str, Any]) -> None:
         """Store raster metadata (raster file already saved)"""
@@ -111,6 +473,8 @@ class DataRepository:
         for file_path in cls.UPLOADS_DIR.glob(pattern):
             with open(file_path, "r") as f:
                 file_content = json.load(f)
+                # Filter values are served on their own, keep the listing small
+                file_content.pop("filter_options", None)
                 metadata = file_content.get("metadata", {})
 
                 filename = metadata.get("filename")
@@ -129,8 +493,26 @@ class DataRepository:
         """Delete file and metadata for specific user's filename"""
         file_path = cls._get_file_path(filename=filename, username=username)
         metadata_path = cls._get_metadata_path(filename=filename, username=username)
+        pyramid_path = cls._get_pyramid_path(filename=filename, username=username)
+        tiled_path = cls._get_tiled_path(filename=filename, username=username)
+        cleaned_path = cls._get_cleaned_path(filename=filename, username=username)
+        index_path = cls._get_index_path(filename=filename, username=username)
+        rollup_path = cls._get_rollup_path(filename=filename, username=username)
+
+        # Release any pooled NetCDF handles before the files go away
+        for path in [file_path, pyramid_path, tiled_path]:
+            dataset_pool.invalidate(path)
+        cls.invalidate_csv_cache(username=username, filename=filename)
 
-        for path in [file_path, metadata_path]:
+        for path in [
+            file_path,
+            metadata_path,
+            pyramid_path,
+            tiled_path,
+            cleaned_path,
+            index_path,
+            rollup_path,
+        ]:
             if path.exists():
                 try:
                     path.unlink()
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Tuple, Union
+import logging
+import threading
+import xarray as xr
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledDataset:
+    """An open dataset plus the file identity it was opened for"""
+
+    def __init__(self, key: Tuple[str, int, int], dataset: xr.Dataset):
+        self.key = key
+        self.dataset = dataset
+        self.in_use = 0
+        self.retired = False
+
+
+class DatasetPool:
+    """
+    Process-wide pool of open NetCDF datasets shared across requests.
+
+    Handles are keyed by resolved path plus mtime/size, so a replaced file is
+    reopened instead of served stale. The least recently used handle is closed
+    once more than `max_open` files are open; handles still in use by another
+    request are closed when that request releases them.
+    """
+
+    def __init__(self, max_open: int):
+        self.max_open = max_open
+        self._entries: "OrderedDict[str, _PooledDataset]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _file_key(file_path: Union[str, Path]) -> Tuple[str, int, int]:
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        return str(path), stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def acquire(self, file_path: Union[str, Path]) -> Iterator[xr.Dataset]:
+        """Borrow an open dataset for `file_path`; do not close it yourself"""
+        key = self._file_key(file_path)
+        entry = self._checkout(key)
+        try:
+            yield entry.dataset
+        finally:
+            self._release(entry)
+
+    def _checkout(self, key: Tuple[str, int, int]) -> _PooledDataset:
+        path = key[0]
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(path)
+                entry.in_use += 1
+                self.hits += 1
+                return entry
+            if entry is not None:
+                # File was replaced on disk
+                self._retire(self._entries.pop(path))
+
+        # Open outside the lock so a slow file does not block other requests.
+        # cache=False keeps values read by one request from being pinned in
+        # the shared dataset.
+        dataset = xr.open_dataset(path, engine="h5netcdf", cache=False)
+        new_entry = _PooledDataset(key, dataset)
+        new_entry.in_use = 1
+
+        with self._lock:
+            self.misses += 1
+            current = self._entries.get(path)
+            if current is not None and current.key == key:
+                # Another request opened the same file meanwhile, use theirs
+                current.in_use += 1
+                self._entries.move_to_end(path)
+                dataset.close()
+                return current
+            if current is not None:
+                self._retire(self._entries.pop(path))
+            self._entries[path] = new_entry
+            while len(self._entries) > self.max_open:
+                _, evicted = self._entries.popitem(last=False)
+                self._retire(evicted)
+            return new_entry
+
+    def _release(self, entry: _PooledDataset) -> None:
+        with self._lock:
+            entry.in_use -= 1
+            close_now = entry.retired and entry.in_use == 0
+        if close_now:
+            entry.dataset.close()
+
+    def _retire(self, entry: _PooledDataset) -> None:
+        """Mark an entry as removed from the pool; caller must hold the lock"""
+        entry.retired = True
+        if entry.in_use == 0:
+            entry.dataset.close()
+
+    def invalidate(self, file_path: Union[str, Path]) -> None:
+        """Drop any pooled handle for `file_path`"""
+        path = str(Path(file_path).resolve())
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._retire(entry)
+
+    def close_all(self) -> None:
+        """Close every pooled handle (used at shutdown)"""
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem()
+                self._retire(entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_files": len(self._entries),
+                "max_open": self.max_open,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+dataset_pool = DatasetPool(max_open=settings.NETCDF_POOL_MAX_OPEN)
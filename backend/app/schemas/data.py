@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Dict, Any, Optional
 import pandas as pd
+from app.config import settings
 
 
 class FileUploadResponse(BaseModel):
@@ -26,7 +27,8 @@ class DataSummary(BaseModel):
 
 class TimeseriesResponse(BaseModel):
     x_axis: List[str]
-    y_axes: Dict[str, List[float]]
+    # Grouped series are keyed "<column>:<group>"; None where a group has no rows
+    y_axes: Dict[str, List[Optional[float]]]
     x_label: str
     y_labels: List[str]
     available_columns: List[str]
@@ -34,3 +36,27 @@ class TimeseriesResponse(BaseModel):
     data_count: int
     total_data_points: int
     filtered: bool
+
+
+class TileCoordinate(BaseModel):
+    zoom: int
+    x: int
+    y: int
+
+
+class TileBatchRequest(BaseModel):
+    tiles: List[TileCoordinate] = Field(..., min_length=1, max_length=256)
+    time_indices: List[int] = Field([0], min_length=1, max_length=32)
+    tile_size: int = Field(256, ge=16, le=settings.TILE_MAX_SIZE)
+    format: str = "f32"
+    resampling: str = "auto"
+
+    @model_validator(mode="after")
+    def check_pixels(self) -> "TileBatchRequest":
+        pixels = len(self.tiles) * len(self.time_indices) * self.tile_size**2
+        if pixels > settings.TILE_BATCH_MAX_PIXELS:
+            raise ValueError(
+                f"Batch of {pixels} pixels exceeds the limit of "
+                f"{settings.TILE_BATCH_MAX_PIXELS}, request fewer or smaller tiles"
+            )
+        return self
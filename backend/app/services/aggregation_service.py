@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import re
+from typing import Dict, List
+from app.core.exceptions import DataValidationError
+
+
+class AggregationService:
+    """
+    Grouped statistics of value columns, all computed from one sort.
+
+    Rows are numbered by group once; per value column the present values are
+    then sorted by (group, value) a single time, after which every requested
+    statistic is read off the sorted segments: sums and counts by bincount,
+    min and max from the segment ends and any quantile by interpolating
+    between the two nearest ranks (numpy's "linear" method). Quantiles are
+    written pNN, e.g. p5, p50 or p97.5; median is p50.
+    """
+
+    SUM = "sum"
+    MEAN = "mean"
+    MEDIAN = "median"
+    MIN = "min"
+    MAX = "max"
+    COUNT = "count"
+    STD = "std"
+    NAMED = (SUM, MEAN, MEDIAN, MIN, MAX, COUNT, STD)
+    QUANTILE_PATTERN = re.compile(r"^p(\d{1,2}(\.\d+)?|100)$")
+
+    @staticmethod
+    def validate(aggregations: List[str]) -> List[str]:
+        """Requested aggregations without duplicates, unknown ones rejected"""
+        for aggregation in aggregations:
+            if aggregation not in AggregationService.NAMED and not (
+                AggregationService.QUANTILE_PATTERN.match(aggregation)
+            ):
+                raise DataValidationError(
+                    f"Unknown aggregation {aggregation}, expected one of "
+                    f"{', '.join(AggregationService.NAMED)} or a percentile pNN"
+                )
+        return list(dict.fromkeys(aggregations))
+
+    @staticmethod
+    def aggregate(
+        df: pd.DataFrame,
+        keys: List[str],
+        value_cols: List[str],
+        aggregations: List[str],
+    ) -> pd.DataFrame:
+        """
+        Statistics of `value_cols` per group of `keys`, indexed by the groups
+        with one (column, aggregation) column each. Rows with a missing key
+        are left out; missing values are skipped like pandas does.
+        """
+        grouper = df.groupby(keys, observed=True)
+        groups = grouper.size().index
+        # Rows with a missing key are numbered NaN
+        ids = grouper.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        size = len(groups)
+
+        result: Dict[tuple, np.ndarray] = {}
+        for col in value_cols:
+            values = df[col].to_numpy(dtype=np.float64)
+            present = (ids >= 0) & ~np.isnan(values)
+            column = AggregationService._statistics(
+                ids[present], values[present], size, aggregations
+            )
+            for aggregation in aggregations:
+                result[(col, aggregation)] = column[aggregation]
+
+        return pd.DataFrame(
+            result, index=groups, columns=pd.MultiIndex.from_tuples(list(result))
+        )
+
+    @staticmethod
+    def _statistics(
+        ids: np.ndarray, values: np.ndarray, size: int, aggregations: List[str]
+    ) -> Dict[str, np.ndarray]:
+        order = np.lexsort((values, ids))
+        ids, values = ids[order], values[order]
+        counts = np.bincount(ids, minlength=size)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.bincount(ids, weights=values, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+
+        statistics = {}
+        for aggregation in aggregations:
+            if aggregation == AggregationService.SUM:
+                statistics[aggregation] = sums
+            elif aggregation == AggregationService.COUNT:
+                statistics[aggregation] = counts.astype(np.float64)
+            elif aggregation == AggregationService.MEAN:
+                statistics[aggregation] = means
+            elif aggregation == AggregationService.STD:
+                # Sample standard deviation, from deviations about the means
+                deviations = values - means[ids]
+                squares = np.bincount(ids, weights=deviations**2, minlength=size)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    statistics[aggregation] = np.where(
+                        counts > 1, np.sqrt(squares / (counts - 1)), np.nan
+                    )
+            else:
+                if aggregation == AggregationService.MIN:
+                    q = 0.0
+                elif aggregation == AggregationService.MAX:
+                    q = 1.0
+                elif aggregation == AggregationService.MEDIAN:
+                    q = 0.5
+                else:
+                    q = float(aggregation[1:]) / 100
+                statistics[aggregation] = AggregationService._quantile(
+                    values, starts, counts, q, empty
+                )
+        return statistics
+
+    @staticmethod
+    def _quantile(
+        values: np.ndarray,
+        starts: np.ndarray,
+        counts: np.ndarray,
+        q: float,
+        empty: np.ndarray,
+    ) -> np.ndarray:
+        """Quantile q of every sorted segment, NaN for empty ones"""
+        if not len(values):
+            return np.full(len(counts), np.nan)
+        rank = q * np.maximum(counts - 1, 0)
+        below = np.floor(rank).astype(np.int64)
+        above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+        last = len(values) - 1
+        low = values[np.minimum(starts + below, last)]
+        high = values[np.minimum(starts + above, last)]
+        return np.where(empty, np.nan, low + (high - low) * (rank - below))
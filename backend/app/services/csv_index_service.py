@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import logging
+import os
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Flat mapping of array names to arrays, as stored in the .npz sidecar
+CSVIndex = Dict[str, np.ndarray]
+
+
+class CSVIndexService:
+    """
+    Inverted index over the dimension columns of a cleaned CSV table.
+
+    For every column the distinct values are kept sorted, with the ids of
+    the rows holding each value stored contiguously and in ascending order
+    (a CSR layout): the rows of value k are rows[offsets[k]:offsets[k + 1]].
+    A multi-filter query intersects the row lists of the chosen values,
+    smallest first, so its cost follows the selected row counts rather than
+    the table size.
+
+    Every pair of columns also keeps the sorted value pairs that occur
+    together in some row, encoded as a * len(values of b) + b, from which
+    the options of one column given a value of another are read.
+    """
+
+    # Pair counts up to this are found with a bincount instead of a sort
+    DENSE_PAIRS_LIMIT = 1 << 24
+
+    @staticmethod
+    def build_index_file(
+        table_path: Union[str, Path],
+        index_path: Union[str, Path],
+        columns: List[str],
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Index the given columns of a cleaned Parquet table into an .npz file,
+        written next to it and renamed into place once complete. Returns the
+        distinct values of each column with their row counts.
+        """
+        present = [col for col in columns if col in pq.read_schema(table_path).names]
+        df = pd.read_parquet(table_path, engine="pyarrow", columns=present)
+        index = CSVIndexService.build_index(df, present)
+
+        index_path = Path(index_path)
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **index)
+            os.replace(tmp_path, index_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return CSVIndexService.value_counts(index)
+
+    @staticmethod
+    def build_index(df: pd.DataFrame, columns: List[str]) -> CSVIndex:
+        """Index the given columns of a table, skipping those it lacks"""
+        num_rows = len(df)
+        row_dtype = np.int32 if num_rows < np.iinfo(np.int32).max else np.int64
+        index = {"num_rows": np.array(num_rows, dtype=np.int64)}
+        ranked = []
+
+        for col in columns:
+            if col not in df.columns:
+                continue
+            series = df[col]
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype("category")
+
+            # Renumber the codes so values sort as strings, missing rows last
+            values = series.cat.categories.astype(str).to_numpy().astype(str)
+            order = np.argsort(values, kind="stable")
+            rank = np.empty(len(values) + 1, dtype=np.int32)
+            rank[order] = np.arange(len(values))
+            rank[-1] = len(values)
+            codes = rank[series.cat.codes.to_numpy()]
+
+            # A stable sort keeps the row ids of each value ascending
+            rows = np.argsort(codes, kind="stable").astype(row_dtype)
+            counts = np.bincount(codes, minlength=len(values) + 1)[: len(values)]
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+
+            index[f"{col}.values"] = values[order]
+            index[f"{col}.offsets"] = offsets.astype(np.int64)
+            index[f"{col}.rows"] = rows[: offsets[-1]]
+            ranked.append((col, codes, len(values)))
+
+        for (a, codes_a, size_a), (b, codes_b, size_b) in combinations(ranked, 2):
+            both = (codes_a < size_a) & (codes_b < size_b)
+            keys = codes_a[both].astype(np.int64) * size_b + codes_b[both]
+            if size_a * size_b <= CSVIndexService.DENSE_PAIRS_LIMIT:
+                pairs = np.flatnonzero(np.bincount(keys, minlength=size_a * size_b))
+            else:
+                pairs = np.unique(keys)
+            index[f"{a},{b}.pairs"] = pairs.astype(np.int64)
+        return index
+
+    @staticmethod
+    def columns(index: CSVIndex) -> List[str]:
+        """Names of the indexed columns"""
+        return [key[: -len(".values")] for key in index if key.endswith(".values")]
+
+    @staticmethod
+    def value_counts(index: CSVIndex) -> Dict[str, Dict[str, int]]:
+        """Distinct values of every indexed column with their row counts"""
+        return {
+            col: dict(
+                zip(
+                    index[f"{col}.values"].tolist(),
+                    np.diff(index[f"{col}.offsets"]).tolist(),
+                )
+            )
+            for col in CSVIndexService.columns(index)
+        }
+
+    @staticmethod
+    def value_rows(index: CSVIndex, col: str, value: str) -> np.ndarray:
+        """Sorted ids of the rows where `col` equals `value`"""
+        position = CSVIndexService._position(index, col, value)
+        if position is None:
+            return np.empty(0, dtype=index[f"{col}.rows"].dtype)
+        offsets = index[f"{col}.offsets"]
+        return index[f"{col}.rows"][offsets[position] : offsets[position + 1]]
+
+    @staticmethod
+    def cascading_options(
+        index: CSVIndex, filters: Dict[str, Optional[str]]
+    ) -> Dict[str, List[str]]:
+        """
+        Sorted values of every indexed column that occur together with each
+        chosen value of the other columns. Each filter is checked pairwise,
+        so with several filters a value may still lead to no rows.
+        """
+        indexed = CSVIndexService.columns(index)
+        options = {}
+        for col in indexed:
+            allowed = np.ones(len(index[f"{col}.values"]), dtype=bool)
+            for key, value in filters.items():
+                if value is None or key == col or key not in indexed:
+                    continue
+                allowed &= CSVIndexService._co_occurring(index, key, value, col)
+            options[col] = index[f"{col}.values"][allowed].tolist()
+        return options
+
+    @staticmethod
+    def _co_occurring(index: CSVIndex, a: str, value: str, b: str) -> np.ndarray:
+        """Mask of the values of `b` found in a row with `a` equal to `value`"""
+        size_a = len(index[f"{a}.values"])
+        size_b = len(index[f"{b}.values"])
+        allowed = np.zeros(size_b, dtype=bool)
+        position = CSVIndexService._position(index, a, value)
+        if position is None:
+            return allowed
+
+        if f"{a},{b}.pairs" in index:
+            # Pairs are sorted by the value of a, the matches are one range
+            pairs = index[f"{a},{b}.pairs"]
+            low, high = np.searchsorted(
+                pairs, [position * size_b, (position + 1) * size_b]
+            )
+            allowed[pairs[low:high] - position * size_b] = True
+        else:
+            pairs = index[f"{b},{a}.pairs"]
+            allowed[pairs[pairs % size_a == position] // size_a] = True
+        return allowed
+
+    @staticmethod
+    def _position(index: CSVIndex, col: str, value: str) -> Optional[int]:
+        values = index[f"{col}.values"]
+        position = int(np.searchsorted(values, str(value)))
+        if position == len(values) or values[position] != str(value):
+            return None
+        return position
+
+    @staticmethod
+    def lookup(
+        index: CSVIndex, filters: Dict[str, Optional[str]]
+    ) -> Tuple[Optional[np.ndarray], Dict[str, Optional[str]]]:
+        """
+        Rows matching every filter on an indexed column, or None when no such
+        filter is set, together with the filters the index cannot answer
+        """
+        indexed = set(CSVIndexService.columns(index))
+        remaining = {}
+        selections = []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key in indexed:
+                selections.append(CSVIndexService.value_rows(index, key, value))
+            else:
+                remaining[key] = value
+
+        if not selections:
+            return None, remaining
+        return CSVIndexService.intersect(selections), remaining
+
+    @staticmethod
+    def intersect(selections: List[np.ndarray]) -> np.ndarray:
+        """Intersection of sorted row id arrays, probing from the smallest"""
+        selections = sorted(selections, key=len)
+        rows = selections[0]
+        for other in selections[1:]:
+            if not len(rows):
+                break
+            # Binary-search the candidates in the larger list
+            position = np.minimum(np.searchsorted(other, rows), len(other) - 1)
+            rows = rows[other[position] == rows]
+        return rows
@@ -0,0 +1,170 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import logging
+import os
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Cuboids by name: the comma-joined dimensions they are grouped by
+Rollup = Dict[str, pd.DataFrame]
+
+
+class CSVRollupService:
+    """
+    Materialized year-level rollups of a cleaned CSV table.
+
+    Each cuboid groups the rows by year and up to MAX_DIMENSIONS of the
+    dimension columns, keeping the sum, non-missing count, min and max of
+    the value column plus the row count, so totals and means can be derived
+    without touching the rows. A query is answered from the smallest cuboid
+    whose dimensions cover its filters, re-aggregated over any dimensions
+    it was not filtered on.
+    """
+
+    # Highest number of dimensions grouped together in one cuboid
+    MAX_DIMENSIONS = 2
+    # Cuboids with more groups than this share of the table rows are not
+    # worth keeping, scanning the selected rows is about as fast
+    MAX_CUBOID_FRACTION = 0.1
+    # Statistics derivable from the kept aggregates
+    AGGREGATIONS = ("sum", "mean", "min", "max", "count")
+
+    @staticmethod
+    def build_rollup_file(
+        table_path: Union[str, Path],
+        rollup_path: Union[str, Path],
+        dimensions: List[str],
+        date_col: str = "year",
+        value_col: str = "value",
+    ) -> None:
+        """
+        Build the rollups of a cleaned Parquet table into a Parquet file,
+        written next to it and renamed into place once complete. Tables
+        without the date or value column get no rollup.
+        """
+        names = pq.read_schema(table_path).names
+        if date_col not in names or value_col not in names:
+            return
+        present = [col for col in dimensions if col in names]
+        df = pd.read_parquet(
+            table_path, engine="pyarrow", columns=present + [date_col, value_col]
+        )
+        rollup = CSVRollupService.build_rollup(df, present, date_col, value_col)
+
+        rollup_path = Path(rollup_path)
+        tmp_path = rollup_path.with_name(rollup_path.name + ".tmp")
+        try:
+            rollup.to_parquet(tmp_path, engine="pyarrow", index=False)
+            os.replace(tmp_path, rollup_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def build_rollup(
+        df: pd.DataFrame,
+        dimensions: List[str],
+        date_col: str = "year",
+        value_col: str = "value",
+    ) -> pd.DataFrame:
+        """
+        All cuboids of the table stacked into one frame, told apart by the
+        `cuboid` column; dimensions a cuboid is not grouped by are empty
+        """
+        max_groups = max(1, int(len(df) * CSVRollupService.MAX_CUBOID_FRACTION))
+        values = df[value_col].astype("float64")
+        # Dimensions are kept as text, as filters compare them, so numeric
+        # ones such as model ids do not widen to floats once concatenated
+        keys_by_col = {col: CSVRollupService._as_text(df[col]) for col in dimensions}
+        cuboids = []
+        for size in range(min(CSVRollupService.MAX_DIMENSIONS, len(dimensions)) + 1):
+            for group in combinations(dimensions, size):
+                keys = [keys_by_col[col] for col in group] + [df[date_col]]
+                cuboid = (
+                    values.groupby(keys, observed=True, dropna=False)
+                    .agg(["sum", "count", "min", "max", "size"])
+                    .rename(columns={"size": "rows"})
+                    .reset_index()
+                )
+                # The apex cuboid is always kept, it answers unfiltered queries
+                if size and len(cuboid) > max_groups:
+                    continue
+                cuboid.insert(0, "cuboid", ",".join(group))
+                cuboids.append(cuboid)
+
+        rollup = pd.concat(cuboids, ignore_index=True)
+        for col in ["cuboid"] + dimensions:
+            if col in rollup.columns:
+                rollup[col] = rollup[col].astype("category")
+        return rollup
+
+    @staticmethod
+    def _as_text(series: pd.Series) -> pd.Series:
+        """A dimension as a categorical of its values' text, missing kept"""
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        return series.cat.rename_categories(series.cat.categories.astype(str))
+
+    @staticmethod
+    def query(
+        rollup: Rollup,
+        filters: Dict[str, str],
+        date_col: str = "year",
+        group_by: Optional[str] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Per-year aggregates of the rows matching `filters`, indexed by year
+        (and by the values of `group_by` when given), or None when no cuboid
+        covers every filtered and grouped column
+        """
+        needed = set(filters) | ({group_by} if group_by else set())
+        covering = [
+            (len(cuboid), name)
+            for name, cuboid in rollup.items()
+            if needed <= set(CSVRollupService._dimensions(name))
+        ]
+        if not covering:
+            return None
+        _, name = min(covering)
+        cuboid = rollup[name]
+
+        for key, value in filters.items():
+            cuboid = cuboid[cuboid[key] == str(value)]
+
+        keys = [date_col] + ([group_by] if group_by else [])
+        return cuboid.groupby(keys, dropna=False, observed=True).agg(
+            sum=("sum", "sum"),
+            count=("count", "sum"),
+            min=("min", "min"),
+            max=("max", "max"),
+            rows=("rows", "sum"),
+        )
+
+    @staticmethod
+    def statistics(
+        summary: pd.DataFrame, aggregations: List[str], value_col: str = "value"
+    ) -> pd.DataFrame:
+        """
+        The requested statistics of a query result as (value column,
+        aggregation) columns; means of groups without values are NaN
+        """
+        columns = summary[["sum", "count", "min", "max"]].astype("float64")
+        columns["mean"] = columns["sum"] / columns["count"].where(columns["count"] > 0)
+        return pd.DataFrame(
+            {
+                (value_col, aggregation): columns[aggregation]
+                for aggregation in aggregations
+            },
+            index=summary.index,
+        )
+
+    @staticmethod
+    def total_rows(rollup: Rollup) -> int:
+        """Number of rows of the table the rollup was built from"""
+        return int(rollup[""]["rows"].sum())
+
+    @staticmethod
+    def _dimensions(name: str) -> List[str]:
+        return name.split(",") if name else []
@@ -1,8 +1,15 @@
 import pandas as pd
 import numpy as np
-from typing import Tuple, Dict, Any
+from typing import Any, Dict, List, Optional, Tuple, Union
 import logging
+import os
+import warnings
+from pathlib import Path
+from app.config import settings
 from app.core.exceptions import DataProcessingError
+from app.core.timing import timed
+from app.services.csv_stream_service import CSVStreamService, WriterFactory
+from app.services.date_format_service import DateFormatService
 
 logger = logging.getLogger(__name__)
 
@@ -16,93 +23,90 @@ class CSVService:
             "issues_found": [],
             "fixes_applied": [],
             "final_shape": None,
+            "timings": {},
         }
+        timings = cleaning_report["timings"]
 
         try:
             # Handle missing/inconsistent headers
-            if df.columns[0] == "Unnamed: 0" or any(
-                "Unnamed:" in col for col in df.columns
-            ):
-                cleaning_report["issues_found"].append(
-                    "Missing or unnamed headers detected"
-                )
-                if df.iloc[0].notna().sum() > df.iloc[1].notna().sum():
-                    df.columns = df.iloc[0]
-                    df = df.drop(df.index[0]).reset_index(drop=True)
-                    cleaning_report["fixes_applied"].append("Used first row as headers")
+            with timed(timings, "headers"):
+                if df.columns[0] == "Unnamed: 0" or any(
+                    "Unnamed:" in col for col in df.columns
+                ):
+                    cleaning_report["issues_found"].append(
+                        "Missing or unnamed headers detected"
+                    )
+                    if df.iloc[0].notna().sum() > df.iloc[1].notna().sum():
+                        df.columns = df.iloc[0]
+                        df = df.drop(df.index[0]).reset_index(drop=True)
+                        cleaning_report["fixes_applied"].append(
+                            "Used first row as headers"
+                        )
 
-            # Clean column names
-            df.columns = (
-                df.columns.astype(str).str.strip().str.lower().str.replace(" ", "_")
-            )
+                # Clean column names
+                df.columns = (
+                    df.columns.astype(str).str.strip().str.lower().str.replace(" ", "_")
+                )
 
             # Detect and standardize date columns
             date_columns = []
-            for col in df.columns:
-                if any(
-                    keyword in col.lower()
-                    for keyword in ["date", "time", "year", "month"]
-                ):
+            with timed(timings, "dates"):
+                for col in df.columns:
+                    # Numeric columns, integer years among them, stay as they are
+                    if df[col].dtype != "object" or not any(
+                        keyword in col.lower()
+                        for keyword in ["date", "time", "year", "month"]
+                    ):
+                        continue
                     try:
-                        if df[col].dtype == "object":
-                            df[col] = pd.to_datetime(
-                                df[col], errors="coerce", infer_datetime_format=True
+                        # The format is inferred from a sample, the column is
+                        # only parsed in full when one fits
+                        fmt = DateFormatService.infer(df[col])
+                        if fmt is None:
+                            continue
+                        df[col] = DateFormatService.parse(df[col], fmt)
+                        if fmt == DateFormatService.YEAR:
+                            cleaning_report["fixes_applied"].append(
+                                f"Converted year numbers in column: {col}"
+                            )
+                        else:
+                            date_columns.append(col)
+                            cleaning_report["fixes_applied"].append(
+                                f"Standardized date format in column: {col}"
                             )
-                            if df[col].notna().sum() > 0:
-                                date_columns.append(col)
-                                cleaning_report["fixes_applied"].append(
-                                    f"Standardized date format in column: {col}"
-                                )
                     except Exception as e:
                         logger.warning(f"Could not parse dates in column {col}: {e}")
 
             # Handle missing values
-            missing_before = df.isnull().sum().sum()
-            if missing_before > 0:
-                cleaning_report["issues_found"].append(
-                    f"Found {missing_before} missing values"
-                )
-
-                for col in df.columns:
-                    if df[col].dtype in ["float64", "int64"]:
-                        median_val = df[col].median()
-                        df[col].fillna(median_val, inplace=True)
-                        cleaning_report["fixes_applied"].append(
-                            f"Filled missing numeric values in {col} with median"
-                        )
-                    elif df[col].dtype == "object" and col not in date_columns:
-                        mode_val = (
-                            df[col].mode().iloc[0]
-                            if not df[col].mode().empty
-                            else "Unknown"
-                        )
-                        df[col].fillna(mode_val, inplace=True)
-                        cleaning_report["fixes_applied"].append(
-                            f"Filled missing categorical values in {col} with mode"
-                        )
+            with timed(timings, "missing_values"):
+                df = CSVService._fill_missing(df, date_columns, cleaning_report)
 
             # Detect and standardize temperature units
-            temp_columns = [
-                col
-                for col in df.columns
-                if any(keyword in col.lower() for keyword in ["temp", "temperature"])
-            ]
-            for col in temp_columns:
-                if df[col].dtype in ["float64", "int64"]:
-                    if df[col].mean() > 50:
-                        df[col] = (df[col] - 32) * 5 / 9
-                        cleaning_report["fixes_applied"].append(
-                            f"Converted {col} from Fahrenheit to Celsius"
-                        )
+            with timed(timings, "units"):
+                temp_columns = [
+                    col
+                    for col in df.columns
+                    if any(
+                        keyword in col.lower() for keyword in ["temp", "temperature"]
+                    )
+                ]
+                for col in temp_columns:
+                    if df[col].dtype in ["float64", "int64"]:
+                        if df[col].mean() > 50:
+                            df[col] = (df[col] - 32) * 5 / 9
+                            cleaning_report["fixes_applied"].append(
+                                f"Converted {col} from Fahrenheit to Celsius"
+                            )
 
             # Remove duplicate rows
-            duplicates = df.duplicated().sum()
-            if duplicates > 0:
-                df = df.drop_duplicates()
-                cleaning_report["issues_found"].append(
-                    f"Found {duplicates} duplicate rows"
-                )
-                cleaning_report["fixes_applied"].append("Removed duplicate rows")
+            with timed(timings, "duplicates"):
+                duplicates = df.duplicated().sum()
+                if duplicates > 0:
+                    df = df.drop_duplicates()
+                    cleaning_report["issues_found"].append(
+                        f"Found {duplicates} duplicate rows"
+                    )
+                    cleaning_report["fixes_applied"].append("Removed duplicate rows")
 
             cleaning_report["final_shape"] = df.shape
             cleaning_report["columns_after"] = df.columns.tolist()
@@ -113,6 +117,55 @@ class CSVService:
             logger.error(f"Error cleaning CSV data: {e}")
             raise DataProcessingError(f"Error cleaning CSV data: {str(e)}")
 
+    @staticmethod
+    def _fill_missing(
+        df: pd.DataFrame, date_columns: List[str], cleaning_report: Dict[str, Any]
+    ) -> pd.DataFrame:
+        """
+        Fill missing numeric values with the column median and missing text
+        values with the column mode. The missing counts, medians and modes
+        are each computed for all columns at once, and only for the columns
+        that have gaps, then applied in one fillna.
+        """
+        missing = df.isna().sum()
+        missing_before = missing.sum()
+        if missing_before == 0:
+            return df
+        cleaning_report["issues_found"].append(f"Found {missing_before} missing values")
+
+        numeric = [col for col in df.columns if df[col].dtype in ["float64", "int64"]]
+        text = [
+            col
+            for col in df.columns
+            if df[col].dtype == "object" and col not in date_columns
+        ]
+        for col in df.columns:
+            if col in numeric:
+                cleaning_report["fixes_applied"].append(
+                    f"Filled missing numeric values in {col} with median"
+                )
+            elif col in text:
+                cleaning_report["fixes_applied"].append(
+                    f"Filled missing categorical values in {col} with mode"
+                )
+
+        gaps = set(missing.index[missing > 0])
+        numeric = [col for col in numeric if col in gaps]
+        text = [col for col in text if col in gaps]
+        # The columns of one dtype are stored as rows of a block, so the
+        # transposed values give every column contiguously
+        values = df[numeric].to_numpy(dtype=np.float64).T
+        with warnings.catch_warnings():
+            # Columns without any value keep a NaN median and stay empty
+            warnings.simplefilter("ignore", RuntimeWarning)
+            fills = dict(zip(numeric, np.nanmedian(values, axis=1).tolist()))
+        if text:
+            # Columns without any value fall back to "Unknown"
+            modes = df[text].mode()
+            top = modes.iloc[0] if len(modes) else pd.Series(index=text)
+            fills.update(top.astype(object).where(top.notna(), "Unknown").to_dict())
+        return df.fillna(fills)
+
     @staticmethod
     def get_data_summary(df: pd.DataFrame) -> Dict[str, Any]:
         """Generate comprehensive summary of CSV data"""
@@ -122,7 +175,7 @@ class CSVService:
             "columns": df.columns.tolist(),
             "numeric_columns": df.select_dtypes(include=[np.number]).columns.tolist(),
             "categorical_columns": df.select_dtypes(
-                include=["object"]
+                include=["object", "category"]
             ).columns.tolist(),
             "date_columns": df.select_dtypes(include=["datetime64"]).columns.tolist(),
             "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
@@ -151,3 +204,30 @@ class CSVService:
             }
 
         return summary
+
+    @staticmethod
+    def process_csv_file(
+        file_path: Union[str, Path], open_writer: Optional[WriterFactory] = None
+    ) -> Dict[str, Any]:
+        """
+        Read, clean and summarize a saved CSV upload, writing the cleaned table
+        through `open_writer`. Files above CSV_STREAMING_MIN_BYTES are cleaned
+        in row batches by CSVStreamService instead of being loaded whole.
+        Returns only the small results so it can run in a worker process
+        without shipping the cleaned frame back.
+        """
+        if open_writer is not None and (
+            os.path.getsize(file_path) > settings.CSV_STREAMING_MIN_BYTES
+        ):
+            return CSVStreamService.process_csv_file(file_path, open_writer)
+
+        df = pd.read_csv(file_path)
+        cleaned_df, cleaning_report = CSVService.clean_csv_data(df)
+        if open_writer is not None:
+            with open_writer() as write:
+                write(cleaned_df)
+        return {
+            "cleaning_report": cleaning_report,
+            "preview": cleaned_df.head().to_dict("records"),
+            "summary": CSVService.get_data_summary(cleaned_df),
+        }
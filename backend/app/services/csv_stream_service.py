@@ -0,0 +1,461 @@
+import pandas as pd
+import numpy as np
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from app.core.exceptions import DataProcessingError
+from app.core.timing import timed
+from app.services.date_format_service import DateFormatService
+
+logger = logging.getLogger(__name__)
+
+# Opens a sink that takes the cleaned table one chunk at a time
+WriterFactory = Callable[[], ContextManager[Callable[[pd.DataFrame], None]]]
+
+
+class _QuantileSketch:
+    """
+    Mergeable uniform sample of a numeric stream: the values holding the
+    `size` smallest random keys. Exact while fewer values have been seen.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty(0)
+        self._values = np.empty(0)
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        keys = np.concatenate([self._keys, self._rng.random(len(values))])
+        values = np.concatenate([self._values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[: self.size]
+            keys, values = keys[keep], values[keep]
+        self._keys, self._values = keys, values
+
+    def quantile(self, q: float) -> float:
+        if not len(self._values):
+            return np.nan
+        return float(np.quantile(self._values, q))
+
+
+class _HashSet:
+    """
+    Set of 64-bit row hashes kept as sorted runs of geometrically growing
+    size, so inserts are amortized O(n log n) and lookups are binary searches
+    """
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            index = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[index] == hashes
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        self._runs.append(np.sort(hashes))
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            newest = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], newest]))
+
+
+class _Moments:
+    """Count, mean and M2 of a numeric stream, merged chunk by chunk"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        count = len(values)
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+    @property
+    def sum(self) -> float:
+        return self.mean * self.count
+
+
+class CSVStreamService:
+    """
+    Two-pass cleaning of CSV files larger than memory, mirroring
+    CSVService.clean_csv_data one row batch at a time.
+
+    The first pass gathers the global facts the fixes depend on: column
+    types, missing counts, medians (from a sampling sketch), modes (from
+    counters) and means. The second pass applies the fixes, drops duplicate
+    rows by 64-bit row hash and hands each cleaned batch to a writer.
+    """
+
+    CHUNK_ROWS = 250_000
+    # Values kept per numeric column to estimate its median
+    SKETCH_SIZE = 100_000
+
+    @staticmethod
+    def process_csv_file(
+        file_path: Union[str, Path],
+        open_writer: WriterFactory,
+        chunk_rows: int = CHUNK_ROWS,
+    ) -> Dict[str, Any]:
+        """
+        Clean a CSV file in row batches, writing the result through
+        `open_writer`. Returns the cleaning report, a preview and the summary
+        in the same shape as CSVService.process_csv_file.
+        """
+        try:
+            timings: Dict[str, float] = {}
+            with timed(timings, "headers"):
+                header_row, report = CSVStreamService._detect_header(file_path)
+            with timed(timings, "profile"):
+                profile = CSVStreamService._profile(file_path, header_row, chunk_rows)
+            plan = CSVStreamService._plan(profile, report)
+            with timed(timings, "rewrite"):
+                preview, summary = CSVStreamService._rewrite(
+                    file_path, header_row, chunk_rows, plan, report, open_writer
+                )
+            report["timings"] = timings
+            return {"cleaning_report": report, "preview": preview, "summary": summary}
+
+        except DataProcessingError:
+            raise
+        except Exception as e:
+            logger.error(f"Error cleaning CSV data: {e}")
+            raise DataProcessingError(f"Error cleaning CSV data: {str(e)}")
+
+    @staticmethod
+    def _read_chunks(
+        file_path: Union[str, Path], header_row: int, chunk_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(file_path, header=header_row, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                chunk.columns = (
+                    chunk.columns.astype(str)
+                    .str.strip()
+                    .str.lower()
+                    .str.replace(" ", "_")
+                )
+                yield chunk
+
+    @staticmethod
+    def _detect_header(file_path: Union[str, Path]) -> Tuple[int, Dict[str, Any]]:
+        """Header row to read with, plus the report started from the first rows"""
+        report = {
+            "original_shape": None,
+            "issues_found": [],
+            "fixes_applied": [],
+            "final_shape": None,
+        }
+        head = pd.read_csv(file_path, nrows=2)
+        header_row = 0
+        if len(head) >= 2 and any("Unnamed:" in str(col) for col in head.columns):
+            report["issues_found"].append("Missing or unnamed headers detected")
+            if head.iloc[0].notna().sum() > head.iloc[1].notna().sum():
+                # Equivalent to promoting the first data row to the header
+                header_row = 1
+                report["fixes_applied"].append("Used first row as headers")
+        return header_row, report
+
+    @staticmethod
+    def _is_date_column(col: str) -> bool:
+        return any(keyword in col for keyword in ["date", "time", "year", "month"])
+
+    @staticmethod
+    def _profile(
+        file_path: Union[str, Path], header_row: int, chunk_rows: int
+    ) -> Dict[str, Any]:
+        """
+        First pass: types, missing counts, medians, modes and means. Text date
+        columns are parsed with the format inferred from their first batch.
+        """
+        rows = 0
+        columns: List[str] = []
+        dtypes: Dict[str, set] = {}
+        missing: Counter = Counter()
+        parsed_dates: Counter = Counter()
+        date_formats: Dict[str, Optional[str]] = {}
+        sketches: Dict[str, _QuantileSketch] = {}
+        moments: Dict[str, _Moments] = {}
+        counts: Dict[str, Counter] = {}
+
+        for chunk in CSVStreamService._read_chunks(file_path, header_row, chunk_rows):
+            if not columns:
+                columns = chunk.columns.tolist()
+            rows += len(chunk)
+            for col in columns:
+                series = chunk[col]
+                fmt = None
+                if series.dtype == "object" and CSVStreamService._is_date_column(col):
+                    if col not in date_formats:
+                        date_formats[col] = DateFormatService.infer(series)
+                    fmt = date_formats[col]
+                    if fmt is not None:
+                        series = DateFormatService.parse(series, fmt)
+                dtypes.setdefault(col, set()).add(series.dtype)
+                if fmt is not None and fmt != DateFormatService.YEAR:
+                    parsed_dates[col] += int(series.notna().sum())
+                elif series.dtype == "object":
+                    counts.setdefault(col, Counter()).update(
+                        series.value_counts().to_dict()
+                    )
+                elif series.dtype.kind in "if":
+                    values = series.to_numpy(dtype=np.float64)
+                    sketches.setdefault(
+                        col, _QuantileSketch(CSVStreamService.SKETCH_SIZE)
+                    ).update(values)
+                    moments.setdefault(col, _Moments()).update(values)
+                missing[col] += int(series.isna().sum())
+
+        return {
+            "rows": rows,
+            "columns": columns,
+            "dtypes": dtypes,
+            "missing": missing,
+            "parsed_dates": parsed_dates,
+            "date_formats": date_formats,
+            "sketches": sketches,
+            "moments": moments,
+            "counts": counts,
+        }
+
+    @staticmethod
+    def _plan(profile: Dict[str, Any], report: Dict[str, Any]) -> Dict[str, Any]:
+        """Decide every fix from the first pass, recording it in the report"""
+        columns = profile["columns"]
+        report["original_shape"] = (profile["rows"], len(columns))
+
+        # A column keeps its type only if every batch parsed it the same way;
+        # ints mixed with floats widen to float, anything else to object
+        date_formats = profile["date_formats"]
+        dtypes = {}
+        for col in columns:
+            seen = profile["dtypes"][col]
+            fmt = date_formats.get(col)
+            if fmt is not None and fmt != DateFormatService.YEAR:
+                dtypes[col] = "datetime"
+            elif len(seen) == 1 and next(iter(seen)) != object:
+                dtypes[col] = str(next(iter(seen)))
+            elif all(dtype.kind in "if" for dtype in seen):
+                dtypes[col] = "float64"
+            else:
+                dtypes[col] = "object"
+
+        for col in columns:
+            if dtypes[col] == "datetime" and profile["parsed_dates"][col] > 0:
+                report["fixes_applied"].append(
+                    f"Standardized date format in column: {col}"
+                )
+            elif date_formats.get(col) == DateFormatService.YEAR:
+                report["fixes_applied"].append(
+                    f"Converted year numbers in column: {col}"
+                )
+
+        fills = {}
+        missing_before = sum(profile["missing"].values())
+        if missing_before > 0:
+            report["issues_found"].append(f"Found {missing_before} missing values")
+            for col in columns:
+                if dtypes[col] in ["float64", "int64"]:
+                    fills[col] = profile["sketches"][col].quantile(0.5)
+                    report["fixes_applied"].append(
+                        f"Filled missing numeric values in {col} with median"
+                    )
+                elif dtypes[col] == "object":
+                    counts = profile["counts"].get(col)
+                    if counts:
+                        # Most frequent value, ties broken like Series.mode
+                        top = max(counts.values())
+                        fills[col] = min(
+                            value for value, count in counts.items() if count == top
+                        )
+                    else:
+                        fills[col] = "Unknown"
+                    report["fixes_applied"].append(
+                        f"Filled missing categorical values in {col} with mode"
+                    )
+
+        to_celsius = []
+        for col in columns:
+            if not any(keyword in col for keyword in ["temp", "temperature"]):
+                continue
+            if dtypes[col] not in ["float64", "int64"]:
+                continue
+            moments = profile["moments"][col]
+            total = moments.sum
+            if col in fills:
+                total += profile["missing"][col] * fills[col]
+            if profile["rows"] and total / profile["rows"] > 50:
+                to_celsius.append(col)
+                report["fixes_applied"].append(
+                    f"Converted {col} from Fahrenheit to Celsius"
+                )
+
+        return {
+            "columns": columns,
+            "dtypes": dtypes,
+            "date_formats": date_formats,
+            "fills": fills,
+            "to_celsius": to_celsius,
+        }
+
+    @staticmethod
+    def _apply(chunk: pd.DataFrame, plan: Dict[str, Any]) -> pd.DataFrame:
+        for col in plan["columns"]:
+            dtype = plan["dtypes"][col]
+            fmt = plan["date_formats"].get(col)
+            if fmt is not None:
+                chunk[col] = DateFormatService.parse(chunk[col], fmt)
+            if dtype == "datetime":
+                continue
+            chunk[col] = chunk[col].astype(dtype)
+            if col in plan["fills"]:
+                chunk[col] = chunk[col].fillna(plan["fills"][col])
+        for col in plan["to_celsius"]:
+            chunk[col] = (chunk[col] - 32) * 5 / 9
+        return chunk
+
+    @staticmethod
+    def _rewrite(
+        file_path: Union[str, Path],
+        header_row: int,
+        chunk_rows: int,
+        plan: Dict[str, Any],
+        report: Dict[str, Any],
+        open_writer: WriterFactory,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Second pass: apply the fixes, drop duplicates and write the batches"""
+        seen = _HashSet()
+        duplicates = 0
+        preview: List[Dict[str, Any]] = []
+        summary = _SummaryAccumulator()
+
+        with open_writer() as write:
+            for chunk in CSVStreamService._read_chunks(
+                file_path, header_row, chunk_rows
+            ):
+                chunk = CSVStreamService._apply(chunk, plan)
+
+                hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+                repeated = pd.Series(hashes).duplicated().to_numpy()
+                repeated |= seen.contains(hashes)
+                duplicates += int(repeated.sum())
+                chunk = chunk[~repeated]
+                seen.add(hashes[~repeated])
+
+                if len(preview) < 5:
+                    preview.extend(chunk.head(5 - len(preview)).to_dict("records"))
+                summary.update(chunk)
+                write(chunk)
+
+        if duplicates > 0:
+            report["issues_found"].append(f"Found {duplicates} duplicate rows")
+            report["fixes_applied"].append("Removed duplicate rows")
+        report["final_shape"] = (summary.rows, len(plan["columns"]))
+        report["columns_after"] = plan["columns"]
+        return preview, summary.result(plan["columns"])
+
+
+class _SummaryAccumulator:
+    """CSVService.get_data_summary, computed over a stream of row batches"""
+
+    def __init__(self):
+        self.rows = 0
+        self.memory_bytes = 0
+        self.dtypes: Dict[str, Any] = {}
+        self.counts: Dict[str, Counter] = {}
+        self.years: set = set()
+        self.values = _Moments()
+        self.median = _QuantileSketch(CSVStreamService.SKETCH_SIZE)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows += len(chunk)
+        self.memory_bytes += int(chunk.memory_usage(deep=True).sum())
+        self.dtypes = chunk.dtypes.to_dict()
+        for col in ["Model", "scenario", "region"]:
+            if col in chunk.columns:
+                self.counts.setdefault(col, Counter()).update(
+                    chunk[col].value_counts().to_dict()
+                )
+        if "year" in chunk.columns:
+            self.years.update(chunk["year"].dropna().unique().tolist())
+        if "value" in chunk.columns:
+            values = chunk["value"].to_numpy(dtype=np.float64)
+            self.values.update(values)
+            self.median.update(values)
+
+    def result(self, columns: List[str]) -> Dict[str, Any]:
+        # Column classes come from an empty frame with the final dtypes
+        typed = pd.DataFrame(
+            {col: pd.Series(dtype=self.dtypes.get(col, object)) for col in columns}
+        )
+        summary = {
+            "total_rows": self.rows,
+            "total_columns": len(columns),
+            "columns": columns,
+            "numeric_columns": typed.select_dtypes(
+                include=[np.number]
+            ).columns.tolist(),
+            "categorical_columns": typed.select_dtypes(
+                include=["object"]
+            ).columns.tolist(),
+            "date_columns": typed.select_dtypes(
+                include=["datetime64"]
+            ).columns.tolist(),
+            "memory_usage_mb": self.memory_bytes / 1024 / 1024,
+        }
+
+        if "Model" in self.counts:
+            summary["models"] = dict(self.counts["Model"].most_common())
+        if "scenario" in self.counts:
+            summary["scenarios"] = dict(self.counts["scenario"].most_common())
+        if "region" in self.counts:
+            summary["regions"] = dict(self.counts["region"].most_common(10))
+        if self.years:
+            summary["year_range"] = {
+                "min": int(min(self.years)),
+                "max": int(max(self.years)),
+                "count": len(self.years),
+            }
+        if self.values.count:
+            std = (
+                np.sqrt(self.values.m2 / (self.values.count - 1))
+                if self.values.count > 1
+                else np.nan
+            )
+            summary["value_stats"] = {
+                "min": float(self.values.min),
+                "max": float(self.values.max),
+                "mean": float(self.values.mean),
+                "median": self.median.quantile(0.5),
+                "std": float(std),
+            }
+        return summary
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import warnings
+from typing import List, Optional
+from pandas.tseries.api import guess_datetime_format
+
+
+class DateFormatService:
+    """
+    Date detection for text columns from a sample of their values.
+
+    Up to SAMPLE_SIZE present values, spread evenly over the column, are
+    tested instead of the whole column. Candidate formats are guessed from
+    a few distinct sampled values, and the one parsing the most of the
+    sample is kept if it parses at least MIN_PARSED_SHARE of it, so e.g.
+    day-first and month-first dates are told apart by the sample rather
+    than by its first value. The full column is then parsed once with that
+    fixed format, one distinct value at a time; columns no format fits are
+    left as they are.
+
+    Whole numbers of up to four digits are year numbers, not dates: they
+    are read as numbers, matching columns already loaded as integer years.
+    """
+
+    SAMPLE_SIZE = 1000
+    # Distinct sampled values formats are guessed from
+    GUESSES = 5
+    # Formats tried after the guessed ones, which miss month names
+    FALLBACK_FORMATS = ("%b %Y", "%B %Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y")
+    MIN_PARSED_SHARE = 0.9
+    # Pseudo format of columns holding year numbers
+    YEAR = "year"
+    YEAR_PATTERN = r"^\s*\d{1,4}(\.0*)?\s*$"
+
+    @staticmethod
+    def infer(series: pd.Series) -> Optional[str]:
+        """Format the text column is parsed with: YEAR, a strptime format or None"""
+        sample = DateFormatService.sample(series)
+        if not len(sample):
+            return None
+        if sample.str.match(DateFormatService.YEAR_PATTERN).all():
+            return DateFormatService.YEAR
+
+        best, best_share = None, 0.0
+        for fmt in DateFormatService._candidates(sample):
+            share = pd.to_datetime(sample, format=fmt, errors="coerce").notna().mean()
+            if share > best_share:
+                best, best_share = fmt, share
+        if best_share < DateFormatService.MIN_PARSED_SHARE:
+            return None
+        return best
+
+    @staticmethod
+    def parse(series: pd.Series, fmt: str) -> pd.Series:
+        """The column parsed with an inferred format, unparseable values missing"""
+        if fmt == DateFormatService.YEAR:
+            return pd.to_numeric(series, errors="coerce")
+        # Dates repeat a lot, each distinct value is parsed once
+        codes, uniques = pd.factorize(series)
+        parsed = pd.to_datetime(
+            pd.Series(uniques, dtype=object), format=fmt, errors="coerce"
+        )
+        return pd.Series(
+            parsed.array.take(codes, allow_fill=True),
+            index=series.index,
+            name=series.name,
+        )
+
+    @staticmethod
+    def sample(series: pd.Series) -> pd.Series:
+        """Up to SAMPLE_SIZE present values spread over the column, as text"""
+        present = series.dropna()
+        if len(present) > DateFormatService.SAMPLE_SIZE:
+            positions = np.linspace(
+                0, len(present) - 1, DateFormatService.SAMPLE_SIZE
+            ).astype(int)
+            present = present.iloc[positions]
+        return present.astype(str)
+
+    @staticmethod
+    def _candidates(sample: pd.Series) -> List[str]:
+        candidates = []
+        with warnings.catch_warnings():
+            # Day-first guesses warn, the sample decides between them
+            warnings.simplefilter("ignore", UserWarning)
+            for value in sample.drop_duplicates().iloc[: DateFormatService.GUESSES]:
+                for dayfirst in (False, True):
+                    fmt = guess_datetime_format(value, dayfirst=dayfirst)
+                    if fmt is not None and fmt not in candidates:
+                        candidates.append(fmt)
+        return candidates + [
+            fmt for fmt in DateFormatService.FALLBACK_FORMATS if fmt not in candidates
+        ]
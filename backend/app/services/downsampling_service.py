@@ -0,0 +1,133 @@
+import numpy as np
+from typing import List
+from app.core.exceptions import DataValidationError
+
+
+class DownsamplingService:
+    """
+    Shape-preserving reduction of long series to a bounded number of points.
+
+    Both methods pick a subset of the original points, so every value sent
+    is a real one. Missing (NaN) values are never preferred over present
+    ones.
+
+    LTTB (largest-triangle-three-buckets) keeps the first and last points
+    and, per bucket, the point spanning the largest triangle with the point
+    kept before it and the mean of the next bucket; the areas of a bucket
+    are computed in one vectorized step. The min/max envelope keeps the
+    lowest and highest point of every bucket, found for all buckets at once
+    over a padded bucket matrix, which preserves spikes exactly.
+    """
+
+    LTTB = "lttb"
+    MINMAX = "minmax"
+    METHODS = (LTTB, MINMAX)
+    # LTTB needs the two end points and at least one bucket
+    MIN_POINTS = 3
+
+    @staticmethod
+    def validate(method: str, max_points: int) -> None:
+        if method not in DownsamplingService.METHODS:
+            raise DataValidationError(
+                f"Unknown downsampling method {method}, "
+                f"expected one of {', '.join(DownsamplingService.METHODS)}"
+            )
+        if max_points < DownsamplingService.MIN_POINTS:
+            raise DataValidationError(
+                f"max_points must be at least {DownsamplingService.MIN_POINTS}"
+            )
+
+    @staticmethod
+    def select(
+        x: np.ndarray, series: List[np.ndarray], max_points: int, method: str = LTTB
+    ) -> np.ndarray:
+        """
+        Sorted positions of the points to keep from series sharing the x
+        axis `x`. Each series gets an equal share of `max_points` and the
+        positions picked for all of them are merged, so the result never
+        holds more than `max_points` positions.
+        """
+        DownsamplingService.validate(method, max_points)
+        if len(x) <= max_points or not series:
+            return np.arange(len(x))
+
+        share = max(DownsamplingService.MIN_POINTS, max_points // len(series))
+        reduce = (
+            DownsamplingService.lttb
+            if method == DownsamplingService.LTTB
+            else DownsamplingService.minmax
+        )
+        picked = np.unique(np.concatenate([reduce(x, y, share) for y in series]))
+        if len(picked) > max_points:
+            # Series too many for a share each, thin the merged positions
+            picked = picked[np.linspace(0, len(picked) - 1, max_points).astype(int)]
+        return picked
+
+    @staticmethod
+    def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+        """Positions of the `threshold` points LTTB keeps"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        n = len(x)
+        if n <= threshold:
+            return np.arange(n)
+
+        # Interior points split into threshold - 2 buckets
+        edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+        kept = np.empty(threshold, dtype=np.int64)
+        kept[0], kept[-1] = 0, n - 1
+
+        # Means of every bucket, the last one followed by the final point
+        means_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1), x[-1])
+        means_y = np.append(DownsamplingService._nanmeans(y, edges), y[-1])
+        sizes = np.append(np.diff(edges), 1)
+        means_x[:-1] /= sizes[:-1]
+
+        previous = 0
+        for bucket in range(threshold - 2):
+            start, stop = edges[bucket], edges[bucket + 1]
+            xa, ya = x[previous], y[previous]
+            xc, yc = means_x[bucket + 1], means_y[bucket + 1]
+            areas = np.abs(
+                (xa - xc) * (y[start:stop] - ya) - (xa - x[start:stop]) * (yc - ya)
+            )
+            # Missing values span no triangle, the first point wins if all are
+            previous = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+            kept[bucket + 1] = previous
+        return kept
+
+    @staticmethod
+    def minmax(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+        """Positions of the lowest and highest point of threshold // 2 buckets"""
+        y = np.asarray(y, dtype=np.float64)
+        n = len(y)
+        if n <= threshold:
+            return np.arange(n)
+
+        buckets = max(1, threshold // 2)
+        edges = np.linspace(0, n, buckets + 1).astype(int)
+        starts, stops = edges[:-1], edges[1:]
+        width = int((stops - starts).max())
+
+        # One row per bucket, padded past its end so NaN-aware reductions
+        # run over all buckets at once
+        positions = starts[:, np.newaxis] + np.arange(width)
+        inside = positions < stops[:, np.newaxis]
+        values = np.where(inside, y[np.minimum(positions, n - 1)], np.nan)
+        missing = np.isnan(values)
+        lowest = np.where(missing, np.inf, values).argmin(axis=1)
+        highest = np.where(missing, -np.inf, values).argmax(axis=1)
+
+        rows = np.arange(buckets)
+        picked = np.concatenate([positions[rows, lowest], positions[rows, highest]])
+        return np.unique(picked)
+
+    @staticmethod
+    def _nanmeans(y: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """Means of the present values of each interior bucket, NaN if none"""
+        interior = y[1:-1]
+        present = ~np.isnan(interior)
+        sums = np.add.reduceat(np.where(present, interior, 0.0), edges[:-1] - 1)
+        counts = np.add.reduceat(present.astype(np.int64), edges[:-1] - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts
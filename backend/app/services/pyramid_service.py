@@ -0,0 +1,142 @@
+import numpy as np
+import h5netcdf
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Union
+import xarray as xr
+from app.config import settings
+from app.repositories.dataset_pool import dataset_pool
+from app.services.resampling_service import ResamplingService
+
+logger = logging.getLogger(__name__)
+
+
+class PyramidService:
+    """Multi-resolution overviews of NetCDF variables for the tile viewer"""
+
+    # Overviews are built until both spatial axes fit in one tile of this size
+    OVERVIEW_TILE_SIZE = 256
+    # Upper bound on source data held in memory while building
+    BUILD_BLOCK_BYTES = settings.RASTER_MAX_LOAD_BYTES
+
+    @staticmethod
+    def level_name(variable: str, level: int) -> str:
+        """Name of the sidecar variable holding `variable` at overview `level`"""
+        return f"{variable}_L{level}"
+
+    @staticmethod
+    def downsample_2x(data: np.ndarray) -> np.ndarray:
+        """NaN-aware 2x2 block mean over the last two axes (odd edges padded)"""
+        return ResamplingService.block_reduce(data, 2, ResamplingService.MEAN)
+
+    @staticmethod
+    def select_level(source_extent: int, tile_size: int) -> int:
+        """Overview level whose resolution is nearest to one source pixel per tile pixel"""
+        if source_extent <= tile_size:
+            return 0
+        return max(0, round(math.log2(source_extent / tile_size)))
+
+    @staticmethod
+    def available_level(overview_ds: xr.Dataset, variable: str, level: int) -> int:
+        """Highest built level not above `level` (0 means full resolution)"""
+        while (
+            level > 0 and PyramidService.level_name(variable, level) not in overview_ds
+        ):
+            level -= 1
+        return level
+
+    @staticmethod
+    def build_pyramid(
+        file_path: Union[str, Path], pyramid_path: Union[str, Path]
+    ) -> None:
+        """
+        Build 2x block-averaged overview levels for every spatial variable and
+        time step of a NetCDF file into a sidecar NetCDF file.
+        """
+        pyramid_path = Path(pyramid_path)
+        tmp_path = pyramid_path.with_name(pyramid_path.name + ".tmp")
+        try:
+            with dataset_pool.acquire(file_path) as ds, h5netcdf.File(
+                tmp_path, "w"
+            ) as sidecar:
+                for variable in ds.data_vars:
+                    PyramidService._build_variable(ds[variable], variable, sidecar)
+
+            # Publish atomically so the tile endpoint never sees a partial file
+            os.replace(tmp_path, pyramid_path)
+            dataset_pool.invalidate(pyramid_path)
+        except Exception as e:
+            logger.error(f"Error building overview pyramid for {file_path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def _build_variable(
+        var_data: xr.DataArray, variable: str, sidecar: h5netcdf.File
+    ) -> None:
+        has_time = "time" in var_data.dims and var_data.ndim == 3
+        if var_data.ndim != 2 and not has_time:
+            return
+
+        n_times = var_data.sizes["time"] if has_time else 1
+        if has_time and "time" not in sidecar.dimensions:
+            sidecar.dimensions["time"] = n_times
+
+        # Work out level shapes up front and create one sidecar variable per level
+        height, width = var_data.shape[-2:]
+        levels = []
+        while max(height, width) > PyramidService.OVERVIEW_TILE_SIZE:
+            height, width = math.ceil(height / 2), math.ceil(width / 2)
+            name = PyramidService.level_name(variable, len(levels) + 1)
+            lat_dim, lon_dim = f"{name}_lat", f"{name}_lon"
+            sidecar.dimensions[lat_dim] = height
+            sidecar.dimensions[lon_dim] = width
+            dims = (("time",) if has_time else ()) + (lat_dim, lon_dim)
+            chunks = ((1,) if has_time else ()) + (
+                min(height, PyramidService.OVERVIEW_TILE_SIZE),
+                min(width, PyramidService.OVERVIEW_TILE_SIZE),
+            )
+            levels.append(
+                sidecar.create_variable(
+                    name,
+                    dims,
+                    np.float32,
+                    chunks=chunks,
+                    fillvalue=np.nan,
+                    compression="gzip",
+                    compression_opts=1,
+                )
+            )
+
+        if not levels:
+            return
+
+        # Read in blocks that follow the source chunking along time and cover
+        # row bands aligned to the coarsest level, so every source chunk is
+        # decompressed once and block means never straddle two bands
+        time_block = 1
+        if has_time:
+            chunksizes = var_data.encoding.get("chunksizes") or (1,)
+            time_block = max(1, min(n_times, chunksizes[0]))
+        alignment = 2 ** len(levels)
+        row_bytes = time_block * var_data.shape[-1] * 4
+        band_rows = max(1, PyramidService.BUILD_BLOCK_BYTES // (row_bytes * alignment))
+        band_rows *= alignment
+
+        for t0 in range(0, n_times, time_block):
+            t1 = min(n_times, t0 + time_block)
+            for r0 in range(0, var_data.shape[-2], band_rows):
+                r1 = min(var_data.shape[-2], r0 + band_rows)
+                if has_time:
+                    block = var_data[t0:t1, r0:r1, :].values
+                else:
+                    block = var_data[r0:r1, :].values
+                for level, overview in enumerate(levels, start=1):
+                    block = PyramidService.downsample_2x(block)
+                    row = r0 // 2**level
+                    if has_time:
+                        overview[t0:t1, row : row + block.shape[-2], :] = block
+                    else:
+                        overview[row : row + block.shape[-2], :] = block
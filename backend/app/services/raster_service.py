@@ -1,79 +1,411 @@
 import pandas as pd
 import numpy as np
 import xarray as xr
-from typing import Tuple, Dict, Any
+import h5netcdf
+from typing import Tuple, Dict, Any, List, Optional, Union
 import logging
 import os
+from contextlib import ExitStack
+from pathlib import Path
+from app.config import settings
 from app.core.exceptions import DataProcessingError
+from app.repositories.dataset_pool import dataset_pool
+from app.services.pyramid_service import PyramidService
+from app.services.raster_stats_service import RasterStatsService
+from app.services.resampling_service import ResamplingService
 
 logger = logging.getLogger(__name__)
 
 
 class RasterService:
+    # Extra source pixels read around a tile window so interpolation at the
+    # tile edges sees its neighbours
+    TILE_HALO = 1
+    # Spatial chunk edge of the tile-aligned copy written at upload
+    TILED_CHUNK_SIZE = 256
+    # Upper bound on raw data held in memory while rechunking
+    RECHUNK_BLOCK_BYTES = settings.RASTER_MAX_LOAD_BYTES
+    # Sample layers smaller than this many values are inlined at upload
+    SAMPLE_LAYER_MAX_SIZE = 10000
+    # Largest union window a tile batch reads in one go
+    BATCH_WINDOW_MAX_BYTES = 64 * 1024 * 1024
+
+    @staticmethod
+    def rechunk_for_tiles(
+        file_path: Union[str, Path], tiled_path: Union[str, Path]
+    ) -> None:
+        """
+        Write a copy of a NetCDF file whose data variables are stored in
+        (1, 256, 256)-style chunks with a fast compressor, so tile windows and
+        per-pixel time series read only the chunks they touch. Values are
+        copied raw, keeping packing attributes such as scale_factor.
+        """
+        tiled_path = Path(tiled_path)
+        tmp_path = tiled_path.with_name(tiled_path.name + ".tmp")
+        chunk = RasterService.TILED_CHUNK_SIZE
+        try:
+            # invalid_netcdf allows the lzf filter, which h5py always ships
+            with h5netcdf.File(file_path, "r") as source, h5netcdf.File(
+                tmp_path, "w", invalid_netcdf=True
+            ) as target:
+                target.attrs.update(source.attrs)
+                target.dimensions = {
+                    name: dim.size for name, dim in source.dimensions.items()
+                }
+
+                for name, var in source.variables.items():
+                    attrs = dict(var.attrs)
+                    fillvalue = attrs.pop("_FillValue", None)
+                    if var.ndim < 2 or name in source.dimensions:
+                        # Coordinates and small variables are copied as they are
+                        target.create_variable(
+                            name, var.dimensions, var.dtype, data=var[...]
+                        )
+                        target.variables[name].attrs.update(attrs)
+                        continue
+
+                    height, width = var.shape[-2:]
+                    out = target.create_variable(
+                        name,
+                        var.dimensions,
+                        var.dtype,
+                        fillvalue=fillvalue,
+                        chunks=(1,) * (var.ndim - 2)
+                        + (min(chunk, height), min(chunk, width)),
+                        compression="lzf",
+                        shuffle=True,
+                    )
+                    out.attrs.update(attrs)
+
+                    # Copy in blocks that follow the source chunking along the
+                    # leading axis, so every source chunk is decompressed once.
+                    # Axes between it and the grid (e.g. levels) are copied
+                    # whole, and the row bands are taken along the second to
+                    # last axis
+                    lead = var.chunks[0] if var.chunks and var.ndim > 2 else 1
+                    middle = (slice(None),) * max(0, var.ndim - 3)
+                    planes = int(np.prod(var.shape[1:-2])) if var.ndim > 2 else 1
+                    row_bytes = lead * planes * width * var.dtype.itemsize
+                    band = max(chunk, RasterService.RECHUNK_BLOCK_BYTES // row_bytes)
+                    band -= band % chunk
+                    steps = var.shape[0] if var.ndim > 2 else 1
+                    for t0 in range(0, steps, lead):
+                        leading = slice(t0, min(steps, t0 + lead))
+                        for r0 in range(0, height, band):
+                            rows = slice(r0, min(height, r0 + band))
+                            block = (
+                                (leading,) + middle + (rows,)
+                                if var.ndim > 2
+                                else (rows,)
+                            )
+                            out[block] = var[block]
+
+            # Publish atomically so readers never see a partial file
+            os.replace(tmp_path, tiled_path)
+            dataset_pool.invalidate(tiled_path)
+        except Exception as e:
+            logger.error(f"Error rechunking {file_path} for tiles: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def prepare_tile_sources(
+        file_path: Union[str, Path],
+        tiled_path: Union[str, Path],
+        pyramid_path: Union[str, Path],
+    ) -> None:
+        """
+        Ingest stage run after upload: write the tile-aligned copy, then build
+        the overview pyramid from it (or from the original if rechunking failed).
+        Runs in a worker process, so the handles it pooled are closed before
+        returning; clearing the upload only reaches the API process's pool.
+        """
+        try:
+            RasterService.rechunk_for_tiles(file_path, tiled_path)
+            source = tiled_path if Path(tiled_path).exists() else file_path
+            PyramidService.build_pyramid(source, pyramid_path)
+        finally:
+            for path in (file_path, tiled_path):
+                dataset_pool.invalidate(path)
+
+    @staticmethod
+    def _tile_bounds(size: int, tiles_per_row: int, index: int) -> Tuple[int, int]:
+        """Source index range [start, end) covered by tile `index` along one axis"""
+        per_tile = max(1, size // tiles_per_row)
+        start = min(index * per_tile, size - 1)
+        end = min((index + 1) * per_tile, size)
+        return start, end
+
     @staticmethod
     def process_raster_data(file_path: str) -> dict:
         """
-        Clean and standardize the NetCDF raster data
+        Clean and standardize the NetCDF raster data. Only header metadata is
+        read eagerly; the statistics are streamed and the sample layers are
+        taken from them, loading a layer's values only when small enough for
+        the JSON preview. Like prepare_tile_sources it runs in a worker process
+        and closes its pooled handle before returning.
         """
         try:
-            # Read NetCDF data from uploaded file
-            ds = xr.open_dataset(file_path, engine="h5netcdf")
-
-            # Load the data into memory
-            ds = ds.load()
-
-            # Get basic info about the dataset
-            info = {
-                "dimensions": dict(ds.dims),
-                "variables": list(ds.data_vars),
-                "coordinates": list(ds.coords),
-                "attributes": dict(ds.attrs),
-                "shape": {var: ds[var].shape for var in ds.data_vars},
-            }
-
-            # Extract sample data for visualization (first variable, first two time slices)
-            if ds.data_vars:
-                first_var = list(ds.data_vars)[0]
-                var_data = ds[first_var]
-
-                # Get two monthly layers if time dimension exists
-                if "time" in var_data.dims and len(var_data.time) >= 2:
-                    layer1 = var_data.isel(time=0).values
-                    layer2 = var_data.isel(time=1).values
-
-                    info["sample_layers"] = {
-                        "layer1": {
-                            "data": (
-                                layer1.tolist()
-                                if layer1.size < 10000
-                                else "Too large for JSON"
-                            ),
-                            "shape": layer1.shape,
-                            "min": float(np.nanmin(layer1)),
-                            "max": float(np.nanmax(layer1)),
-                            "mean": float(np.nanmean(layer1)),
-                        },
-                        "layer2": {
-                            "data": (
-                                layer2.tolist()
-                                if layer2.size < 10000
-                                else "Too large for JSON"
-                            ),
-                            "shape": layer2.shape,
-                            "min": float(np.nanmin(layer2)),
-                            "max": float(np.nanmax(layer2)),
-                            "mean": float(np.nanmean(layer2)),
-                        },
-                    }
+            # Stream statistics first, every block stays under the load ceiling
+            statistics = RasterStatsService.compute_statistics(file_path)
+
+            with dataset_pool.acquire(file_path) as ds:
+                # Get basic info about the dataset
+                info = {
+                    "dimensions": dict(ds.sizes),
+                    "variables": list(ds.data_vars),
+                    "coordinates": list(ds.coords),
+                    "attributes": dict(ds.attrs),
+                    "shape": {var: ds[var].shape for var in ds.data_vars},
+                    "statistics": statistics,
+                }
 
-            # Close the dataset
-            ds.close()
+                # Extract sample data for visualization (first variable, first two time slices)
+                if ds.data_vars:
+                    first_var = list(ds.data_vars)[0]
+                    var_data = ds[first_var]
+
+                    # Get two monthly layers if time dimension exists
+                    if "time" in var_data.dims and var_data.sizes["time"] >= 2:
+                        steps = statistics[first_var]["time_steps"]
+                        info["sample_layers"] = {
+                            f"layer{index + 1}": RasterService._sample_layer(
+                                var_data.isel(time=index), steps, index
+                            )
+                            for index in range(2)
+                        }
 
             return info
 
         except Exception as e:
             logger.error(f"Error processing raster data: {e}")
-            raise DataProcessingError(f"Error cleaning CSV data: {str(e)}")
+            raise DataProcessingError(f"Error processing raster data: {str(e)}")
+        finally:
+            dataset_pool.invalidate(file_path)
+
+    @staticmethod
+    def _sample_layer(
+        layer: xr.DataArray, steps: Dict[str, List], index: int
+    ) -> Dict[str, Any]:
+        """Preview of one time slice, from the streamed per-step statistics"""
+        return {
+            "data": (
+                RasterService._load(layer).tolist()
+                if layer.size < RasterService.SAMPLE_LAYER_MAX_SIZE
+                else "Too large for JSON"
+            ),
+            "shape": layer.shape,
+            "min": steps["min"][index],
+            "max": steps["max"][index],
+            "mean": steps["mean"][index],
+        }
+
+    @staticmethod
+    def _load(data: xr.DataArray) -> np.ndarray:
+        """Load a lazy slice, refusing anything above the configured ceiling"""
+        nbytes = data.size * data.dtype.itemsize
+        if nbytes > settings.RASTER_MAX_LOAD_BYTES:
+            raise DataProcessingError(
+                f"Refusing to load {nbytes} bytes of {data.name}, "
+                f"above RASTER_MAX_LOAD_BYTES={settings.RASTER_MAX_LOAD_BYTES}"
+            )
+        return data.values
+
+    @staticmethod
+    def _tile_pixel_coords(
+        lat_size: int, lon_size: int, zoom: int, x: int, y: int, tile_size: int
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Output pixel centres of a tile in full-resolution index space, plus the
+        larger side of the source window the tile covers
+        """
+        tiles_per_row = 2**zoom
+        lat_start, lat_end = RasterService._tile_bounds(lat_size, tiles_per_row, y)
+        lon_start, lon_end = RasterService._tile_bounds(lon_size, tiles_per_row, x)
+        lat_coords = (
+            lat_start + (np.arange(tile_size) + 0.5) * (lat_end - lat_start) / tile_size
+        ) - 0.5
+        lon_coords = (
+            lon_start + (np.arange(tile_size) + 0.5) * (lon_end - lon_start) / tile_size
+        ) - 0.5
+        return lat_coords, lon_coords, max(lat_end - lat_start, lon_end - lon_start)
+
+    @staticmethod
+    def _window_bounds(
+        shape: Tuple[int, int], coords: List[Tuple[np.ndarray, np.ndarray]]
+    ) -> Tuple[int, int, int, int]:
+        """
+        Index window covering every set of fractional coordinates, plus a halo
+        wide enough for the resampling footprint of one output pixel
+        """
+        bounds = []
+        for axis, size in enumerate(shape):
+            axis_coords = [pair[axis] for pair in coords]
+            halo = max(
+                RasterService.TILE_HALO,
+                max(int(np.ceil(ResamplingService.step(c) / 2)) for c in axis_coords),
+            )
+            low = min(c.min() for c in axis_coords)
+            high = max(c.max() for c in axis_coords)
+            bounds.append(max(0, int(np.floor(low)) - halo))
+            bounds.append(min(size, int(np.ceil(high)) + halo + 1))
+        return tuple(bounds)
+
+    @staticmethod
+    def check_selection(
+        file_path: Union[str, Path], variable: str, time_indices: List[int]
+    ) -> None:
+        """Raise unless `variable` exists and has every time index, reading no data"""
+        with dataset_pool.acquire(file_path) as ds:
+            if variable not in ds.data_vars:
+                raise DataProcessingError(f"Variable {variable} not found")
+            var_data = ds[variable]
+            if "time" not in var_data.dims:
+                return
+            steps = var_data.sizes["time"]
+            for time_index in time_indices:
+                if not 0 <= time_index < steps:
+                    raise DataProcessingError(
+                        f"Time index {time_index} out of range, "
+                        f"{variable} has {steps} time steps"
+                    )
+
+    @staticmethod
+    def extract_tiles_from_netcdf(
+        file_path: str,
+        variable: str,
+        time_indices: List[int],
+        tiles: List[Tuple[int, int, int]],
+        tile_size: int = 256,
+        pyramid_path: Optional[str] = None,
+        resampling: str = ResamplingService.AUTO,
+    ) -> List[dict]:
+        """
+        Extract several (zoom, x, y) tiles for one or more time steps.
+
+        Tiles are served from the nearest overview level in `pyramid_path`
+        when one is available, and all tiles read from the same level share a
+        single read of their union window. Tiles are resampled with the
+        `resampling` method (see ResamplingService) and keep NaN for pixels
+        without data. Results are ordered by time index, then by tile.
+        """
+        try:
+            with dataset_pool.acquire(file_path) as ds, ExitStack() as stack:
+                if variable not in ds.data_vars:
+                    raise ValueError(f"Variable {variable} not found")
+
+                var_data = ds[variable]
+
+                # Select time slices
+                has_time = "time" in var_data.dims
+                if has_time:
+                    for time_index in time_indices:
+                        if not 0 <= time_index < len(var_data.time):
+                            raise ValueError(f"Time index {time_index} out of range")
+                    var_data = var_data.isel(time=time_indices)
+
+                if var_data.ndim != (3 if has_time else 2):
+                    raise ValueError(f"Unexpected data shape: {var_data.shape}")
+                lat_size, lon_size = var_data.shape[-2:]
+
+                overview_ds = None
+                if pyramid_path is not None and Path(pyramid_path).exists():
+                    overview_ds = stack.enter_context(
+                        dataset_pool.acquire(pyramid_path)
+                    )
+
+                # Calculate tile windows and source levels before touching any data
+                placements = []
+                by_level: Dict[int, List[int]] = {}
+                for position, (zoom, x, y) in enumerate(tiles):
+                    lat_coords, lon_coords, extent = RasterService._tile_pixel_coords(
+                        lat_size, lon_size, zoom, x, y, tile_size
+                    )
+                    level = 0
+                    if overview_ds is not None:
+                        level = PyramidService.available_level(
+                            overview_ds,
+                            variable,
+                            PyramidService.select_level(extent, tile_size),
+                        )
+                    placements.append((lat_coords, lon_coords, level))
+                    by_level.setdefault(level, []).append(position)
+
+                layers: Dict[Tuple[int, int], np.ndarray] = {}
+                for level, members in by_level.items():
+                    source = var_data
+                    if level > 0:
+                        source = overview_ds[PyramidService.level_name(variable, level)]
+                        if "time" in source.dims:
+                            source = source.isel(time=time_indices)
+
+                    # Map pixel centres onto the level's grid
+                    scale = 2**level
+                    level_coords = {
+                        position: (
+                            (placements[position][0] + 0.5) / scale - 0.5,
+                            (placements[position][1] + 0.5) / scale - 0.5,
+                        )
+                        for position in members
+                    }
+
+                    # One read for the union window, unless the tiles are so
+                    # far apart that reading them one by one is cheaper
+                    groups = [members]
+                    lat0, lat1, lon0, lon1 = RasterService._window_bounds(
+                        source.shape[-2:], list(level_coords.values())
+                    )
+                    union_bytes = (lat1 - lat0) * (lon1 - lon0) * len(time_indices) * 4
+                    if union_bytes > RasterService.BATCH_WINDOW_MAX_BYTES:
+                        groups = [[position] for position in members]
+
+                    lat_dim, lon_dim = source.dims[-2:]
+                    for group in groups:
+                        lat0, lat1, lon0, lon1 = RasterService._window_bounds(
+                            source.shape[-2:], [level_coords[p] for p in group]
+                        )
+                        # Only this hyperslab is read from disk
+                        window = source.isel(
+                            {lat_dim: slice(lat0, lat1), lon_dim: slice(lon0, lon1)}
+                        ).values
+                        if window.ndim == 2:
+                            window = window[np.newaxis]
+
+                        for position in group:
+                            lat_coords, lon_coords = level_coords[position]
+                            for step in range(len(time_indices)):
+                                layers[step, position] = ResamplingService.resample(
+                                    window[min(step, window.shape[0] - 1)],
+                                    lat_coords - lat0,
+                                    lon_coords - lon0,
+                                    resampling,
+                                )
+
+            results = []
+            for step, time_index in enumerate(time_indices):
+                for position, (zoom, x, y) in enumerate(tiles):
+                    tile_data = layers[step, position]
+                    valid = tile_data[~np.isnan(tile_data)]
+                    results.append(
+                        {
+                            "time_index": time_index,
+                            "zoom": zoom,
+                            "x": x,
+                            "y": y,
+                            "data": tile_data,
+                            "level": placements[position][2],
+                            "stats": {
+                                "min": float(valid.min()) if valid.size else None,
+                                "max": float(valid.max()) if valid.size else None,
+                                "mean": float(valid.mean()) if valid.size else None,
+                            },
+                        }
+                    )
+            return results
+
+        except Exception as e:
+            logger.error(f"Error extracting tiles: {e}")
+            raise
 
     @staticmethod
     def extract_tile_from_netcdf(
@@ -84,129 +416,72 @@ class RasterService:
         x: int,
         y: int,
         tile_size: int = 256,
+        pyramid_path: Optional[str] = None,
+        resampling: str = ResamplingService.AUTO,
     ) -> dict:
-        """Extract a specific tile from NetCDF data"""
-        try:
-            # Open dataset
-            ds = xr.open_dataset(file_path, engine="h5netcdf")
-
-            if variable not in ds.data_vars:
-                raise ValueError(f"Variable {variable} not found")
-
-            var_data = ds[variable]
-
-            # Select time slice
-            if "time" in var_data.dims:
-                if time_index >= len(var_data.time):
-                    raise ValueError(f"Time index {time_index} out of range")
-                var_data = var_data.isel(time=time_index)
-
-            # Calculate tile bounds
-            tiles_per_row = 2**zoom
-            full_data = var_data.values
-
-            # Handle your data dimensions (assuming lat, lon)
-            if len(full_data.shape) == 2:
-                lat_size, lon_size = full_data.shape
-            else:
-                raise ValueError(f"Unexpected data shape: {full_data.shape}")
-
-            # Calculate tile indices
-            lat_per_tile = max(1, lat_size // tiles_per_row)
-            lon_per_tile = max(1, lon_size // tiles_per_row)
-
-            lat_start = min(y * lat_per_tile, lat_size - 1)
-            lat_end = min((y + 1) * lat_per_tile, lat_size)
-            lon_start = min(x * lon_per_tile, lon_size - 1)
-            lon_end = min((x + 1) * lon_per_tile, lon_size)
-
-            # Extract tile subset
-            tile_data = full_data[lat_start:lat_end, lon_start:lon_end]
-
-            # Resample to standard tile size if needed
-            if tile_data.shape != (tile_size, tile_size):
-                from scipy.ndimage import zoom as scipy_zoom
-
-                zoom_factors = (
-                    tile_size / tile_data.shape[0],
-                    tile_size / tile_data.shape[1],
-                )
-                tile_data = scipy_zoom(tile_data, zoom_factors, order=1)
-
-            # Ensure exact tile size and handle NaN
-            tile_data = tile_data[:tile_size, :tile_size]
-            tile_data = np.nan_to_num(tile_data, nan=0.0)
-
-            ds.close()
-
-            return {
-                "data": tile_data,
-                "stats": {
-                    "min": float(np.nanmin(tile_data)),
-                    "max": float(np.nanmax(tile_data)),
-                    "mean": float(np.nanmean(tile_data)),
-                },
-            }
-
-        except Exception as e:
-            logger.error(f"Error extracting tile: {e}")
-            raise
+        """
+        Extract a specific tile from NetCDF data, reading from the nearest
+        overview level in `pyramid_path` when one is available
+        """
+        return RasterService.extract_tiles_from_netcdf(
+            file_path,
+            variable,
+            [time_index],
+            [(zoom, x, y)],
+            tile_size=tile_size,
+            pyramid_path=pyramid_path,
+            resampling=resampling,
+        )[0]
 
     @staticmethod
-    def get_raster_metadata(file_path: str) -> dict:
-        """Get metadata for the tile viewer (enhanced version of process_raster_data)"""
+    def get_raster_metadata(
+        file_path: str, statistics: Optional[Dict[str, Any]] = None
+    ) -> dict:
+        """
+        Get metadata for the tile viewer (enhanced version of process_raster_data).
+        Only coordinates are read; `statistics` are the ones stored at upload and
+        are computed with a streaming pass when missing.
+        """
         try:
-
-            ds = xr.open_dataset(file_path, engine="h5netcdf")
-            ds = ds.load()
-
-            # Get coordinate info
-            lat_name = "lat" if "lat" in ds.coords else "latitude"
-            lon_name = "lon" if "lon" in ds.coords else "longitude"
-
-            # Calculate bounds
-            if lat_name in ds.coords and lon_name in ds.coords:
-                lats = ds[lat_name].values
-                lons = ds[lon_name].values
-                bounds = {
-                    "north": float(np.max(lats)),
-                    "south": float(np.min(lats)),
-                    "east": float(np.max(lons)),
-                    "west": float(np.min(lons)),
-                }
-                resolution = {
-                    "lat": float(abs(lats[1] - lats[0]) if len(lats) > 1 else 1.0),
-                    "lon": float(abs(lons[1] - lons[0]) if len(lons) > 1 else 1.0),
-                }
-            else:
-                bounds = {"north": 90, "south": -90, "east": 180, "west": -180}
-                resolution = {"lat": 1.0, "lon": 1.0}
-
-            # Calculate statistics for each variable
-            statistics = {}
-            for var in ds.data_vars:
-                data = ds[var].values
-                statistics[var] = {
-                    "min": float(np.nanmin(data)),
-                    "max": float(np.nanmax(data)),
-                    "mean": float(np.nanmean(data)),
-                    "units": str(ds[var].attrs.get("units", "unknown")),
+            if statistics is None:
+                statistics = RasterStatsService.compute_statistics(file_path)
+
+            with dataset_pool.acquire(file_path) as ds:
+                # Get coordinate info
+                lat_name = "lat" if "lat" in ds.coords else "latitude"
+                lon_name = "lon" if "lon" in ds.coords else "longitude"
+
+                # Calculate bounds
+                if lat_name in ds.coords and lon_name in ds.coords:
+                    lats = ds[lat_name].values
+                    lons = ds[lon_name].values
+                    bounds = {
+                        "north": float(np.max(lats)),
+                        "south": float(np.min(lats)),
+                        "east": float(np.max(lons)),
+                        "west": float(np.min(lons)),
+                    }
+                    resolution = {
+                        "lat": float(abs(lats[1] - lats[0]) if len(lats) > 1 else 1.0),
+                        "lon": float(abs(lons[1] - lons[0]) if len(lons) > 1 else 1.0),
+                    }
+                else:
+                    bounds = {"north": 90, "south": -90, "east": 180, "west": -180}
+                    resolution = {"lat": 1.0, "lon": 1.0}
+
+                metadata = {
+                    "dimensions": dict(ds.sizes),
+                    "variables": list(ds.data_vars),
+                    "bounds": bounds,
+                    "resolution": resolution,
+                    "attributes": {
+                        "title": str(ds.attrs.get("title", "NetCDF Dataset")),
+                        "institution": str(ds.attrs.get("institution", "")),
+                        "comment": str(ds.attrs.get("comment", "")),
+                    },
+                    "statistics": statistics,
                 }
 
-            metadata = {
-                "dimensions": dict(ds.dims),
-                "variables": list(ds.data_vars),
-                "bounds": bounds,
-                "resolution": resolution,
-                "attributes": {
-                    "title": str(ds.attrs.get("title", "NetCDF Dataset")),
-                    "institution": str(ds.attrs.get("institution", "")),
-                    "comment": str(ds.attrs.get("comment", "")),
-                },
-                "statistics": statistics,
-            }
-
-            ds.close()
             return metadata
 
         except Exception as e:
@@ -0,0 +1,166 @@
+import numpy as np
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import xarray as xr
+from app.config import settings
+from app.repositories.dataset_pool import dataset_pool
+
+logger = logging.getLogger(__name__)
+
+
+class RasterStatsService:
+    """
+    Out-of-core summary statistics of NetCDF variables.
+
+    Variables are streamed in blocks that follow the source chunking along
+    time and are banded along the next axis, so memory stays bounded by
+    STATS_BLOCK_BYTES whatever the file size. Per-block counts, means and
+    sums of squared deviations are merged with Chan's parallel update, which
+    keeps the single pass numerically stable.
+    """
+
+    # Upper bound on decoded data and temporaries held in memory at once
+    STATS_BLOCK_BYTES = settings.RASTER_MAX_LOAD_BYTES
+
+    @staticmethod
+    def compute_statistics(file_path: Union[str, Path]) -> Dict[str, Any]:
+        """
+        Per-variable and per-time-step min/max/mean/std/count of every data
+        variable, computed in one streaming pass
+        """
+        statistics = {}
+        with dataset_pool.acquire(file_path) as ds:
+            for name, var in ds.data_vars.items():
+                statistics[name] = RasterStatsService._variable_statistics(var)
+        return statistics
+
+    @staticmethod
+    def _variable_statistics(var: xr.DataArray) -> Dict[str, Any]:
+        has_time = "time" in var.dims
+        steps = var.sizes["time"] if has_time else 1
+        count = np.zeros(steps, dtype=np.int64)
+        mean = np.zeros(steps, dtype=np.float64)
+        m2 = np.zeros(steps, dtype=np.float64)
+        low = np.full(steps, np.nan)
+        high = np.full(steps, np.nan)
+
+        for block in RasterStatsService._blocks(var, has_time):
+            start, values = block
+            rows = slice(start, start + values.shape[0])
+            valid = ~np.isnan(values)
+            block_count = valid.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                block_mean = (
+                    np.where(valid, values, 0).sum(axis=1, dtype=np.float64)
+                    / block_count
+                )
+                centre = block_mean[:, np.newaxis].astype(values.dtype)
+                deviation = np.where(valid, values - centre, 0)
+            block_m2 = np.einsum("ij,ij->i", deviation, deviation, dtype=np.float64)
+            block_mean = np.nan_to_num(block_mean)
+
+            count[rows], mean[rows], m2[rows] = RasterStatsService._merge(
+                count[rows], mean[rows], m2[rows], block_count, block_mean, block_m2
+            )
+            # fmin/fmax skip NaN, so empty blocks leave the running values alone
+            low[rows] = np.fmin(low[rows], np.fmin.reduce(values, axis=1))
+            high[rows] = np.fmax(high[rows], np.fmax.reduce(values, axis=1))
+
+        # Combine the time steps into the variable totals
+        total = int(count.sum())
+        total_mean = float((count * mean).sum() / total) if total else np.nan
+        total_m2 = float(m2.sum() + (count * (mean - total_mean) ** 2).sum())
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step_mean = np.where(count > 0, mean, np.nan)
+            step_std = np.where(count > 0, np.sqrt(m2 / count), np.nan)
+
+        statistics = {
+            "min": RasterStatsService._finite(np.nanmin(low) if total else np.nan),
+            "max": RasterStatsService._finite(np.nanmax(high) if total else np.nan),
+            "mean": RasterStatsService._finite(total_mean),
+            "std": RasterStatsService._finite(
+                np.sqrt(total_m2 / total) if total else np.nan
+            ),
+            "count": total,
+            "units": str(var.attrs.get("units", "unknown")),
+        }
+        if has_time:
+            statistics["time_steps"] = {
+                "min": RasterStatsService._finite_list(low),
+                "max": RasterStatsService._finite_list(high),
+                "mean": RasterStatsService._finite_list(step_mean),
+                "std": RasterStatsService._finite_list(step_std),
+                "count": count.tolist(),
+            }
+        return statistics
+
+    @staticmethod
+    def _blocks(var: xr.DataArray, has_time: bool):
+        """
+        Yield (first time index, values) blocks with one row per time step and
+        the remaining axes flattened, decoded with NaN for missing values.
+        Variables without a time axis come out as a single step.
+        """
+        if var.ndim == 0:
+            yield 0, np.asarray(var.values, dtype=np.float64).reshape(1, 1)
+            return
+
+        if has_time and var.ndim == 1:
+            # Time series: one value per step, read in runs within the budget
+            steps = var.sizes["time"]
+            run = max(1, RasterStatsService.STATS_BLOCK_BYTES // 16)
+            for t0 in range(0, steps, run):
+                values = var.isel(time=slice(t0, min(steps, t0 + run))).values
+                yield t0, values.astype(np.float64, copy=False).reshape(-1, 1)
+            return
+
+        chunksizes = var.encoding.get("chunksizes") or ()
+        if has_time:
+            var = var.transpose("time", ...)
+            steps = var.sizes["time"]
+            lead = max(1, min(steps, chunksizes[0] if chunksizes else 1))
+            chunksizes = chunksizes[1:]
+        else:
+            steps = lead = 1
+
+        # Band the next axis so a block and its temporaries fit the budget,
+        # in whole source chunks so none is decompressed twice
+        band_dim = var.dims[1 if has_time else 0]
+        band_size = var.sizes[band_dim]
+        chunk_rows = chunksizes[0] if chunksizes else 1
+        inner = var.shape[2:] if has_time else var.shape[1:]
+        row_values = lead * int(np.prod(inner, dtype=np.int64))
+        band = RasterStatsService.STATS_BLOCK_BYTES // (16 * row_values)
+        band = max(chunk_rows, band - band % chunk_rows)
+
+        for t0 in range(0, steps, lead):
+            selection = {band_dim: None}
+            if has_time:
+                selection["time"] = slice(t0, min(steps, t0 + lead))
+            for r0 in range(0, band_size, band):
+                selection[band_dim] = slice(r0, min(band_size, r0 + band))
+                values = var.isel(selection).values
+                if not np.issubdtype(values.dtype, np.floating):
+                    values = values.astype(np.float64)
+                yield t0, values.reshape(min(lead, steps - t0), -1)
+
+    @staticmethod
+    def _merge(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+        """Chan et al. pairwise update of (count, mean, M2) accumulators"""
+        count = count_a + count_b
+        delta = mean_b - mean_a
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.where(count > 0, count_b / count, 0.0)
+        mean = mean_a + delta * share
+        m2 = m2_a + m2_b + delta**2 * count_a * share
+        return count, mean, m2
+
+    @staticmethod
+    def _finite(value) -> Optional[float]:
+        value = float(value)
+        return value if np.isfinite(value) else None
+
+    @staticmethod
+    def _finite_list(values: np.ndarray) -> List[Optional[float]]:
+        return [RasterStatsService._finite(value) for value in values]
@@ -0,0 +1,256 @@
+import numpy as np
+from typing import Optional, Tuple
+from app.core.exceptions import DataValidationError
+
+
+class ResamplingService:
+    """
+    Vectorized, NaN-aware resampling of 2D rasters onto regular grids.
+
+    Every method is separable and handles the two axes one after the other.
+    Block methods (mean/min/max) aggregate every source pixel whose
+    centre falls inside an output pixel; integer factors use a reshape and
+    fractional factors use `reduceat` over the bin edges. Mean and linear
+    carry value sums and valid-pixel weights through both passes, so missing
+    values are skipped instead of bleeding into their neighbours.
+
+    AUTO is linear, which only reads the sampled source rows and columns.
+    Block methods read every source pixel and cost several times more when
+    downsampling, so they are opt-in; tiles served from a pyramid already
+    sample block-averaged overview levels.
+    """
+
+    AUTO = "auto"
+    LINEAR = "linear"
+    NEAREST = "nearest"
+    MEAN = "mean"
+    MIN = "min"
+    MAX = "max"
+    METHODS = (AUTO, LINEAR, NEAREST, MEAN, MIN, MAX)
+
+    @staticmethod
+    def validate_method(method: str) -> str:
+        if method not in ResamplingService.METHODS:
+            raise DataValidationError(
+                f"Unknown resampling method {method}, "
+                f"expected one of {', '.join(ResamplingService.METHODS)}"
+            )
+        return method
+
+    @staticmethod
+    def step(coords: np.ndarray) -> float:
+        """Spacing of evenly spaced output pixel centres, in source pixels"""
+        if len(coords) < 2:
+            return 1.0
+        return float(coords[-1] - coords[0]) / (len(coords) - 1)
+
+    @staticmethod
+    def resample(
+        window: np.ndarray,
+        lat_coords: np.ndarray,
+        lon_coords: np.ndarray,
+        method: str = AUTO,
+    ) -> np.ndarray:
+        """
+        Resample a 2D window at evenly spaced output pixel centres given as
+        fractional, window-relative source indices. Output pixels without any
+        valid source pixel are NaN.
+        """
+        if method == ResamplingService.AUTO:
+            method = ResamplingService.LINEAR
+
+        window = np.asarray(window, dtype=np.float32)
+        if method == ResamplingService.LINEAR:
+            return ResamplingService._linear(window, lat_coords, lon_coords)
+        if method == ResamplingService.NEAREST:
+            rows = ResamplingService._nearest_indices(lat_coords, window.shape[0])
+            cols = ResamplingService._nearest_indices(lon_coords, window.shape[1])
+            return window[np.ix_(rows, cols)]
+        return ResamplingService._block(window, lat_coords, lon_coords, method)
+
+    @staticmethod
+    def _nearest_indices(coords: np.ndarray, size: int) -> np.ndarray:
+        return np.clip(np.floor(coords + 0.5).astype(np.intp), 0, size - 1)
+
+    @staticmethod
+    def _neighbours(coords: np.ndarray, size: int):
+        """Lower/upper source indices and interpolation weight of each coordinate"""
+        lower = np.floor(coords)
+        lower_index = np.clip(lower.astype(np.intp), 0, size - 1)
+        upper_index = np.clip(lower_index + 1, 0, size - 1)
+        return lower_index, upper_index, (coords - lower).astype(np.float32)
+
+    @staticmethod
+    def _linear(
+        window: np.ndarray, lat_coords: np.ndarray, lon_coords: np.ndarray
+    ) -> np.ndarray:
+        """Separable bilinear interpolation, renormalized over valid neighbours"""
+        lat_lower, lat_upper, lat_fraction = ResamplingService._neighbours(
+            lat_coords, window.shape[0]
+        )
+        lon_lower, lon_upper, lon_fraction = ResamplingService._neighbours(
+            lon_coords, window.shape[1]
+        )
+
+        # Gather only the source rows and columns that are actually sampled
+        rows = np.union1d(lat_lower, lat_upper)
+        cols = np.union1d(lon_lower, lon_upper)
+        sub = window[np.ix_(rows, cols)]
+        valid = ~np.isnan(sub)
+        planes = [np.where(valid, sub, np.float32(0)), valid.astype(np.float32)]
+
+        lat_lower, lat_upper = np.searchsorted(rows, [lat_lower, lat_upper])
+        lon_lower, lon_upper = np.searchsorted(cols, [lon_lower, lon_upper])
+        lat_fraction = lat_fraction[:, np.newaxis]
+        values, weights = [
+            plane[lat_lower] * (1 - lat_fraction) + plane[lat_upper] * lat_fraction
+            for plane in planes
+        ]
+        values, weights = [
+            plane[:, lon_lower] * (1 - lon_fraction)
+            + plane[:, lon_upper] * lon_fraction
+            for plane in (values, weights)
+        ]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weights > 0, values / weights, np.nan).astype(np.float32)
+
+    @staticmethod
+    def _block(
+        window: np.ndarray, lat_coords: np.ndarray, lon_coords: np.ndarray, method: str
+    ) -> np.ndarray:
+        ufunc = {
+            ResamplingService.MEAN: np.add,
+            ResamplingService.MIN: np.fmin,
+            ResamplingService.MAX: np.fmax,
+        }.get(method)
+        if ufunc is None:
+            raise DataValidationError(f"Unknown resampling method {method}")
+
+        missing = np.isnan(window)
+        has_missing = bool(missing.any())
+        plane = window
+        if method == ResamplingService.MEAN and has_missing:
+            plane = np.where(missing, np.float32(0), window)
+
+        # Integer lat bins combine whole contiguous rows elementwise, which
+        # runs at memory speed, so lat goes first and leaves lon a much
+        # smaller plane. Fractional lat bins (reduceat over rows) are slow on
+        # the full plane and go last.
+        axes = [(0, lat_coords), (1, lon_coords)]
+        if ResamplingService._integer_bins(lat_coords, window.shape[0]) is None:
+            axes.reverse()
+
+        reduced = plane
+        for axis, coords in axes:
+            reduced = ResamplingService._reduce_axis(reduced, coords, axis, ufunc)
+        if method != ResamplingService.MEAN:
+            return reduced
+
+        if has_missing:
+            counts = ~missing
+            for axis, coords in axes:
+                counts = ResamplingService._reduce_axis(
+                    counts, coords, axis, np.add, np.int32
+                )
+        else:
+            # Without missing values the counts are just the bin sizes
+            rows = np.ones((window.shape[0], 1), np.int32)
+            cols = np.ones((1, window.shape[1]), np.int32)
+            counts = ResamplingService._reduce_axis(
+                rows, lat_coords, 0, np.add
+            ) * ResamplingService._reduce_axis(cols, lon_coords, 1, np.add)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, reduced / counts, np.nan).astype(np.float32)
+
+    @staticmethod
+    def _reduce_axis(
+        plane: np.ndarray,
+        coords: np.ndarray,
+        axis: int,
+        ufunc: np.ufunc,
+        dtype: Optional[type] = None,
+    ) -> np.ndarray:
+        """Aggregate the source pixels of each output bin along one axis"""
+        size = plane.shape[axis]
+        count = len(coords)
+        step = ResamplingService.step(coords)
+        if step <= 1:
+            # Upsampling: every output pixel lies within a single source pixel
+            indices = ResamplingService._nearest_indices(coords, size)
+            return np.take(plane, indices, axis=axis).astype(dtype or plane.dtype)
+
+        integer_bins = ResamplingService._integer_bins(coords, size)
+        if integer_bins is not None:
+            # Integer factor: reshape into (bins, factor) and reduce the blocks
+            start, factor = integer_bins
+            if axis == 0:
+                block = plane[start : start + count * factor]
+                block = block.reshape(count, factor, plane.shape[1])
+                return ufunc.reduce(block, axis=1, dtype=dtype)
+            block = plane[:, start : start + count * factor]
+            block = block.reshape(plane.shape[0], count, factor)
+            return ufunc.reduce(block, axis=2, dtype=dtype)
+
+        # Fractional factor: variable-width bins, pixel i belongs to the bin
+        # whose interval contains its centre
+        starts = np.clip(np.ceil(coords - step / 2).astype(np.intp), 0, size - 1)
+        end = int(min(size, np.ceil(coords[-1] + step / 2)))
+        trimmed = plane[:end] if axis == 0 else plane[:, :end]
+        return ufunc.reduceat(trimmed, starts, axis=axis, dtype=dtype)
+
+    @staticmethod
+    def _integer_bins(coords: np.ndarray, size: int) -> Optional[Tuple[int, int]]:
+        """First source index and width of downsampling bins of a whole number
+        of pixels that fit the axis, or None"""
+        step = ResamplingService.step(coords)
+        factor = int(round(step))
+        if step <= 1 or abs(step - factor) >= 1e-6:
+            return None
+        start = int(np.clip(np.ceil(coords[0] - step / 2), 0, size - 1))
+        if start + len(coords) * factor > size:
+            return None
+        return start, factor
+
+    @staticmethod
+    def block_reduce(data: np.ndarray, factor: int, method: str = MEAN) -> np.ndarray:
+        """
+        NaN-aware reduction of factor x factor blocks over the last two axes;
+        ragged edges are reduced over the pixels they have
+        """
+        height, width = data.shape[-2:]
+        out_height = -(-height // factor)
+        out_width = -(-width // factor)
+        pad = [(0, 0)] * (data.ndim - 2) + [
+            (0, out_height * factor - height),
+            (0, out_width * factor - width),
+        ]
+        if any(after for _, after in pad):
+            data = np.pad(data, pad, constant_values=np.nan)
+
+        # Combine the factor**2 strided block members elementwise
+        missing = np.isnan(data)
+        offsets = [(row, col) for row in range(factor) for col in range(factor)]
+        if method == ResamplingService.MEAN:
+            filled = np.where(missing, np.float32(0), data).astype(
+                np.float32, copy=False
+            )
+            count_dtype = np.uint8 if factor * factor < 256 else np.uint32
+            totals = filled[..., 0::factor, 0::factor].copy()
+            counts = (~missing[..., 0::factor, 0::factor]).astype(count_dtype)
+            for row, col in offsets[1:]:
+                totals += filled[..., row::factor, col::factor]
+                counts += ~missing[..., row::factor, col::factor]
+            # Blocks without any valid pixel come out as 0/0 = NaN
+            with np.errstate(invalid="ignore", divide="ignore"):
+                totals /= counts
+            return totals
+
+        ufunc = {ResamplingService.MIN: np.fmin, ResamplingService.MAX: np.fmax}.get(
+            method
+        )
+        if ufunc is None:
+            raise DataValidationError(f"Unknown block reduction method {method}")
+        result = data[..., 0::factor, 0::factor].astype(np.float32)
+        for row, col in offsets[1:]:
+            ufunc(result, data[..., row::factor, col::factor], out=result)
+        return result
@@ -0,0 +1,180 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from app.config import settings
+from app.core.cache import LRUCache
+from app.repositories.data_repository import DataRepository
+
+logger = logging.getLogger(__name__)
+
+TileKey = Tuple[str, str, int, str, int, int, int, int, int, str, str, Optional[int]]
+
+
+class TileCache:
+    """
+    Two-tier cache of rendered raster tiles: a byte-budgeted in-memory LRU in
+    front of an on-disk tier with one directory per uploaded file.
+
+    The disk tier is byte-budgeted too. Once a write takes it past
+    `max_disk_bytes`, the least recently used tiles are removed until it is
+    back under DISK_LOW_WATER of the budget, so tiles of replaced file
+    versions, which are never read again, go first.
+    """
+
+    # Share of the disk budget a sweep brings the tier back down to
+    DISK_LOW_WATER = 0.8
+
+    def __init__(self, cache_dir: Path, max_memory_bytes: int, max_disk_bytes: int):
+        self.cache_dir = cache_dir
+        self.memory = LRUCache(max_bytes=max_memory_bytes)
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        # Bytes on disk, counted from the directory on the first write
+        self._disk_bytes: Optional[int] = None
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        username: str,
+        filename: str,
+        file_mtime: int,
+        variable: str,
+        time_index: int,
+        zoom: int,
+        x: int,
+        y: int,
+        tile_size: int,
+        encoding: str,
+        resampling: str = "auto",
+        pyramid_mtime: Optional[int] = None,
+    ) -> TileKey:
+        """
+        Tiles depend on the upload and on the overview pyramid they were read
+        from, so both versions are part of the key: tiles sampled from full
+        resolution before the pyramid was built are not served after it
+        """
+        return (
+            username,
+            filename,
+            file_mtime,
+            variable,
+            time_index,
+            zoom,
+            x,
+            y,
+            tile_size,
+            encoding,
+            resampling,
+            pyramid_mtime,
+        )
+
+    def _file_dir(self, username: str, filename: str) -> Path:
+        # Hashed, since joined names are ambiguous ("a", "b_c.nc" vs "a_b", "c.nc")
+        digest = hashlib.sha1(repr((username, filename)).encode()).hexdigest()
+        return self.cache_dir / digest
+
+    def _disk_path(self, key: TileKey) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self._file_dir(key[0], key[1]) / f"{digest}.bin"
+
+    def get(self, key: TileKey) -> Optional[bytes]:
+        """Return the cached tile body, promoting disk hits into memory"""
+        body = self.memory.get(key)
+        if body is not None:
+            return body
+
+        try:
+            body = self._disk_path(key).read_bytes()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        try:
+            # Mark the tile as recently used for the disk sweep
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+        self.memory.set(key, body)
+        return body
+
+    def set(self, key: TileKey, body: bytes) -> None:
+        self.memory.set(key, body)
+
+        disk_path = self._disk_path(key)
+        tmp_path = disk_path.with_name(f"{disk_path.name}.{threading.get_ident()}.tmp")
+        try:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Could not write tile to disk cache: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_tiles())
+            else:
+                self._disk_bytes += len(body)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._sweep()
+
+    def _disk_tiles(self) -> List[Tuple[float, int, Path]]:
+        """(last use, size, path) of every tile on disk"""
+        tiles = []
+        for path in self.cache_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            tiles.append((stat.st_mtime, stat.st_size, path))
+        return tiles
+
+    def _sweep(self) -> None:
+        """Remove the least recently used tiles down to the low-water mark"""
+        tiles = sorted(self._disk_tiles())
+        total = sum(size for _, size, _ in tiles)
+        target = self.max_disk_bytes * self.DISK_LOW_WATER
+        for _, size, path in tiles:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def invalidate_file(self, username: str, filename: str) -> None:
+        """Evict every cached tile of an uploaded file from both tiers"""
+        self.memory.discard_where(lambda key: key[0] == username and key[1] == filename)
+        shutil.rmtree(self._file_dir(username, filename), ignore_errors=True)
+        with self._lock:
+            self._disk_bytes = None
+
+    def stats(self) -> Dict[str, Any]:
+        memory_stats = self.memory.stats()
+        with self._lock:
+            return {
+                "memory": memory_stats,
+                "disk_hits": self.disk_hits,
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+                "misses": self.misses,
+            }
+
+
+tile_cache = TileCache(
+    cache_dir=DataRepository.UPLOADS_DIR / ".tile_cache",
+    max_memory_bytes=settings.TILE_CACHE_MEMORY_BYTES,
+    max_disk_bytes=settings.TILE_CACHE_DISK_BYTES,
+)
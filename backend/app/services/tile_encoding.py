@@ -0,0 +1,153 @@
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+import json
+import struct
+import numpy as np
+from app.core.exceptions import DataValidationError
+
+# Response headers carrying tile layout for the binary encodings
+TILE_HEADERS = [
+    "X-Tile-Cache",
+    "X-Tile-Encoding",
+    "X-Tile-Shape",
+    "X-Tile-Dtype",
+    "X-Tile-Scale",
+    "X-Tile-Offset",
+    "X-Tile-Nodata",
+    "X-Tile-Metadata",
+    "X-Tile-Count",
+]
+
+
+class TileEncoding:
+    """Serialization of raster tiles into JSON or compact binary bodies"""
+
+    JSON = "json"
+    FLOAT32 = "f32"
+    NPY = "npy"
+    UINT8 = "u8"
+    UINT16 = "u16"
+    FORMATS = (JSON, FLOAT32, NPY, UINT8, UINT16)
+
+    # Accept header media types mapped to encodings, most specific first
+    MEDIA_TYPES = {
+        "application/x-npy": NPY,
+        "application/octet-stream": FLOAT32,
+        "application/json": JSON,
+    }
+
+    @staticmethod
+    def negotiate(requested: Optional[str], accept: Optional[str]) -> str:
+        """
+        Pick an encoding from an explicit format or the Accept header.
+
+        The media type with the highest q-value wins, ties going to the more
+        specific one; q=0 refuses a type. Binary encodings must be named
+        exactly, wildcard ranges only count towards the JSON default.
+        """
+        if requested:
+            if requested not in TileEncoding.FORMATS:
+                raise DataValidationError(
+                    f"Unknown tile format {requested}, "
+                    f"expected one of {', '.join(TileEncoding.FORMATS)}"
+                )
+            return requested
+        qualities = TileEncoding._accepted(accept or "")
+        best, best_quality = TileEncoding.JSON, 0.0
+        for media_type, encoding in TileEncoding.MEDIA_TYPES.items():
+            quality = qualities.get(media_type)
+            if quality is None and encoding == TileEncoding.JSON:
+                quality = qualities.get("application/*", qualities.get("*/*"))
+            if quality is not None and quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    @staticmethod
+    def _accepted(accept: str) -> Dict[str, float]:
+        """q-value of each media range in an Accept header"""
+        qualities = {}
+        for entry in accept.split(","):
+            media_type, *params = [part.strip() for part in entry.split(";")]
+            if not media_type:
+                continue
+            quality = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        quality = min(max(float(value), 0.0), 1.0)
+                    except ValueError:
+                        quality = 0.0
+            qualities[media_type.lower()] = quality
+        return qualities
+
+    @staticmethod
+    def encode(
+        tile: np.ndarray, metadata: Dict[str, Any], encoding: str
+    ) -> Tuple[bytes, str, Dict[str, str]]:
+        """Return body, media type and headers for a tile in `encoding`"""
+        if encoding == TileEncoding.JSON:
+            # Missing pixels become null, the only NaN tokens are tile values
+            tile_json = json.dumps(tile.tolist(), separators=(",", ":"))
+            metadata_json = json.dumps(metadata, separators=(",", ":"))
+            body = '{"tile":%s,"metadata":%s}' % (
+                tile_json.replace("NaN", "null"),
+                metadata_json,
+            )
+            return body.encode("utf-8"), "application/json", {}
+
+        headers = {
+            "X-Tile-Encoding": encoding,
+            "X-Tile-Shape": ",".join(str(n) for n in tile.shape),
+            "X-Tile-Metadata": json.dumps(metadata, separators=(",", ":")),
+        }
+
+        if encoding == TileEncoding.FLOAT32:
+            headers["X-Tile-Dtype"] = "<f4"
+            return tile.astype("<f4").tobytes(), "application/octet-stream", headers
+
+        if encoding == TileEncoding.NPY:
+            buffer = BytesIO()
+            np.save(buffer, tile.astype("<f4"), allow_pickle=False)
+            return buffer.getvalue(), "application/octet-stream", headers
+
+        # Quantized: value = code * scale + offset, top code marks missing data
+        dtype = np.dtype("<u1") if encoding == TileEncoding.UINT8 else np.dtype("<u2")
+        nodata = np.iinfo(dtype).max
+        valid = np.isfinite(tile)
+        low = float(tile[valid].min()) if valid.any() else 0.0
+        high = float(tile[valid].max()) if valid.any() else 0.0
+        scale = (high - low) / (nodata - 1) if high > low else 1.0
+        codes = np.full(tile.shape, nodata, dtype=dtype)
+        codes[valid] = np.rint((tile[valid] - low) / scale).astype(dtype)
+        headers.update(
+            {
+                "X-Tile-Dtype": dtype.str,
+                "X-Tile-Scale": repr(scale),
+                "X-Tile-Offset": repr(low),
+                "X-Tile-Nodata": str(nodata),
+            }
+        )
+        return codes.tobytes(), "application/octet-stream", headers
+
+    @staticmethod
+    def pack(body: bytes, media_type: str, headers: Dict[str, str]) -> bytes:
+        """Bundle an encoded tile into one blob for the tile cache"""
+        head = json.dumps({"media_type": media_type, "headers": headers}).encode()
+        return struct.pack("<I", len(head)) + head + body
+
+    @staticmethod
+    def unpack(blob: bytes) -> Tuple[bytes, str, Dict[str, str]]:
+        """Inverse of `pack`"""
+        (head_length,) = struct.unpack_from("<I", blob)
+        head = json.loads(blob[4 : 4 + head_length])
+        return blob[4 + head_length :], head["media_type"], head["headers"]
+
+    @staticmethod
+    def frame(header: Dict[str, Any], body: bytes) -> bytes:
+        """
+        One frame of a batch response: a little-endian uint32 header length,
+        the JSON header, a uint32 body length and the encoded tile body
+        """
+        head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        return struct.pack("<I", len(head)) + head + struct.pack("<I", len(body)) + body
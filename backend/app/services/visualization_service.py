@@ -1,10 +1,20 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Hashable, Optional, Tuple
 import logging
+from app.config import settings
+from app.core.cache import LRUCache
 from app.repositories.data_repository import DataRepository
+from app.services.aggregation_service import AggregationService
+from app.services.csv_index_service import CSVIndexService
+from app.services.csv_rollup_service import CSVRollupService
+from app.services.downsampling_service import DownsamplingService
 from app.schemas.data import TimeseriesResponse
-from app.core.exceptions import DataNotFoundError, DataProcessingError
+from app.core.exceptions import (
+    DataNotFoundError,
+    DataProcessingError,
+    DataValidationError,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -12,116 +22,368 @@ logger = logging.getLogger(__name__)
 class VisualizationService:
     """Service for processing and preparing data for visualization."""
 
+    FILTER_COLUMNS = DataRepository.DIMENSION_COLUMNS
+    # Estimated bytes held per cached series point (a float and its list
+    # slot) and per label string, for sizing cached responses
+    POINT_BYTES = 32
+    LABEL_BYTES = 64
+
     def __init__(self, data_repo: DataRepository, filename: str, username: str):
         self.data_repo = data_repo
         self.filename = filename
         self.username = username
 
-    def get_timeseries_data(self, **filters: Optional[str]) -> TimeseriesResponse:
+    def get_timeseries_data(self, **params: Any) -> TimeseriesResponse:
         """
         Generate timeseries data for visualization by filtering and aggregating the dataset.
+        Takes the filters and options of `_build_timeseries` as keywords.
+
+        Responses are cached per version of the file and normalized query, and
+        are shared between callers, so they must not be modified.
+        """
+        identity = self.data_repo.csv_file_identity(
+            filename=self.filename, username=self.username
+        )
+        key = (self.username, self.filename, identity, self._normalize(params))
+        if identity is not None:
+            cached = timeseries_cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self._build_timeseries(**params)
+        if identity is not None:
+            timeseries_cache.set(key, response)
+        return response
+
+    @staticmethod
+    def _normalize(params: Dict[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+        """Query parameters in a canonical, hashable form, unset ones dropped"""
+        return tuple(
+            sorted(
+                (key, tuple(value) if isinstance(value, list) else str(value))
+                for key, value in params.items()
+                if value is not None
+            )
+        )
+
+    @staticmethod
+    def invalidate_results(username: str, filename: str) -> None:
+        """Evict every cached timeseries response of an uploaded file"""
+        timeseries_cache.discard_where(
+            lambda key: key[0] == username and key[1] == filename
+        )
+
+    @staticmethod
+    def response_size(response: TimeseriesResponse) -> int:
+        """Estimated memory of a cached response, counted without serializing it"""
+        points = sum(len(values) for values in response.y_axes.values())
+        labels = (
+            len(response.x_axis)
+            + len(response.y_labels)
+            + len(response.available_columns)
+            + sum(len(options) for options in response.filter_options.values())
+        )
+        return (
+            points * VisualizationService.POINT_BYTES
+            + labels * VisualizationService.LABEL_BYTES
+        )
+
+    def _build_timeseries(
+        self,
+        columns: Optional[List[str]] = None,
+        group_by: Optional[str] = None,
+        max_points: Optional[int] = None,
+        downsample: str = DownsamplingService.LTTB,
+        aggregations: Optional[List[str]] = None,
+        **filters: Optional[str],
+    ) -> TimeseriesResponse:
+        """
+        Filter and aggregate the dataset into a timeseries response: one
+        series per value column in `columns` (numeric columns only, "value"
+        by default) and statistic in `aggregations` (the sum by default),
+        split into one series per distinct value of the `group_by` dimension
+        when given. Grouped series are labelled "<column>:<group>", and any
+        statistic other than a lone sum is appended as ":<aggregation>".
+        With `max_points`, longer series are reduced to at most that many
+        dates with the `downsample` method.
         """
         try:
-            df = self.data_repo.get_csv_data(
+            if max_points is not None:
+                DownsamplingService.validate(downsample, max_points)
+            aggregations = AggregationService.validate(
+                aggregations or [AggregationService.SUM]
+            )
+            date_col = "year"
+            dtypes = self.data_repo.get_csv_dtypes(
                 filename=self.filename, username=self.username
             )
-            if df is None or df.empty:
+            if dtypes is None:
                 raise DataNotFoundError("No CSV data available")
+            available_columns = [
+                col
+                for col, dtype in dtypes.items()
+                if col != date_col
+                # Integer dimensions such as model are filters, not values
+                and col not in self.FILTER_COLUMNS
+                and pd.api.types.is_numeric_dtype(dtype)
+                and not pd.api.types.is_bool_dtype(dtype)
+            ]
+            value_cols = [
+                col for col in dict.fromkeys(columns or []) if col in available_columns
+            ] or ["value"]
+            if group_by is not None and (
+                group_by not in self.FILTER_COLUMNS or group_by not in dtypes
+            ):
+                raise DataValidationError(f"Cannot group by column: {group_by}")
 
-            df_filtered = self._apply_filters(df, filters)
-            date_col = "year"
-            value_cols = ["value"]
-
-            # Prepare visualization data
-            if not df_filtered.empty:
-                # Aggregate "value" by sum, keep other columns as-is
-                agg_dict = {
-                    col: "sum" if col == "value" else "first" for col in value_cols
-                }
-                agg_df = df_filtered.groupby(date_col, as_index=False).agg(agg_dict)
-                agg_df = agg_df.sort_values(date_col)
-
-                # Format date for visualization
-                if date_col == "year":
-                    agg_df[date_col] = pd.to_datetime(
-                        agg_df[date_col].astype(int).astype(str) + "-01-01"
-                    )
-                else:
-                    agg_df[date_col] = pd.to_datetime(agg_df[date_col])
+            read_columns = [date_col] + value_cols + self.FILTER_COLUMNS
+            active = {
+                key: value
+                for key, value in filters.items()
+                if value is not None and key in read_columns
+            }
 
-                x_axis = agg_df[date_col].dt.strftime("%Y-%m-%d").tolist()
-                y_axes = {col: agg_df[col].tolist() for col in value_cols}
+            # Common filter combinations are answered from the year rollup,
+            # which holds the "value" column and the statistics it derives
+            summary = None
+            if value_cols == ["value"] and set(aggregations) <= set(
+                CSVRollupService.AGGREGATIONS
+            ):
+                rollup = self.data_repo.get_csv_rollup(
+                    filename=self.filename, username=self.username
+                )
+                if rollup:
+                    summary = CSVRollupService.query(
+                        rollup, active, date_col=date_col, group_by=group_by
+                    )
+            if summary is not None:
+                total_rows = CSVRollupService.total_rows(rollup)
+                data_count = int(summary["rows"].sum())
+                stats = CSVRollupService.statistics(summary, aggregations)
             else:
-                x_axis = []
-                y_axes = {col: [] for col in value_cols}
+                total_rows, data_count, stats = self._aggregate_rows(
+                    active, date_col, value_cols, group_by, aggregations
+                )
+
+            x_axis, y_axes = self._series(
+                stats,
+                date_col,
+                group_by,
+                max_points,
+                downsample,
+                labelled=aggregations != [AggregationService.SUM],
+            )
 
             return TimeseriesResponse(
                 x_axis=x_axis,
                 y_axes=y_axes,
                 x_label=date_col,
-                y_labels=value_cols,
-                available_columns=value_cols,
+                y_labels=list(y_axes),
+                available_columns=available_columns,
                 filter_options=self.get_available_filters(),
-                data_count=len(df_filtered),
-                total_data_points=len(df),
+                data_count=data_count,
+                total_data_points=total_rows,
                 filtered=self._has_active_filters(filters),
             )
 
-        except (DataNotFoundError, DataProcessingError) as e:
+        except (DataNotFoundError, DataProcessingError, DataValidationError) as e:
             logger.error(f"A known data error occurred: {e}")
             raise
         except Exception as e:
             logger.error(f"An unexpected error occurred in get_timeseries_data: {e}")
             raise DataProcessingError(f"Failed to process timeseries data: {e}")
 
+    def _aggregate_rows(
+        self,
+        filters: Dict[str, str],
+        date_col: str,
+        value_cols: List[str],
+        group_by: Optional[str] = None,
+        aggregations: Tuple[str, ...] = (AggregationService.SUM,),
+    ) -> Tuple[int, int, pd.DataFrame]:
+        """
+        Total and matching row counts, and the statistics of the value
+        columns over the matching rows per date (and group), computed from
+        the rows themselves in one pass
+        """
+        # Indexed filters select the rows up front, so only those are read
+        index = self.data_repo.get_csv_index(
+            filename=self.filename, username=self.username
+        )
+        rows, remaining = (
+            CSVIndexService.lookup(index, filters) if index else (None, filters)
+        )
+        # Only the filter, date and value columns are read from the store
+        df = self.data_repo.get_csv_data(
+            filename=self.filename,
+            username=self.username,
+            columns=list(dict.fromkeys(self.FILTER_COLUMNS + [date_col] + value_cols)),
+            rows=rows,
+        )
+        if df is None:
+            raise DataNotFoundError("No CSV data available")
+        total_rows = int(index["num_rows"]) if index else len(df)
+        if total_rows == 0:
+            raise DataNotFoundError("No CSV data available")
+
+        df_filtered = self._apply_filters(df, remaining)
+
+        keys = [date_col] + ([group_by] if group_by else [])
+        stats = AggregationService.aggregate(
+            df_filtered, keys, value_cols, list(aggregations)
+        )
+        return total_rows, len(df_filtered), stats
+
+    @staticmethod
+    def _series(
+        stats: pd.DataFrame,
+        date_col: str,
+        group_by: Optional[str] = None,
+        max_points: Optional[int] = None,
+        downsample: str = DownsamplingService.LTTB,
+        labelled: bool = False,
+    ) -> Tuple[List[str], Dict[str, List[Optional[float]]]]:
+        """
+        Shared x axis and one list per series from per-date (and per-group)
+        statistics with (column, aggregation) columns; dates a group has no
+        rows for are None. Series names carry the aggregation when
+        `labelled`. Beyond `max_points` dates only those picked by the
+        downsampling method are kept.
+        """
+        stats = stats[stats.index.to_frame().notna().all(axis=1).to_numpy()]
+        if group_by:
+            # One column per (value column, aggregation, group), aligned on
+            # the dates; the statistics of a group are listed together
+            wide = stats.unstack(group_by).dropna(axis=1, how="all")
+            value_cols = list(dict.fromkeys(stats.columns.get_level_values(0)))
+            columns = [
+                column
+                for _, _, column in sorted(
+                    zip(
+                        [value_cols.index(col) for col, _, _ in wide.columns],
+                        wide.columns.codes[2],
+                        wide.columns,
+                    ),
+                    key=lambda item: item[:2],
+                )
+            ]
+        else:
+            wide = stats
+            columns = list(wide.columns)
+        labels = {}
+        for column in columns:
+            col, aggregation, *group = column
+            name = ":".join([str(col)] + [str(g) for g in group])
+            labels[f"{name}:{aggregation}" if labelled else name] = column
+        wide = wide.sort_index()
+
+        # Format date for visualization
+        dates = wide.index.to_series()
+        if date_col == "year":
+            dates = pd.to_datetime(dates.astype(int).astype(str) + "-01-01")
+        else:
+            dates = pd.to_datetime(dates)
+
+        if max_points is not None and len(wide) > max_points:
+            kept = DownsamplingService.select(
+                dates.to_numpy(dtype="datetime64[ns]").astype(np.float64),
+                [wide[column].to_numpy(dtype=np.float64) for column in labels.values()],
+                max_points,
+                downsample,
+            )
+            wide, dates = wide.iloc[kept], dates.iloc[kept]
+        x_axis = dates.dt.strftime("%Y-%m-%d").tolist()
+
+        y_axes = {}
+        for label, column in labels.items():
+            values = wide[column].astype(object)
+            y_axes[label] = values.where(values.notna(), None).tolist()
+        return x_axis, y_axes
+
     def _apply_filters(
         self, df: pd.DataFrame, filters: Dict[str, Optional[str]]
     ) -> pd.DataFrame:
         """Apply a dictionary of filters to the DataFrame."""
-        df_filtered = df.copy()
+        mask = np.ones(len(df), dtype=bool)
 
         for key, value in filters.items():
-            if value is None or key not in df_filtered.columns:
+            if value is None or key not in df.columns:
                 continue
 
-            df_filtered = df_filtered[df_filtered[key].astype(str) == str(value)]
+            mask &= self._matches(df[key], value)
 
-            if df_filtered.empty:
+            if not mask.any():
                 logger.warning(f"Filter {key}={value} resulted in empty dataset.")
                 break
 
-        return df_filtered
+        return df[mask]
+
+    @staticmethod
+    def _matches(column: pd.Series, value: str) -> np.ndarray:
+        """Rows of a column equal to a filter value, compared as strings"""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Look the value up among the categories once, then compare codes
+            categories = column.cat.categories.astype(str)
+            codes = np.flatnonzero(categories == str(value))
+            return np.isin(column.cat.codes.to_numpy(), codes)
+        return (column.astype(str) == str(value)).to_numpy()
 
     def _has_active_filters(self, filters: Dict[str, Optional[str]]) -> bool:
         """Check if any filter values have been provided."""
         return any(val is not None for val in filters.values())
 
-    def get_available_filters(self) -> Dict[str, List[str]]:
-        """Get unique, sorted values for all potential filter columns."""
+    def get_available_filters(self, **filters: Optional[str]) -> Dict[str, List[str]]:
+        """
+        Get unique, sorted values for all potential filter columns. With
+        filters, each column only offers the values found together with the
+        chosen values of the other columns.
+        """
         try:
+            active = {key: value for key, value in filters.items() if value is not None}
+            if active:
+                index = self.data_repo.get_csv_index(
+                    filename=self.filename, username=self.username
+                )
+                if index is not None:
+                    options = CSVIndexService.cascading_options(index, active)
+                    return self._ordered(options)
+            else:
+                counts = self.data_repo.get_filter_options(
+                    filename=self.filename, username=self.username
+                )
+                if counts is not None:
+                    return self._ordered({col: list(counts[col]) for col in counts})
+
+            # Uploads stored before the options were kept are scanned
             df = self.data_repo.get_csv_data(
-                filename=self.filename, username=self.username
+                filename=self.filename,
+                username=self.username,
+                columns=self.FILTER_COLUMNS,
             )
             if df is None or df.empty:
                 return {}
 
-            filter_columns = [
-                "model",
-                "scenario",
-                "region",
-                "species_group",
-                "forest_land",
-                "item",
-                "variable",
-                "unit",
-            ]
-
-            return {
-                col: sorted(df[col].dropna().unique().astype(str))
-                for col in filter_columns
-                if col in df.columns
-            }
+            options = {}
+            for col in self.FILTER_COLUMNS:
+                if col not in df.columns:
+                    continue
+                others = {key: value for key, value in active.items() if key != col}
+                values = self._apply_filters(df, others)[col]
+                options[col] = sorted(values.dropna().unique().astype(str))
+            return options
 
         except Exception as e:
             logger.error(f"Error getting available filters: {str(e)}")
             return {}
+
+    def _ordered(self, options: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Options in filter column order"""
+        return {col: options[col] for col in self.FILTER_COLUMNS if col in options}
+
+
+# Timeseries responses shared by all requests, expiring after a while
+timeseries_cache = LRUCache(
+    max_bytes=settings.TIMESERIES_CACHE_MEMORY_BYTES,
+    sizeof=VisualizationService.response_size,
+    ttl=settings.TIMESERIES_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.exceptions import DataValidationError
+from app.services.aggregation_service import AggregationService
+
+
+class TestAggregate:
+    def test_aggregate_matches_pandas(self):
+        """Test every statistic of one pass agrees with pandas per group"""
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            {
+                "year": rng.integers(2000, 2010, size=5000),
+                "model": pd.Categorical(rng.choice(["a", "b", "c"], size=5000)),
+                "value": rng.normal(size=5000),
+            }
+        )
+        df.loc[::11, "value"] = np.nan
+        keys = ["year", "model"]
+
+        result = AggregationService.aggregate(
+            df, keys, ["value"], ["sum", "mean", "median", "std", "p5", "p95"]
+        )
+
+        grouped = df.groupby(keys, observed=True)["value"]
+        expected = grouped.agg(["sum", "mean", "median", "std"])
+        expected["p5"] = grouped.quantile(0.05)
+        expected["p95"] = grouped.quantile(0.95)
+        for aggregation in expected.columns:
+            np.testing.assert_allclose(
+                result[("value", aggregation)], expected[aggregation]
+            )
+
+    def test_aggregate_empty_groups_and_validation(self):
+        """Test groups without values and unknown aggregations"""
+        df = pd.DataFrame({"year": [2020, 2020, 2030], "value": [np.nan, np.nan, 4.0]})
+
+        result = AggregationService.aggregate(
+            df, ["year"], ["value"], ["sum", "count", "min", "p50"]
+        )
+
+        assert result.loc[2020].tolist()[:2] == [0.0, 0.0]
+        assert np.isnan(result.loc[2020].tolist()[2:]).all()
+        assert result.loc[2030].tolist() == [4.0, 1.0, 4.0, 4.0]
+        assert AggregationService.validate(["p5", "mean", "p5"]) == ["p5", "mean"]
+        with pytest.raises(DataValidationError):
+            AggregationService.validate(["p500"])
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from app.repositories.data_repository import DataRepository
+from app.services.visualization_service import VisualizationService
+
+
+class TestApplyFilters:
+    def test_apply_filters_on_categorical_columns(self, tmp_path, monkeypatch):
+        """Test filters match dictionary-encoded dimension columns by code"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame(
+            {
+                "scenario": ["base", "ssp2", "base", "ssp2"] * 2,
+                "region": ["EU", "EU", "US", "US"] * 2,
+                "year": [2020] * 4 + [2030] * 4,
+                "value": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0],
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="f.csv")
+        stored = DataRepository.get_csv_data(username="alice", filename="f.csv")
+        service = VisualizationService(DataRepository(), "f.csv", "alice")
+
+        assert isinstance(stored["region"].dtype, pd.CategoricalDtype)
+        filtered = service._apply_filters(
+            stored, {"scenario": "ssp2", "region": "EU", "model": None}
+        )
+        assert filtered["value"].tolist() == [2.0, 6.0]
+        assert service._apply_filters(stored, {"region": "Asia"}).empty
+
+        result = service.get_timeseries_data(region="US")
+        assert result.y_axes["value"] == [7.0, 15.0]
+        assert result.data_count == 4
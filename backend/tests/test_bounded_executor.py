@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import pytest
+
+from app.core.exceptions import ServiceOverloadedError
+from app.core.executor import BoundedExecutor
+
+
+class TestBoundedExecutor:
+    def test_run_off_event_loop(self):
+        """Test blocking calls run on pool threads and return their result"""
+        executor = BoundedExecutor("test", BoundedExecutor.THREAD, 2, 4, 1)
+
+        async def main():
+            return await executor.run(lambda: threading.current_thread().name)
+
+        try:
+            assert asyncio.run(main()).startswith("test")
+            assert executor.stats()["completed"] == 1
+        finally:
+            executor.shutdown()
+
+    def test_rejects_when_saturated(self):
+        """Test calls beyond max_pending fail fast with a 503 and Retry-After"""
+        executor = BoundedExecutor("test", BoundedExecutor.THREAD, 1, 2, 7)
+        release = threading.Event()
+
+        async def main():
+            blocked = [
+                asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(ServiceOverloadedError) as error:
+                await executor.run(release.wait)
+            release.set()
+            await asyncio.gather(*blocked)
+            return error.value
+
+        try:
+            error = asyncio.run(main())
+            assert error.status_code == 503
+            assert error.headers["Retry-After"] == "7"
+            assert executor.stats()["rejected"] == 1
+            assert executor.stats()["pending"] == 0
+        finally:
+            release.set()
+            executor.shutdown()
+
+    def test_submit_rejects_before_returning(self):
+        """Test queued work holds its slot and saturation raises at once"""
+        executor = BoundedExecutor("test", BoundedExecutor.THREAD, 1, 1, 3)
+        release = threading.Event()
+        try:
+            future = executor.submit(release.wait)
+            with pytest.raises(ServiceOverloadedError):
+                executor.submit(release.wait)
+            release.set()
+            assert future.result(timeout=5) is True
+            assert executor.stats()["pending"] == 0
+            assert executor.stats()["rejected"] == 1
+        finally:
+            release.set()
+            executor.shutdown()
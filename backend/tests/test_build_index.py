@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from app.repositories.data_repository import DataRepository
+from app.services.csv_index_service import CSVIndexService
+from app.services.visualization_service import VisualizationService
+
+
+class TestBuildIndex:
+    def test_build_index_matches_scan(self, tmp_path, monkeypatch):
+        """Test index lookups select the same rows as scanning the table"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            {
+                "scenario": rng.choice(["base", "ssp1", "ssp2"], 5000),
+                "region": rng.choice(["EU", "US", "CN", None], 5000),
+                "year": rng.integers(2000, 2010, 5000),
+                "value": rng.random(5000),
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="i.csv")
+        CSVIndexService.build_index_file(
+            DataRepository._get_cleaned_path(username="alice", filename="i.csv"),
+            DataRepository._get_index_path(username="alice", filename="i.csv"),
+            DataRepository.DIMENSION_COLUMNS,
+        )
+        index = DataRepository.get_csv_index(username="alice", filename="i.csv")
+
+        assert CSVIndexService.columns(index) == ["scenario", "region"]
+        rows, remaining = CSVIndexService.lookup(
+            index, {"scenario": "ssp2", "region": "EU", "year": "2003", "item": None}
+        )
+        expected = np.flatnonzero((df["scenario"] == "ssp2") & (df["region"] == "EU"))
+        np.testing.assert_array_equal(rows, expected)
+        assert remaining == {"year": "2003"}
+        assert not len(CSVIndexService.lookup(index, {"region": "Mars"})[0])
+
+        selected = DataRepository.get_csv_data(
+            username="alice", filename="i.csv", columns=["value"], rows=rows
+        )
+        assert selected["value"].tolist() == df["value"].iloc[expected].tolist()
+
+        service = VisualizationService(DataRepository(), "i.csv", "alice")
+        result = service.get_timeseries_data(scenario="base", region="US")
+        assert result.total_data_points == 5000
+        assert result.data_count == int(
+            ((df["scenario"] == "base") & (df["region"] == "US")).sum()
+        )
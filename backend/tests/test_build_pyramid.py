@@ -0,0 +1,45 @@
+import pytest
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from app.services.pyramid_service import PyramidService
+from app.services.raster_service import RasterService
+
+
+class TestPyramidService:
+    def test_downsample_2x_ignores_nan(self):
+        """Test block means skip missing pixels instead of spreading them"""
+        data = np.array([[1.0, np.nan, 5.0], [3.0, np.nan, np.nan]], dtype=np.float32)
+
+        result = PyramidService.downsample_2x(data)
+
+        assert result.shape == (1, 2)
+        assert result[0, 0] == pytest.approx(2.0)
+        assert result[0, 1] == pytest.approx(5.0)
+
+    def test_build_pyramid(self, tmp_path):
+        """Test overview levels are built and used for low zoom tiles"""
+        source = tmp_path / "grid.nc"
+        pyramid = tmp_path / "grid.nc.pyramid.nc"
+        values = np.random.rand(2, 600, 1000).astype(np.float32)
+        xr.Dataset(
+            {"tas": (("time", "lat", "lon"), values)},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=2),
+                "lat": np.linspace(-90, 90, 600),
+                "lon": np.linspace(-180, 180, 1000),
+            },
+        ).to_netcdf(source, engine="h5netcdf")
+
+        PyramidService.build_pyramid(source, pyramid)
+
+        with xr.open_dataset(pyramid, engine="h5netcdf") as overviews:
+            assert overviews["tas_L1"].shape == (2, 300, 500)
+            assert overviews["tas_L2"].shape == (2, 150, 250)
+            assert "tas_L3" not in overviews
+        tile = RasterService.extract_tile_from_netcdf(
+            str(source), "tas", 1, 0, 0, 0, pyramid_path=str(pyramid)
+        )
+        assert tile["level"] == 2
+        assert tile["data"].shape == (256, 256)
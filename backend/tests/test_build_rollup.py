@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.repositories.data_repository import DataRepository
+from app.services.csv_rollup_service import CSVRollupService
+from app.services.visualization_service import VisualizationService
+
+
+class TestBuildRollup:
+    def test_build_rollup_matches_raw_rows(self, tmp_path, monkeypatch):
+        """Test timeseries answered from the rollup equal those from the rows"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame(
+            {
+                "model": rng.integers(1, 3, 4000),
+                "scenario": rng.choice(["base", "ssp1"], 4000),
+                "region": rng.choice(["EU", "US", "CN"], 4000),
+                "variable": rng.choice(["area", "volume"], 4000),
+                "year": rng.integers(2000, 2005, 4000),
+                "value": rng.random(4000),
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="r.csv")
+        service = VisualizationService(DataRepository(), "r.csv", "alice")
+        filters = {"scenario": "ssp1", "region": "US"}
+        raw = service.get_timeseries_data(**filters)
+
+        CSVRollupService.build_rollup_file(
+            DataRepository._get_cleaned_path(username="alice", filename="r.csv"),
+            DataRepository._get_rollup_path(username="alice", filename="r.csv"),
+            DataRepository.DIMENSION_COLUMNS,
+        )
+        rollup = DataRepository.get_csv_rollup(username="alice", filename="r.csv")
+
+        assert set(rollup) >= {"", "scenario", "region,variable"}
+        assert CSVRollupService.total_rows(rollup) == 4000
+        # Three filters are beyond the two-dimension cuboids
+        assert CSVRollupService.query(rollup, {**filters, "variable": "area"}) is None
+
+        VisualizationService.invalidate_results(username="alice", filename="r.csv")
+        cube = service.get_timeseries_data(**filters)
+        assert cube.x_axis == raw.x_axis
+        assert cube.y_axes["value"] == pytest.approx(raw.y_axes["value"])
+        assert cube.data_count == raw.data_count
+        assert cube.total_data_points == raw.total_data_points
+
+        VisualizationService.invalidate_results(username="alice", filename="r.csv")
+        by_model = service.get_timeseries_data(model=1, region="US")
+        selected = df[(df["model"] == 1) & (df["region"] == "US")]
+        assert by_model.data_count == len(selected) > 0
+        assert by_model.y_axes["value"] == pytest.approx(
+            selected.groupby("year")["value"].sum().tolist()
+        )
+
+        summary = CSVRollupService.query(rollup, {"variable": "area"})
+        selected = df[df["variable"] == "area"].groupby("year")["value"]
+        assert summary["max"].tolist() == selected.max().tolist()
+        assert summary["count"].tolist() == selected.count().tolist()
+        assert service.get_timeseries_data(region="Mars").data_count == 0
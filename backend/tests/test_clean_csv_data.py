@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from unittest.mock import Mock, patch
@@ -19,3 +20,34 @@ class TestCSVService:
         assert "original_shape" in report
         assert "final_shape" in report
         assert report["final_shape"] is not None
+
+    def test_clean_csv_data_fills_missing(self):
+        """Test medians and modes fill the gaps in one pass, timed per stage"""
+        df = pd.DataFrame(
+            {
+                "Region": ["EU", None, "US", "EU"],
+                "Notes": pd.Series([None] * 4, dtype=object),
+                "1990": [1.0, None, 3.0, 10.0],
+                "1991": [np.nan] * 4,
+                "Count": [1, 2, 3, 4],
+            }
+        )
+
+        cleaned_df, report = CSVService.clean_csv_data(df)
+
+        assert cleaned_df["region"].tolist() == ["EU", "EU", "US", "EU"]
+        assert cleaned_df["notes"].tolist() == ["Unknown"] * 4
+        assert cleaned_df["1990"].tolist() == [1.0, 3.0, 3.0, 10.0]
+        assert cleaned_df["1991"].isna().all()
+        assert cleaned_df["count"].tolist() == [1, 2, 3, 4]
+        assert report["issues_found"] == ["Found 10 missing values"]
+        assert "Filled missing numeric values in count with median" in (
+            report["fixes_applied"]
+        )
+        assert list(report["timings"]) == [
+            "headers",
+            "dates",
+            "missing_values",
+            "units",
+            "duplicates",
+        ]
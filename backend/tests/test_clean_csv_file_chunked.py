@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+from app.services.csv_service import CSVService
+from app.services.csv_stream_service import CSVStreamService
+
+
+def collect(batches):
+    @contextmanager
+    def open_writer():
+        yield batches.append
+
+    return open_writer
+
+
+class TestCleanCSVFileChunked:
+    def test_matches_in_memory_cleaning(self, tmp_path):
+        """Test batch cleaning gives the same table and report as clean_csv_data"""
+        rng = np.random.default_rng(0)
+        rows = 1000
+        df = pd.DataFrame(
+            {
+                "Region": rng.choice(["EU", "US", "CN", None], rows),
+                "Year": rng.integers(2000, 2030, rows),
+                "Temp": np.where(
+                    rng.random(rows) < 0.1, np.nan, rng.random(rows) * 100
+                ),
+                "Value": rng.integers(0, 5, rows).astype(float),
+                "Start_Date": np.where(
+                    rng.random(rows) < 0.05,
+                    None,
+                    pd.Series(
+                        pd.Timestamp("2000-01-01")
+                        + pd.to_timedelta(rng.integers(0, 9000, rows), unit="D")
+                    ).dt.strftime("%d/%m/%Y"),
+                ),
+            }
+        )
+        # Duplicates that straddle batch boundaries
+        df = pd.concat([df, df.iloc[[3, 250, 999]]], ignore_index=True)
+        csv_path = tmp_path / "data.csv"
+        df.to_csv(csv_path, index=False)
+
+        expected, expected_report = CSVService.clean_csv_data(pd.read_csv(csv_path))
+        batches = []
+        result = CSVStreamService.process_csv_file(
+            csv_path, collect(batches), chunk_rows=97
+        )
+
+        cleaned = pd.concat(batches, ignore_index=True)
+        pd.testing.assert_frame_equal(cleaned, expected.reset_index(drop=True))
+        report = result["cleaning_report"]
+        assert report["issues_found"] == expected_report["issues_found"]
+        assert report["fixes_applied"] == expected_report["fixes_applied"]
+        assert report["final_shape"] == expected_report["final_shape"]
+        assert result["summary"]["total_rows"] == len(expected)
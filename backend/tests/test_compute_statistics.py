@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from app.services.raster_stats_service import RasterStatsService
+
+
+class TestComputeStatistics:
+    def test_compute_statistics(self, tmp_path, monkeypatch):
+        """Test streamed statistics match in-memory numpy over several blocks"""
+        source = tmp_path / "grid.nc"
+        values = np.random.rand(4, 90, 120).astype(np.float32) * 50 + 1000
+        values[1, :30] = np.nan
+        values[3] = np.nan
+        xr.Dataset(
+            {"tas": (("time", "lat", "lon"), values)},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=4),
+                "lat": np.linspace(-90, 90, 90),
+                "lon": np.linspace(-180, 180, 120),
+            },
+        ).to_netcdf(
+            source, engine="h5netcdf", encoding={"tas": {"chunksizes": (2, 10, 120)}}
+        )
+        # Force many small bands so the merge path is exercised
+        monkeypatch.setattr(RasterStatsService, "STATS_BLOCK_BYTES", 100_000)
+
+        stats = RasterStatsService.compute_statistics(source)["tas"]
+
+        data = values.astype(np.float64)
+        assert stats["count"] == np.isfinite(data).sum()
+        assert stats["min"] == pytest.approx(np.nanmin(data))
+        assert stats["max"] == pytest.approx(np.nanmax(data))
+        assert stats["mean"] == pytest.approx(np.nanmean(data))
+        assert stats["std"] == pytest.approx(np.nanstd(data), rel=1e-5)
+
+        steps = stats["time_steps"]
+        assert steps["count"] == [10800, 7200, 10800, 0]
+        assert steps["mean"][1] == pytest.approx(np.nanmean(data[1]))
+        assert steps["std"][2] == pytest.approx(np.nanstd(data[2]), rel=1e-5)
+        assert steps["min"][3] is None and steps["mean"][3] is None
@@ -0,0 +1,28 @@
+import pytest
+import shutil
+
+from app.repositories.dataset_pool import DatasetPool
+
+
+class TestDatasetPool:
+    def test_dataset_pool(self, tmp_path):
+        """Test pooled handles are reused, bounded and invalidated"""
+        first = tmp_path / "first.nc"
+        second = tmp_path / "second.nc"
+        shutil.copy("./tests/data/sample_raster.nc", first)
+        shutil.copy("./tests/data/sample_raster.nc", second)
+        pool = DatasetPool(max_open=1)
+
+        with pool.acquire(first) as ds_a:
+            assert "pr" in ds_a.data_vars
+        with pool.acquire(first) as ds_b:
+            assert ds_b is ds_a
+        assert pool.stats()["hits"] == 1
+
+        # Opening a second file evicts the first
+        with pool.acquire(second):
+            pass
+        assert pool.stats()["open_files"] == 1
+
+        pool.invalidate(second)
+        assert pool.stats()["open_files"] == 0
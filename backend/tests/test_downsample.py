@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.core.exceptions import DataValidationError
+from app.services.downsampling_service import DownsamplingService
+
+
+class TestDownsample:
+    def test_lttb_keeps_ends_and_spikes(self):
+        """Test LTTB returns the threshold with both ends and a lone spike"""
+        x = np.arange(10_000, dtype=np.float64)
+        y = np.sin(x / 500)
+        y[4321] = 25.0
+
+        kept = DownsamplingService.lttb(x, y, 200)
+
+        assert len(kept) == 200
+        assert kept[0] == 0 and kept[-1] == 9999
+        assert np.all(np.diff(kept) > 0)
+        assert 4321 in kept
+
+    def test_minmax_envelope(self):
+        """Test min/max buckets keep every bucket's extremes, skipping NaN"""
+        y = np.random.default_rng(0).normal(size=1000)
+        y[::7] = np.nan
+        y[500] = -40.0
+
+        kept = DownsamplingService.minmax(np.arange(1000), y, 100)
+
+        assert len(kept) <= 100
+        assert 500 in kept
+        assert not np.isnan(y[kept]).any()
+        assert np.nanmax(y) in y[kept]
+
+    def test_select_bounds_merged_series(self):
+        """Test several series share the budget and bad options are rejected"""
+        x = np.arange(5000, dtype=np.float64)
+        series = [np.cos(x / 100), np.sqrt(x), np.full(5000, np.nan)]
+
+        kept = DownsamplingService.select(x, series, 120, DownsamplingService.LTTB)
+
+        assert len(kept) <= 120
+        assert np.all(np.diff(kept) > 0)
+        assert len(DownsamplingService.select(x[:50], series, 120)) == 50
+        with pytest.raises(DataValidationError):
+            DownsamplingService.select(x, series, 120, "median")
+        with pytest.raises(DataValidationError):
+            DownsamplingService.select(x, series, 2)
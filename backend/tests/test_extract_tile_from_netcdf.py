@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+
+from app.services.raster_service import RasterService
+
+
+class TestExtractTile:
+    def test_extract_tile_from_netcdf(self):
+        """Test tile extraction reads a window and returns a full-size tile"""
+        netcdf_path = "./tests/data/sample_raster.nc"
+
+        tile = RasterService.extract_tile_from_netcdf(
+            netcdf_path, "pr", time_index=0, zoom=3, x=2, y=4, tile_size=128
+        )
+
+        assert tile["data"].shape == (128, 128)
+        # Missing pixels stay NaN instead of being filled with zeros
+        assert np.isfinite(tile["data"]).any()
+        assert not np.isinf(tile["data"]).any()
+        assert tile["stats"]["min"] <= tile["stats"]["mean"] <= tile["stats"]["max"]
+
+    def test_extract_tiles_from_netcdf(self):
+        """Test a tile batch matches tiles extracted one by one"""
+        netcdf_path = "./tests/data/sample_raster.nc"
+        tiles = [(4, 5, 6), (4, 6, 6), (2, 1, 1)]
+
+        batch = RasterService.extract_tiles_from_netcdf(
+            netcdf_path, "pr", [0, 1], tiles, tile_size=64
+        )
+
+        assert len(batch) == 6
+        for tile in batch:
+            single = RasterService.extract_tile_from_netcdf(
+                netcdf_path,
+                "pr",
+                tile["time_index"],
+                tile["zoom"],
+                tile["x"],
+                tile["y"],
+                tile_size=64,
+            )
+            np.testing.assert_array_equal(tile["data"], single["data"])
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from app.repositories.data_repository import DataRepository
+from app.services.csv_index_service import CSVIndexService
+from app.services.visualization_service import VisualizationService
+
+
+class TestGetAvailableFilters:
+    def test_get_available_filters_cascading(self, tmp_path, monkeypatch):
+        """Test stored options are served and narrowed by co-occurrence"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame(
+            {
+                "scenario": ["base", "base", "ssp2", "ssp2", "ssp2"],
+                "region": ["EU", "US", "EU", "CN", None],
+                "variable": ["area", "area", "volume", "area", "volume"],
+                "year": [2020, 2020, 2020, 2030, 2030],
+                "value": [1.0, 2.0, 3.0, 4.0, 5.0],
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="o.csv")
+        service = VisualizationService(DataRepository(), "o.csv", "alice")
+        scanned = service.get_available_filters()
+        scanned_cascade = service.get_available_filters(scenario="ssp2")
+
+        filter_options = CSVIndexService.build_index_file(
+            DataRepository._get_cleaned_path(username="alice", filename="o.csv"),
+            DataRepository._get_index_path(username="alice", filename="o.csv"),
+            DataRepository.DIMENSION_COLUMNS,
+        )
+        DataRepository.store_csv_data(
+            None,
+            {},
+            {"username": "alice", "filename": "o.csv"},
+            filter_options,
+        )
+
+        assert filter_options["region"] == {"CN": 1, "EU": 2, "US": 1}
+        assert service.get_available_filters() == scanned
+        assert scanned == {
+            "scenario": ["base", "ssp2"],
+            "region": ["CN", "EU", "US"],
+            "variable": ["area", "volume"],
+        }
+
+        cascade = service.get_available_filters(scenario="ssp2")
+        assert cascade == scanned_cascade
+        assert cascade["region"] == ["CN", "EU"]
+        assert cascade["scenario"] == ["base", "ssp2"]
+        assert service.get_available_filters(region="US", variable="area") == {
+            "scenario": ["base"],
+            "region": ["CN", "EU", "US"],
+            "variable": ["area"],
+        }
+        assert service.get_available_filters(region="Mars")["variable"] == []
+
+        listed = DataRepository.get_user_files("alice")
+        assert "filter_options" not in listed[0]
@@ -0,0 +1,71 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from app.repositories.data_repository import DataRepository
+
+
+class TestGetCSVData:
+    def test_get_csv_data_from_cleaned_store(self, tmp_path, monkeypatch):
+        """Test cleaned tables round-trip through Parquet with column projection"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame(
+            {
+                "region": ["EU", "US", "EU"],
+                "year": [2020, 2021, 2022],
+                "value": [1.5, 2.5, None],
+            }
+        )
+
+        DataRepository.store_cleaned_csv(df, username="alice", filename="x.csv")
+
+        cleaned_path = DataRepository._get_cleaned_path(
+            username="alice", filename="x.csv"
+        )
+        assert pq.ParquetFile(cleaned_path).metadata.row_group(0).column(1).statistics
+        # Dimension columns come back dictionary-encoded
+        pd.testing.assert_frame_equal(
+            DataRepository.get_csv_data(username="alice", filename="x.csv"),
+            df.astype({"region": "category"}),
+        )
+        projected = DataRepository.get_csv_data(
+            username="alice", filename="x.csv", columns=["year", "missing"]
+        )
+        assert list(projected.columns) == ["year"]
+
+    def test_get_csv_data_falls_back_to_raw_csv(self, tmp_path, monkeypatch):
+        """Test uploads without a cleaned table are read from the raw CSV"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        (tmp_path / "alice_old.csv").write_text("year,value\n2020,1.0\n")
+
+        df = DataRepository.get_csv_data(
+            username="alice", filename="old.csv", columns=["value"]
+        )
+
+        assert list(df.columns) == ["value"]
+        assert df["value"].tolist() == [1.0]
+
+    def test_get_csv_data_cached(self, tmp_path, monkeypatch):
+        """Test repeated reads hit the column cache until the file changes"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame({"year": [2020, 2021], "value": [1.0, 2.0]})
+        DataRepository.store_cleaned_csv(df, username="alice", filename="c.csv")
+
+        before = DataRepository.csv_cache_stats()
+        DataRepository.get_csv_data(username="alice", filename="c.csv")
+        second = DataRepository.get_csv_data(username="alice", filename="c.csv")
+        second["value"] = 0.0
+        third = DataRepository.get_csv_data(
+            username="alice", filename="c.csv", columns=["value"]
+        )
+        after = DataRepository.csv_cache_stats()
+
+        assert after["misses"] - before["misses"] == 2
+        assert after["hits"] - before["hits"] == 3
+        assert third["value"].tolist() == [1.0, 2.0]
+
+        DataRepository.store_cleaned_csv(
+            df.assign(value=[5.0, 6.0]), username="alice", filename="c.csv"
+        )
+        DataRepository.invalidate_csv_cache(username="alice", filename="c.csv")
+        fresh = DataRepository.get_csv_data(username="alice", filename="c.csv")
+        assert fresh["value"].tolist() == [5.0, 6.0]
@@ -0,0 +1,138 @@
+import json
+import shutil
+import struct
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import visualization
+from app.main import app
+from app.repositories.data_repository import DataRepository
+from app.schemas.auth import User
+from app.services.pyramid_service import PyramidService
+from app.services.raster_service import RasterService
+from app.services.tile_cache import TileCache
+
+
+def read_frames(body):
+    frames = []
+    position = 0
+    while position < len(body):
+        (head_length,) = struct.unpack_from("<I", body, position)
+        position += 4
+        header = json.loads(body[position : position + head_length])
+        position += head_length
+        (body_length,) = struct.unpack_from("<I", body, position)
+        position += 4 + body_length
+        frames.append(header)
+    return frames
+
+
+class TestGetRasterTiles:
+    def test_get_raster_tiles_per_time_step(self, tmp_path, monkeypatch):
+        """Test batches are extracted a time step at a time and bounded"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        shutil.copy(
+            "./tests/data/sample_raster.nc",
+            DataRepository._get_file_path(username="alice", filename="r.nc"),
+        )
+        cache = TileCache(
+            cache_dir=tmp_path / ".tile_cache",
+            max_memory_bytes=1 << 20,
+            max_disk_bytes=1 << 30,
+        )
+        monkeypatch.setattr(visualization, "tile_cache", cache)
+        extract = RasterService.extract_tiles_from_netcdf
+        calls = []
+
+        def recording(*args, **kwargs):
+            calls.append(args[2])
+            return extract(*args, **kwargs)
+
+        monkeypatch.setattr(RasterService, "extract_tiles_from_netcdf", recording)
+        app.dependency_overrides[get_current_user] = lambda: User(
+            username="alice", role="user"
+        )
+        try:
+            client = TestClient(app)
+            url = "/api/v1/data/visualization/raster/tiles/r.nc/pr"
+            tiles = [{"zoom": 2, "x": 1, "y": 1}, {"zoom": 2, "x": 2, "y": 1}]
+
+            response = client.post(
+                url, json={"tiles": tiles, "time_indices": [1, 0], "tile_size": 32}
+            )
+            assert response.status_code == 200, response.text
+            frames = read_frames(response.content)
+            assert [(f["time_index"], f["x"]) for f in frames] == [
+                (1, 1),
+                (1, 2),
+                (0, 1),
+                (0, 2),
+            ]
+            assert calls == [[1], [0]]
+
+            out_of_range = client.post(
+                url, json={"tiles": tiles, "time_indices": [0, 99], "tile_size": 32}
+            )
+            assert out_of_range.status_code == 400
+            assert "99" in out_of_range.json()["detail"]
+            assert calls == [[1], [0]]
+
+            oversized = client.post(url, json={"tiles": tiles, "tile_size": 4096})
+            assert oversized.status_code == 422
+            too_many = client.post(
+                url,
+                json={
+                    "tiles": tiles * 128,
+                    "time_indices": list(range(32)),
+                    "tile_size": 256,
+                },
+            )
+            assert too_many.status_code == 422
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+    def test_get_raster_tile_after_pyramid_build(self, tmp_path, monkeypatch):
+        """Test tiles cached before the pyramid existed are not served after it"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        file_path = DataRepository._get_file_path(username="alice", filename="g.nc")
+        xr.Dataset(
+            {"tas": (("time", "lat", "lon"), np.random.rand(1, 64, 128))},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=1),
+                "lat": np.linspace(-90, 90, 64),
+                "lon": np.linspace(-180, 180, 128),
+            },
+        ).to_netcdf(file_path, engine="h5netcdf")
+        cache = TileCache(
+            cache_dir=tmp_path / ".tile_cache",
+            max_memory_bytes=1 << 20,
+            max_disk_bytes=1 << 30,
+        )
+        monkeypatch.setattr(visualization, "tile_cache", cache)
+        monkeypatch.setattr(PyramidService, "OVERVIEW_TILE_SIZE", 16)
+        app.dependency_overrides[get_current_user] = lambda: User(
+            username="alice", role="user"
+        )
+        try:
+            client = TestClient(app)
+            url = "/api/v1/data/visualization/raster/tile/g.nc/tas/0/0/0/0"
+            params = {"tile_size": 16, "format": "json"}
+
+            before = client.get(url, params=params)
+            assert before.json()["metadata"]["level"] == 0
+            assert client.get(url, params=params).headers["X-Tile-Cache"] == "hit"
+
+            PyramidService.build_pyramid(
+                file_path,
+                DataRepository._get_pyramid_path(username="alice", filename="g.nc"),
+            )
+            after = client.get(url, params=params)
+            assert after.headers["X-Tile-Cache"] == "miss"
+            assert after.json()["metadata"]["level"] > 0
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+
+from app.core.exceptions import DataValidationError
+from app.repositories.data_repository import DataRepository
+from app.services.csv_rollup_service import CSVRollupService
+from app.services.visualization_service import VisualizationService
+
+
+class TestGetTimeseriesData:
+    def test_get_timeseries_data_grouped(self, tmp_path, monkeypatch):
+        """Test one series per group and value column, from rows and rollup"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame(
+            {
+                "scenario": ["base", "ssp2", "base", "ssp2", "ssp2"],
+                "region": ["EU", "EU", "EU", "US", "EU"],
+                "model": [1, 1, 2, 2, 2],
+                "year": [2020, 2020, 2030, 2030, 2030],
+                "value": [1.0, 2.0, 3.0, 4.0, 5.0],
+                "area": [10.0, 20.0, 30.0, 40.0, 50.0],
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="g.csv")
+        service = VisualizationService(DataRepository(), "g.csv", "alice")
+
+        result = service.get_timeseries_data(
+            columns=["value", "area", "model", "unknown"],
+            group_by="scenario",
+            region="EU",
+        )
+        assert result.x_axis == ["2020-01-01", "2030-01-01"]
+        assert result.y_labels == ["value:base", "value:ssp2", "area:base", "area:ssp2"]
+        assert result.y_axes["value:ssp2"] == [2.0, 5.0]
+        assert result.y_axes["area:base"] == [10.0, 30.0]
+        assert result.available_columns == ["value", "area"]
+        assert result.data_count == 4
+
+        sparse = service.get_timeseries_data(group_by="region", scenario="ssp2")
+        assert sparse.y_axes == {"value:EU": [2.0, 5.0], "value:US": [None, 4.0]}
+
+        CSVRollupService.build_rollup_file(
+            DataRepository._get_cleaned_path(username="alice", filename="g.csv"),
+            DataRepository._get_rollup_path(username="alice", filename="g.csv"),
+            DataRepository.DIMENSION_COLUMNS,
+        )
+        VisualizationService.invalidate_results(username="alice", filename="g.csv")
+        rolled = service.get_timeseries_data(group_by="region", scenario="ssp2")
+        assert rolled.y_axes == sparse.y_axes
+        assert rolled.data_count == sparse.data_count
+
+        with pytest.raises(DataValidationError):
+            service.get_timeseries_data(group_by="value")
+
+    def test_get_timeseries_data_max_points(self, tmp_path, monkeypatch):
+        """Test long series are downsampled to at most max_points dates"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        years = list(range(1700, 2100))
+        df = pd.DataFrame(
+            {
+                "scenario": ["base"] * len(years),
+                "year": years,
+                "value": [float(year % 37) for year in years],
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="l.csv")
+        service = VisualizationService(DataRepository(), "l.csv", "alice")
+
+        full = service.get_timeseries_data()
+        reduced = service.get_timeseries_data(max_points=50, downsample="minmax")
+
+        assert len(full.x_axis) == 400
+        assert len(reduced.x_axis) <= 50
+        assert max(reduced.y_axes["value"]) == 36.0
+        assert service.get_timeseries_data(max_points=50).x_axis[-1] == "2099-01-01"
+
+    def test_get_timeseries_data_aggregations(self, tmp_path, monkeypatch):
+        """Test ensemble statistics per year, from rows and rollup alike"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        df = pd.DataFrame(
+            {
+                "model": ["a", "b", "c", "a", "b", "c"],
+                "year": [2020, 2020, 2020, 2030, 2030, 2030],
+                "value": [1.0, 2.0, 6.0, 3.0, 4.0, 8.0],
+            }
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="e.csv")
+        service = VisualizationService(DataRepository(), "e.csv", "alice")
+
+        bands = service.get_timeseries_data(aggregations=["p5", "median", "p95"])
+        assert bands.y_labels == ["value:p5", "value:median", "value:p95"]
+        assert bands.y_axes["value:median"] == [2.0, 4.0]
+        assert bands.y_axes["value:p5"] == pytest.approx([1.1, 3.1])
+
+        raw = service.get_timeseries_data(aggregations=["mean", "max"])
+        CSVRollupService.build_rollup_file(
+            DataRepository._get_cleaned_path(username="alice", filename="e.csv"),
+            DataRepository._get_rollup_path(username="alice", filename="e.csv"),
+            DataRepository.DIMENSION_COLUMNS,
+        )
+        VisualizationService.invalidate_results(username="alice", filename="e.csv")
+        rolled = service.get_timeseries_data(aggregations=["mean", "max"])
+        assert (
+            rolled.y_axes
+            == raw.y_axes
+            == {
+                "value:mean": [3.0, 5.0],
+                "value:max": [6.0, 8.0],
+            }
+        )
+
+        with pytest.raises(DataValidationError):
+            service.get_timeseries_data(aggregations=["mode"])
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from app.services.csv_service import CSVService
+from app.services.date_format_service import DateFormatService
+
+
+class TestInferDateFormat:
+    def test_infer_from_sample(self):
+        """Test the format fitting the sample wins, non-dates are skipped"""
+        dates = pd.Series(["01/02/2020", "15/02/2020", None, "03/04/2021"])
+        fmt = DateFormatService.infer(dates)
+
+        assert fmt == "%d/%m/%Y"
+        assert DateFormatService.parse(dates, fmt)[0] == pd.Timestamp("2020-02-01")
+        assert DateFormatService.infer(pd.Series(["Jan 2020", "Feb 2021"])) == "%b %Y"
+        assert DateFormatService.infer(pd.Series(["soon", "later"])) is None
+        assert DateFormatService.infer(pd.Series([None, None])) is None
+        assert len(DateFormatService.sample(pd.Series(np.arange(10**5)))) == 1000
+
+    def test_clean_csv_data_dates_and_years(self):
+        """Test cleaning parses dates once and keeps years numeric"""
+        times = [f"2020-01-{day:02d} 10:00:00" for day in range(1, 20)]
+        seasons = ["spring", "summer", "autumn", "winter"] * 5
+        df = pd.DataFrame(
+            {
+                "Start_Time": times + ["x"],
+                "Year": pd.Series([str(2000 + i) for i in range(20)], dtype=object),
+                "Month": seasons,
+                "End_Year": range(2000, 2020),
+            }
+        )
+
+        cleaned_df, report = CSVService.clean_csv_data(df)
+
+        assert cleaned_df["start_time"].dtype == "datetime64[ns]"
+        assert cleaned_df["start_time"].isna().tolist() == [False] * 19 + [True]
+        assert cleaned_df["year"].tolist() == list(range(2000, 2020))
+        assert cleaned_df["year"].dtype == "int64"
+        assert cleaned_df["month"].tolist() == seasons
+        assert cleaned_df["end_year"].dtype == "int64"
+        assert report["fixes_applied"][:2] == [
+            "Standardized date format in column: start_time",
+            "Converted year numbers in column: year",
+        ]
@@ -1,9 +1,12 @@
 import pytest
+import numpy as np
 import pandas as pd
+import xarray as xr
 from pathlib import Path
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
 
+from app.repositories.dataset_pool import dataset_pool
 from app.services.raster_service import RasterService
 from app.main import app
 
@@ -19,3 +22,64 @@ class TestRasterService:
         assert "variables" in info
         assert "coordinates" in info
         assert len(info["variables"]) > 0
+
+    def test_process_raster_data_lazy_sample_layers(self):
+        """Test sample layers come from streamed statistics, not loaded slices"""
+        netcdf_path = "./tests/data/sample_raster.nc"
+
+        info = RasterService.process_raster_data(netcdf_path)
+
+        layer = info["sample_layers"]["layer1"]
+        steps = info["statistics"]["pr"]["time_steps"]
+        assert layer["data"] == "Too large for JSON"
+        assert layer["shape"] == (2088, 4320)
+        assert layer["mean"] == steps["mean"][0]
+        assert layer["min"] <= layer["mean"] <= layer["max"]
+
+    def test_process_raster_data_time_series_first(self, tmp_path):
+        """Test a 1-D time series as first variable still gets sample layers"""
+        netcdf_path = tmp_path / "series.nc"
+        series = np.array([1.5, 2.5, np.nan], dtype=np.float32)
+        grid = np.random.rand(3, 4, 5).astype(np.float32)
+        xr.Dataset(
+            {
+                "series": (("time",), series),
+                "grid": (("time", "lat", "lon"), grid),
+            },
+            coords={
+                "time": pd.date_range("2000-01-01", periods=3),
+                "lat": np.linspace(-90, 90, 4),
+                "lon": np.linspace(-180, 180, 5),
+            },
+        ).to_netcdf(netcdf_path, engine="h5netcdf")
+
+        info = RasterService.process_raster_data(str(netcdf_path))
+
+        steps = info["statistics"]["series"]["time_steps"]
+        assert steps["mean"] == [1.5, 2.5, None]
+        assert info["sample_layers"]["layer2"]["data"] == 2.5
+        assert info["sample_layers"]["layer2"]["mean"] == 2.5
+        assert info["statistics"]["grid"]["time_steps"]["count"] == [20, 20, 20]
+
+    def test_ingest_releases_pooled_handles(self, tmp_path):
+        """Test ingest jobs close the handles they pool, as workers cannot be cleared"""
+        netcdf_path = tmp_path / "grid.nc"
+        tiled_path = tmp_path / "grid.nc.tiled.nc"
+        xr.Dataset(
+            {"tas": (("time", "lat", "lon"), np.random.rand(2, 8, 10))},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=2),
+                "lat": np.linspace(-90, 90, 8),
+                "lon": np.linspace(-180, 180, 10),
+            },
+        ).to_netcdf(netcdf_path, engine="h5netcdf")
+
+        RasterService.process_raster_data(str(netcdf_path))
+        RasterService.prepare_tile_sources(
+            netcdf_path, tiled_path, tmp_path / "grid.nc.pyramid.nc"
+        )
+
+        assert tiled_path.exists()
+        pooled = set(dataset_pool._entries)
+        assert str(netcdf_path.resolve()) not in pooled
+        assert str(tiled_path.resolve()) not in pooled
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from app.services.raster_service import RasterService
+
+
+class TestRechunkForTiles:
+    def test_rechunk_for_tiles(self, tmp_path):
+        """Test the tile-aligned copy keeps values and uses per-time spatial chunks"""
+        source = tmp_path / "grid.nc"
+        tiled = tmp_path / "grid.nc.tiled.nc"
+        values = np.random.rand(3, 300, 600).astype(np.float32)
+        values[0, :10, :10] = np.nan
+        xr.Dataset(
+            {"tas": (("time", "lat", "lon"), values)},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=3),
+                "lat": np.linspace(-90, 90, 300),
+                "lon": np.linspace(-180, 180, 600),
+            },
+        ).to_netcdf(source, engine="h5netcdf")
+
+        RasterService.rechunk_for_tiles(source, tiled)
+
+        with xr.open_dataset(tiled, engine="h5netcdf") as ds:
+            assert ds["tas"].encoding["chunksizes"] == (1, 256, 256)
+            np.testing.assert_array_equal(ds["tas"].values, values)
+            assert len(ds["time"]) == 3
+
+    def test_rechunk_for_tiles_levels(self, tmp_path, monkeypatch):
+        """Test 4-D variables are copied in row bands of the lat axis"""
+        monkeypatch.setattr(RasterService, "TILED_CHUNK_SIZE", 4)
+        monkeypatch.setattr(RasterService, "RECHUNK_BLOCK_BYTES", 1)
+        source = tmp_path / "levels.nc"
+        tiled = tmp_path / "levels.nc.tiled.nc"
+        # More levels than lat rows, so banding the wrong axis misses some
+        values = np.random.rand(2, 12, 8, 10).astype(np.float32)
+        xr.Dataset(
+            {"ta": (("time", "lev", "lat", "lon"), values)},
+            coords={
+                "time": pd.date_range("2000-01-01", periods=2),
+                "lev": np.arange(12),
+                "lat": np.linspace(-90, 90, 8),
+                "lon": np.linspace(-180, 180, 10),
+            },
+        ).to_netcdf(source, engine="h5netcdf")
+
+        RasterService.rechunk_for_tiles(source, tiled)
+
+        with xr.open_dataset(tiled, engine="h5netcdf") as ds:
+            assert ds["ta"].encoding["chunksizes"] == (1, 1, 4, 4)
+            np.testing.assert_array_equal(ds["ta"].values, values)
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+
+from app.services.resampling_service import ResamplingService
+
+
+def pixel_centres(start, end, count):
+    step = (end - start) / count
+    return start + (np.arange(count) + 0.5) * step - 0.5
+
+
+class TestResamplingService:
+    def test_block_mean_skips_missing_values(self):
+        """Test block means over integer and fractional factors ignore NaN"""
+        window = np.arange(64, dtype=np.float32).reshape(8, 8)
+        window[0, 0] = np.nan
+        rows = pixel_centres(0, 8, 2)
+
+        integer = ResamplingService.resample(window, rows, rows, "mean")
+        fractional = ResamplingService.resample(
+            window, rows, pixel_centres(0, 8, 3), "mean"
+        )
+
+        assert integer.shape == (2, 2)
+        assert integer[0, 0] == pytest.approx(np.nanmean(window[:4, :4]))
+        assert fractional.shape == (2, 3)
+        assert fractional[0, 0] == pytest.approx(np.nanmean(window[:4, :3]))
+
+    def test_linear_renormalizes_around_missing_values(self):
+        """Test linear interpolation does not pull missing values in as zeros"""
+        window = np.array([[1.0, np.nan], [1.0, 1.0]], dtype=np.float32)
+        coords = np.array([0.5])
+
+        result = ResamplingService.resample(window, coords, coords, "linear")
+
+        assert result[0, 0] == pytest.approx(1.0)
+
+    def test_auto_samples_linearly_when_downsampling(self):
+        """Test auto keeps the linear fast path and block means stay opt-in"""
+        window = np.random.rand(64, 64).astype(np.float32)
+        coords = pixel_centres(0, 64, 8)
+
+        auto = ResamplingService.resample(window, coords, coords)
+
+        np.testing.assert_array_equal(
+            auto, ResamplingService.resample(window, coords, coords, "linear")
+        )
+        assert not np.allclose(
+            auto, ResamplingService.resample(window, coords, coords, "mean")
+        )
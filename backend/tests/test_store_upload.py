@@ -0,0 +1,38 @@
+import hashlib
+import io
+import pytest
+
+from app.config import settings
+from app.core.exceptions import FileSizeExceededError
+from app.repositories.data_repository import DataRepository
+
+
+class TestStoreUpload:
+    def test_store_upload(self, tmp_path, monkeypatch):
+        """Test uploads are copied in chunks and hashed on the way"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        monkeypatch.setattr(DataRepository, "UPLOAD_CHUNK_SIZE", 1000)
+        content = b"year,value\n" + b"2020,1.0\n" * 500
+
+        stored = DataRepository.store_upload(
+            io.BytesIO(content), username="alice", filename="x.csv"
+        )
+
+        assert (tmp_path / "alice_x.csv").read_bytes() == content
+        assert stored == {
+            "size_bytes": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+        }
+
+    def test_store_upload_size_limit(self, tmp_path, monkeypatch):
+        """Test oversized uploads are aborted and leave nothing behind"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        monkeypatch.setattr(DataRepository, "UPLOAD_CHUNK_SIZE", 1000)
+        monkeypatch.setattr(settings, "MAX_FILE_SIZE", 2500)
+
+        with pytest.raises(FileSizeExceededError):
+            DataRepository.store_upload(
+                io.BytesIO(b"x" * 5000), username="alice", filename="x.csv"
+            )
+
+        assert list(tmp_path.iterdir()) == []
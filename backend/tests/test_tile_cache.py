@@ -0,0 +1,59 @@
+import os
+import pytest
+
+from app.services.tile_cache import TileCache
+
+
+class TestTileCache:
+    def test_tile_cache(self, tmp_path):
+        """Test tiles fall back to disk after memory eviction and are invalidated"""
+        cache = TileCache(cache_dir=tmp_path, max_memory_bytes=10, max_disk_bytes=1000)
+        first = TileCache.make_key(
+            "researcher", "a.nc", 1, "pr", 0, 3, 2, 4, 256, "json"
+        )
+        second = TileCache.make_key(
+            "researcher", "a.nc", 1, "pr", 0, 3, 2, 5, 256, "json"
+        )
+
+        cache.set(first, b"first")
+        cache.set(second, b"second")
+
+        # First tile was evicted from memory but is still on disk
+        assert cache.memory.stats()["evictions"] == 1
+        assert cache.get(first) == b"first"
+        assert cache.stats()["disk_hits"] == 1
+
+        cache.invalidate_file("researcher", "a.nc")
+        assert cache.get(first) is None
+        assert cache.get(second) is None
+
+    def test_tile_cache_disk_budget(self, tmp_path):
+        """Test the disk tier drops least recently used tiles past its budget"""
+        cache = TileCache(cache_dir=tmp_path, max_memory_bytes=0, max_disk_bytes=25)
+        keys = [
+            TileCache.make_key("researcher", "a.nc", 1, "pr", 0, 3, 2, y, 256, "json")
+            for y in range(3)
+        ]
+        for position, key in enumerate(keys[:2]):
+            cache.set(key, b"0123456789")
+            os.utime(cache._disk_path(key), (position, position))
+
+        # Over budget: the oldest tile goes, the newer one stays
+        cache.set(keys[2], b"0123456789")
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[1]) == b"0123456789"
+        assert cache.stats()["disk_evictions"] == 1
+        assert cache.stats()["disk_bytes"] == 20
+
+    def test_tile_cache_files_do_not_collide(self, tmp_path):
+        """Test invalidating one user's file leaves similarly named ones alone"""
+        cache = TileCache(cache_dir=tmp_path, max_memory_bytes=0, max_disk_bytes=1000)
+        ours = TileCache.make_key("a", "b_c.nc", 1, "pr", 0, 0, 0, 0, 256, "json")
+        theirs = TileCache.make_key("a_b", "c.nc", 1, "pr", 0, 0, 0, 0, 256, "json")
+        cache.set(ours, b"ours")
+        cache.set(theirs, b"theirs")
+
+        cache.invalidate_file("a", "b_c.nc")
+
+        assert cache.get(ours) is None
+        assert cache.get(theirs) == b"theirs"
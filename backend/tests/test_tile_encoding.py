@@ -0,0 +1,40 @@
+import pytest
+import numpy as np
+
+from app.services.tile_encoding import TileEncoding
+
+
+class TestTileEncoding:
+    def test_quantized_tile_encoding(self):
+        """Test u16 tiles round-trip through scale/offset with a nodata code"""
+        tile = np.linspace(-5, 5, 16, dtype=np.float32).reshape(4, 4)
+        tile[0, 0] = np.nan
+
+        body, media_type, headers = TileEncoding.encode(tile, {}, "u16")
+        blob = TileEncoding.pack(body, media_type, headers)
+        body, media_type, headers = TileEncoding.unpack(blob)
+
+        codes = np.frombuffer(body, dtype=headers["X-Tile-Dtype"]).reshape(4, 4)
+        decoded = codes * float(headers["X-Tile-Scale"]) + float(
+            headers["X-Tile-Offset"]
+        )
+        assert media_type == "application/octet-stream"
+        assert codes[0, 0] == int(headers["X-Tile-Nodata"])
+        np.testing.assert_allclose(decoded[1:], tile[1:], atol=1e-3)
+
+    def test_negotiate_accept_quality(self):
+        """Test Accept q-values are honoured and q=0 refuses a media type"""
+        negotiate = TileEncoding.negotiate
+
+        assert (
+            negotiate(None, "application/octet-stream;q=0, application/json") == "json"
+        )
+        assert negotiate(None, "application/json;q=0.5, application/x-npy") == "npy"
+        assert (
+            negotiate(None, "application/x-npy;q=0.2, application/octet-stream")
+            == "f32"
+        )
+        assert negotiate(None, "application/octet-stream, application/json") == "f32"
+        assert negotiate(None, "*/*") == "json"
+        assert negotiate(None, None) == "json"
+        assert negotiate("u8", "application/octet-stream") == "u8"
@@ -0,0 +1,67 @@
+import time
+
+import pandas as pd
+import pytest
+
+from app.core.cache import LRUCache
+from app.repositories.data_repository import DataRepository
+from app.services import visualization_service
+from app.services.visualization_service import VisualizationService
+
+
+class TestTimeseriesCache:
+    def test_timeseries_cache_hits_and_invalidation(self, tmp_path, monkeypatch):
+        """Test repeated queries are served from cache until the file changes"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        cache = LRUCache(max_bytes=1024 * 1024, sizeof=lambda r: 1, ttl=60)
+        monkeypatch.setattr(visualization_service, "timeseries_cache", cache)
+        df = pd.DataFrame(
+            {"region": ["EU", "US"], "year": [2020, 2021], "value": [1.0, 2.0]}
+        )
+        DataRepository.store_cleaned_csv(df, username="alice", filename="t.csv")
+        service = VisualizationService(DataRepository(), "t.csv", "alice")
+
+        first = service.get_timeseries_data(region="EU", model=None)
+        # Unset parameters and keyword order do not change the key
+        assert service.get_timeseries_data(region="EU") is first
+        assert cache.stats()["hits"] == 1
+
+        replaced = pd.DataFrame(
+            {"region": ["EU", "EU", "US"], "year": [2020] * 3, "value": [5.0] * 3}
+        )
+        DataRepository.store_cleaned_csv(replaced, username="alice", filename="t.csv")
+        assert service.get_timeseries_data(region="EU").y_axes["value"] == [10.0]
+
+        VisualizationService.invalidate_results(username="alice", filename="t.csv")
+        assert cache.stats()["entries"] == 0
+
+    def test_timeseries_cache_response_size(self, tmp_path, monkeypatch):
+        """Test cached responses are sized from their points, not serialized"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        years = list(range(2000, 2100))
+        df = pd.DataFrame({"region": ["EU"] * 100, "year": years, "value": [1.0] * 100})
+        DataRepository.store_cleaned_csv(df, username="alice", filename="s.csv")
+        service = VisualizationService(DataRepository(), "s.csv", "alice")
+        response = service.get_timeseries_data()
+
+        monkeypatch.setattr(
+            type(response),
+            "model_dump_json",
+            lambda self, **kwargs: pytest.fail("response was serialized"),
+        )
+        size = VisualizationService.response_size(response)
+
+        assert size >= 100 * VisualizationService.POINT_BYTES
+        assert size > len(response.x_axis) * len("2000-01-01")
+
+    def test_timeseries_cache_ttl(self):
+        """Test entries expire once their time to live has passed"""
+        cache = LRUCache(max_bytes=100, ttl=0.05)
+        cache.set("key", b"value")
+        assert cache.get("key") == b"value"
+
+        time.sleep(0.1)
+
+        assert cache.get("key") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["bytes"] == 0
@@ -0,0 +1,41 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import upload
+from app.core.executor import BoundedExecutor
+from app.main import app
+from app.repositories.data_repository import DataRepository
+from app.schemas.auth import User
+
+
+class TestUploadCSV:
+    def test_upload_csv_prefixed_filename(self, tmp_path, monkeypatch):
+        """Test a file named after its user is processed where it is stored"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        # Worker processes would not see the patched uploads directory
+        executor = BoundedExecutor("cpu", BoundedExecutor.THREAD, 2, 4, 1)
+        monkeypatch.setattr(upload, "cpu_executor", executor)
+        app.dependency_overrides[get_current_user] = lambda: User(
+            username="researcher", role="user"
+        )
+        try:
+            client = TestClient(app)
+            csv = b"scenario,year,value\nbase,2020,1.5\nbase,2021,2.5\n"
+            files = {"file": ("researcher_data.csv", csv, "text/csv")}
+
+            response = client.post("/api/v1/upload/data", files=files)
+            assert response.status_code == 200, response.text
+            assert (tmp_path / "researcher_data.csv").exists()
+            metadata_path = DataRepository._get_metadata_path(
+                username="researcher", filename="researcher_data.csv"
+            )
+            metadata = json.loads(metadata_path.read_text())["metadata"]
+            assert metadata["file_path"] == str(tmp_path / "researcher_data.csv")
+
+            repeated = client.post("/api/v1/upload/data", files=files)
+            assert repeated.status_code == 409
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+            executor.shutdown()
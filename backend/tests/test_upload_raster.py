@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import upload
+from app.core.exceptions import ServiceOverloadedError
+from app.core.executor import BoundedExecutor
+from app.main import app
+from app.repositories.data_repository import DataRepository
+from app.schemas.auth import User
+
+
+class TestUploadRaster:
+    def test_upload_raster_tiling_overloaded(self, tmp_path, monkeypatch):
+        """Test a tiling job that cannot be queued fails the upload with a 503"""
+        monkeypatch.setattr(DataRepository, "UPLOADS_DIR", tmp_path)
+        executor = BoundedExecutor("cpu", BoundedExecutor.THREAD, 1, 4, 9)
+
+        def saturated(*args, **kwargs):
+            raise ServiceOverloadedError("busy", retry_after=9)
+
+        monkeypatch.setattr(executor, "submit", saturated)
+        monkeypatch.setattr(upload, "cpu_executor", executor)
+        app.dependency_overrides[get_current_user] = lambda: User(
+            username="alice", role="user"
+        )
+        try:
+            client = TestClient(app)
+            with open("./tests/data/sample_raster.nc", "rb") as f:
+                files = {"file": ("s.nc", f.read(), "application/x-netcdf")}
+
+            response = client.post("/api/v1/upload/data", files=files)
+
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "9"
+            # Nothing is left behind, so the upload can be retried
+            assert list(tmp_path.iterdir()) == []
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+            executor.shutdown()